@@ -50,6 +50,16 @@ CREATE TABLE IF NOT EXISTS lokasi_pintu_air (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
 
+-- Buat tabel untuk titik pusat kelurahan (menempatkan rt_terdampak di peta)
+CREATE TABLE IF NOT EXISTS kelurahan (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    nama VARCHAR(255) NOT NULL UNIQUE,
+    latitude DECIMAL(10, 8) NOT NULL,
+    longitude DECIMAL(11, 8) NOT NULL,
+    radius_m INT DEFAULT 1000,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
 -- Buat tabel untuk statistik banjir
 CREATE TABLE IF NOT EXISTS statistik_banjir (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -108,6 +118,18 @@ ON DUPLICATE KEY UPDATE
     deskripsi = VALUES(deskripsi),
     updated_at = CURRENT_TIMESTAMP;
 
+-- Insert titik pusat kelurahan (perkiraan)
+INSERT INTO kelurahan (nama, latitude, longitude, radius_m) VALUES
+('Manggarai', -6.2100, 106.8500, 900),
+('Kebayoran Baru', -6.2433, 106.7990, 1500),
+('Kemayoran', -6.1630, 106.8450, 1000),
+('Cengkareng', -6.1480, 106.7350, 1500),
+('Tanjung Priok', -6.1100, 106.8800, 1200)
+ON DUPLICATE KEY UPDATE
+    latitude = VALUES(latitude),
+    longitude = VALUES(longitude),
+    radius_m = VALUES(radius_m);
+
 -- Insert sample statistik banjir
 INSERT INTO statistik_banjir (tanggal, total_rt_terdampak, total_kelurahan_terdampak, rata_rata_tinggi_genangan, max_tinggi_genangan, status_terparah) VALUES
 (CURDATE(), 10, 5, 40.85, 70.8, 'berat'),
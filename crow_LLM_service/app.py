@@ -6,6 +6,11 @@ from datetime import datetime, date
 from typing import List, Optional
 import json
 
+try:
+    from .location_registry import LocationRegistry
+except Exception:
+    from location_registry import LocationRegistry
+
 app = FastAPI()
 
 # CORS middleware
@@ -30,6 +35,9 @@ def get_db_connection():
         print(f"[DB ERROR] {e}")
         return None
 
+# Coordinates per location, loaded from the `locations` table
+location_registry = LocationRegistry(get_db_connection)
+
 @app.get("/")
 async def health_check():
     return {"service": "crowd_llm", "status": "ok"}
@@ -105,37 +113,9 @@ async def get_today_crowd_summary():
         
         latest_conditions = cursor.fetchall()
         
-        # Location coordinates (you can modify these based on your actual locations)
-        location_coords = {
-            "DPR": {"latitude": -6.2088, "longitude": 106.8456},
-            "Patung Kuda": {"latitude": -6.1751, "longitude": 106.8263},
-            "Bundaran HI": {"latitude": -6.1944, "longitude": 106.8229},
-            "Monas": {"latitude": -6.1751, "longitude": 106.8263},
-            "GBK": {"latitude": -6.2297, "longitude": 106.8019},
-            "Istana Negara": {"latitude": -6.1751, "longitude": 106.8263},
-            "Bundaran Senayan": {"latitude": -6.2297, "longitude": 106.8019},
-            "Mabes Polri": {"latitude": -6.1751, "longitude": 106.8263}
-        }
-        
-        # Add coordinates to location data
-        for location in location_data:
-            location_name = location['location']
-            if location_name in location_coords:
-                location['latitude'] = location_coords[location_name]['latitude']
-                location['longitude'] = location_coords[location_name]['longitude']
-            else:
-                location['latitude'] = None
-                location['longitude'] = None
-        
-        # Add coordinates to latest conditions
-        for condition in latest_conditions:
-            location_name = condition['location']
-            if location_name in location_coords:
-                condition['latitude'] = location_coords[location_name]['latitude']
-                condition['longitude'] = location_coords[location_name]['longitude']
-            else:
-                condition['latitude'] = None
-                condition['longitude'] = None
+        # Add coordinates to location data and latest conditions
+        location_registry.attach_coords(location_data)
+        location_registry.attach_coords(latest_conditions)
         
         return {
             "date": today.isoformat(),
@@ -190,27 +170,8 @@ async def get_crowd_conditions():
         
         conditions = cursor.fetchall()
         
-        # Location coordinates
-        location_coords = {
-            "DPR": {"latitude": -6.2088, "longitude": 106.8456},
-            "Patung Kuda": {"latitude": -6.1751, "longitude": 106.865},
-            "Bundaran HI": {"latitude": -6.1944, "longitude": 106.8229},
-            "Monas": {"latitude": -6.1751, "longitude": 106.865},
-            "GBK": {"latitude": -6.2297, "longitude": 106.6894},
-            "Istana Negara": {"latitude": -6.1751, "longitude": 106.865},
-            "Bundaran Senayan": {"latitude": -6.2297, "longitude": 106.6894},
-            "Mabes Polri": {"latitude": -6.1751, "longitude": 106.865}
-        }
-        
         # Add coordinates
-        for condition in conditions:
-            location_name = condition['location']
-            if location_name in location_coords:
-                condition['latitude'] = location_coords[location_name]['latitude']
-                condition['longitude'] = location_coords[location_name]['longitude']
-            else:
-                condition['latitude'] = None
-                condition['longitude'] = None
+        location_registry.attach_coords(conditions)
         
         return {
             "conditions": conditions,
@@ -224,6 +185,12 @@ async def get_crowd_conditions():
         cursor.close()
         conn.close()
 
+@app.get("/crowd/locations")
+async def get_crowd_locations(active_only: bool = False):
+    """List registered camera locations with coordinates and ROI polygons"""
+    locations = location_registry.all(active_only=active_only)
+    return {"locations": locations, "total_locations": len(locations)}
+
 @app.get("/crowd/stats")
 async def get_crowd_statistics():
     """Get comprehensive crowd statistics"""
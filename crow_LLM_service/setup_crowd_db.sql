@@ -23,6 +23,8 @@ CREATE TABLE IF NOT EXISTS locations (
     name VARCHAR(100) NOT NULL UNIQUE,
     cctv_url TEXT NOT NULL,
     description TEXT,
+    latitude DECIMAL(10,7) NULL,
+    longitude DECIMAL(10,7) NULL,
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
@@ -36,10 +38,19 @@ CREATE TABLE IF NOT EXISTS roi_coordinates (
     x_coordinate INT NOT NULL,
     y_coordinate INT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (location_id) REFERENCES locations(id) ON DELETE CASCADE,
-    INDEX idx_location_order (location_id, point_order)
+    UNIQUE KEY uq_location_order (location_id, point_order)
 );
 
+-- Upgrade database lama (sebelum koordinat lokasi disimpan di tabel locations):
+-- ALTER TABLE locations ADD COLUMN latitude DECIMAL(10,7) NULL AFTER description,
+--   ADD COLUMN longitude DECIMAL(10,7) NULL AFTER latitude;
+-- ALTER TABLE roi_coordinates
+--   ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP AFTER created_at,
+--   DROP INDEX idx_location_order, ADD UNIQUE KEY uq_location_order (location_id, point_order);
+-- (hapus dulu titik ROI duplikat bila script ini pernah dijalankan berulang kali)
+
 -- Buat tabel untuk density maps
 CREATE TABLE IF NOT EXISTS density_maps (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -51,13 +62,23 @@ CREATE TABLE IF NOT EXISTS density_maps (
     INDEX idx_location_timestamp (location_id, timestamp)
 );
 
--- Insert data lokasi CCTV sesuai dengan app.py
-INSERT INTO locations (name, cctv_url, description) VALUES
-('DPR', 'https://cctv.balitower.co.id/Bendungan-Hilir-003-700014_1/embed.html', 'CCTV DPR - Bendungan Hilir'),
-('Patung Kuda', 'https://cctv.balitower.co.id/JPO-Merdeka-Barat-507357_9/embed.html', 'CCTV Patung Kuda - JPO Merdeka Barat')
+-- Insert data lokasi CCTV beserta koordinatnya.
+-- Lokasi baru cukup ditambahkan di sini (atau INSERT langsung); service membaca
+-- tabel ini, tidak perlu mengubah kode. Lokasi tanpa CCTV dibuat is_active = FALSE.
+INSERT INTO locations (name, cctv_url, description, latitude, longitude, is_active) VALUES
+('DPR', 'https://cctv.balitower.co.id/Bendungan-Hilir-003-700014_1/embed.html', 'CCTV DPR - Bendungan Hilir', -6.2103000, 106.8002000, TRUE),
+('Patung Kuda', 'https://cctv.balitower.co.id/JPO-Merdeka-Barat-507357_9/embed.html', 'CCTV Patung Kuda - JPO Merdeka Barat', -6.1766000, 106.8226000, TRUE),
+('Bundaran HI', '', 'Bundaran Hotel Indonesia', -6.1950000, 106.8230000, FALSE),
+('Monas', '', 'Monumen Nasional', -6.1754000, 106.8272000, FALSE),
+('GBK', '', 'Gelora Bung Karno', -6.2186000, 106.8020000, FALSE),
+('Istana Negara', '', 'Istana Negara', -6.1701000, 106.8240000, FALSE),
+('Bundaran Senayan', '', 'Bundaran Senayan', -6.2270000, 106.7996000, FALSE),
+('Mabes Polri', '', 'Markas Besar Polri - Trunojoyo', -6.2405000, 106.8005000, FALSE)
 ON DUPLICATE KEY UPDATE
     cctv_url = VALUES(cctv_url),
     description = VALUES(description),
+    latitude = VALUES(latitude),
+    longitude = VALUES(longitude),
     updated_at = CURRENT_TIMESTAMP;
 
 -- Insert ROI coordinates untuk Patung Kuda
@@ -10,7 +10,7 @@ import os
 import tempfile
 import threading
 from fastapi import FastAPI, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
 import base64
@@ -20,6 +20,13 @@ from mysql.connector import Error
 import requests
 import json
 
+try:
+    from . import columnar_export
+    from .location_registry import REGISTRY_CHECK_SECONDS, LocationRegistry
+except Exception:
+    import columnar_export
+    from location_registry import REGISTRY_CHECK_SECONDS, LocationRegistry
+
 app = FastAPI()
 
 app.add_middleware(
@@ -92,11 +99,25 @@ model = load_model()
 # Using local video file instead of CCTV
 video_file_path = "/Users/raihansetiawan/backend_JIR/0918(1).mp4"
 
-roi_polygons = {
+# Locations, ROI polygons and which cameras are active come from the database
+location_registry = LocationRegistry(get_db_connection)
+
+# Used only while the locations table cannot be read
+DEFAULT_ROI_POLYGONS = {
     "Patung Kuda": np.array([[224, 675], [392, 383], [644, 377], [970, 671]], dtype=np.int32),
     "DPR": np.array([[7, 346], [1067, 375], [1070, 513], [5, 454]], dtype=np.int32),
 }
 
+def roi_polygon_for(location: str):
+    points = location_registry.roi(location)
+    if points:
+        return np.array(points, dtype=np.int32)
+    return DEFAULT_ROI_POLYGONS.get(location)
+
+def is_location_active(location: str) -> bool:
+    entry = location_registry.get(location)
+    return entry["is_active"] if entry else True
+
 # Driver service removed - using local video instead of selenium
 
 crowd_data = {}
@@ -124,8 +145,6 @@ def save_to_mysql(location: str, count: int, timestamp: str):
         conn.close()
 
 def monitor_loop(location: str, interval: int = 10):
-    roi_polygon = roi_polygons.get(location)
-    
     # Check if video file exists
     if not os.path.exists(video_file_path):
         print(f"[ERROR] Video file tidak ditemukan: {video_file_path}")
@@ -141,7 +160,14 @@ def monitor_loop(location: str, interval: int = 10):
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     
     while True:
+        if not is_location_active(location):
+            print(f"[INFO] Monitoring dihentikan: {location} tidak aktif")
+            monitored.discard(location)
+            break
         try:
+            # ROI bisa berubah di database tanpa restart
+            roi_polygon = roi_polygon_for(location)
+
             # Read frame from video
             ret, frame = cap.read()
             if not ret:
@@ -222,10 +248,27 @@ def monitor_loop(location: str, interval: int = 10):
         
         time.sleep(interval)
 
-# Start monitoring for each location using the same video file
-locations = ["DPR", "Patung Kuda"]
-for loc in locations:
-    threading.Thread(target=monitor_loop, args=(loc,), daemon=True).start()
+# Start monitoring for each active location using the same video file;
+# locations activated later are picked up without a restart
+monitored = set()
+
+def start_monitors():
+    names = [e["name"] for e in location_registry.all(active_only=True)] or list(DEFAULT_ROI_POLYGONS)
+    for loc in names:
+        if loc not in monitored:
+            monitored.add(loc)
+            threading.Thread(target=monitor_loop, args=(loc,), daemon=True).start()
+
+def monitor_supervisor():
+    while True:
+        time.sleep(REGISTRY_CHECK_SECONDS)
+        try:
+            start_monitors()
+        except Exception as e:
+            print(f"[ERROR] supervisor: {e}")
+
+start_monitors()
+threading.Thread(target=monitor_supervisor, daemon=True).start()
 
 @app.get("/")
 async def health_check():
@@ -286,6 +329,48 @@ async def get_crowd_history():
         cursor.close()
         conn.close()
 
+CROWD_EXPORT_COLUMNS = [("id", "int"), ("location", "str"), ("count", "int"), ("timestamp", "timestamp")]
+
+@app.get("/crowd/export")
+def export_crowd_history(
+    format: str = Query("arrow", description="arrow atau parquet"),
+    start: str = Query(None, description="Mulai (ISO 8601, inklusif)"),
+    end: str = Query(None, description="Sampai (ISO 8601, eksklusif)"),
+    location: str = Query(None, description="Nama lokasi, boleh dipisah koma"),
+):
+    """Seluruh crowd_history yang cocok dengan filter, di-stream per chunk."""
+    if not columnar_export.available():
+        return JSONResponse(status_code=501, content={"error": "Ekspor butuh pyarrow (pip install pyarrow)"})
+    if format not in columnar_export.FORMATS:
+        return JSONResponse(status_code=400, content={"error": "format harus 'arrow' atau 'parquet'"})
+    conditions, params = [], []
+    try:
+        if start:
+            conditions.append("timestamp >= %s")
+            params.append(datetime.fromisoformat(start))
+        if end:
+            conditions.append("timestamp < %s")
+            params.append(datetime.fromisoformat(end))
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "start/end harus format ISO 8601"})
+    if location:
+        names = [n.strip() for n in location.split(",") if n.strip()]
+        if not names:
+            return JSONResponse(status_code=400, content={"error": "location tidak boleh kosong"})
+        conditions.append(f"location IN ({', '.join(['%s'] * len(names))})")
+        params.extend(names)
+    query = f"SELECT {', '.join(name for name, _ in CROWD_EXPORT_COLUMNS)} FROM crowd_history"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    try:
+        body = columnar_export.open_export(get_db_connection, query, params, CROWD_EXPORT_COLUMNS, format)
+    except Error as e:
+        return {"error": str(e)}
+    if body is None:
+        return {"error": "Database connection failed"}
+    media_type, ext = columnar_export.FORMATS[format]
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="crowd_history.{ext}"'})
+
 @app.get("/crowd/densitymap")
 async def get_density_map(location: str = Query(..., description="Nama lokasi")):
     if location not in density_maps:
@@ -0,0 +1,124 @@
+"""In-memory registry of camera locations (coordinates and ROI polygons).
+
+Rows come from the ``locations`` and ``roi_coordinates`` tables and are
+loaded once into a dict keyed by location name, so attaching coordinates to
+query results is a dict lookup per row. At most every
+``REGISTRY_CHECK_SECONDS`` a one-row fingerprint query (row counts and latest
+``updated_at`` of both tables) tells whether anything changed; only then is
+the snapshot reloaded. A new camera is therefore one INSERT, no deploy.
+
+If the database is unreachable the last snapshot keeps serving. The module
+is kept identical in crow_LLM_service (coordinates for the crowd endpoints)
+and crowd_monitoring_service (ROI polygons and which cameras to monitor).
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+REGISTRY_CHECK_SECONDS: float = 30.0
+
+_FINGERPRINT_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM locations) AS n_locations,
+        (SELECT MAX(updated_at) FROM locations) AS locations_updated,
+        (SELECT COUNT(*) FROM roi_coordinates) AS n_points,
+        (SELECT MAX(updated_at) FROM roi_coordinates) AS points_updated
+"""
+
+
+class LocationRegistry:
+    def __init__(self, get_connection: Callable[[], Any], check_interval: float = REGISTRY_CHECK_SECONDS):
+        self._get_connection = get_connection
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._fingerprint: Optional[Tuple] = None
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        """Force a fingerprint check on the next lookup."""
+        self._checked_at = 0.0
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload the snapshot if the tables changed; returns True if it did."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self._check_interval:
+            return False
+        with self._lock:
+            if not force and now - self._checked_at < self._check_interval:
+                return False  # another thread just checked
+            self._checked_at = now  # also throttles retries while the DB is down
+            conn = self._get_connection()
+            if not conn:
+                return False
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(_FINGERPRINT_SQL)
+                row = cursor.fetchone() or {}
+                fingerprint = (row.get("n_locations"), row.get("locations_updated"), row.get("n_points"), row.get("points_updated"))
+                if not force and fingerprint == self._fingerprint:
+                    return False
+                self._by_name = self._load(cursor)
+                self._fingerprint = fingerprint
+                print(f"[LOCATIONS] loaded {len(self._by_name)} locations")
+                return True
+            except Exception as e:
+                print(f"[LOCATIONS ERROR] {e}")
+                return False
+            finally:
+                cursor.close()
+                conn.close()
+
+    @staticmethod
+    def _load(cursor) -> Dict[str, Dict[str, Any]]:
+        cursor.execute("""
+            SELECT id, name, description, cctv_url, latitude, longitude, is_active
+            FROM locations
+        """)
+        by_name: Dict[str, Dict[str, Any]] = {}
+        by_id: Dict[int, Dict[str, Any]] = {}
+        for r in cursor.fetchall():
+            entry = {
+                "id": r["id"],
+                "name": r["name"],
+                "description": r.get("description"),
+                "cctv_url": r.get("cctv_url"),
+                "latitude": float(r["latitude"]) if r.get("latitude") is not None else None,
+                "longitude": float(r["longitude"]) if r.get("longitude") is not None else None,
+                "is_active": bool(r.get("is_active")),
+                "roi": [],
+            }
+            by_name[entry["name"]] = entry
+            by_id[entry["id"]] = entry
+        cursor.execute("""
+            SELECT location_id, x_coordinate, y_coordinate
+            FROM roi_coordinates
+            ORDER BY location_id, point_order
+        """)
+        for r in cursor.fetchall():
+            entry = by_id.get(r["location_id"])
+            if entry is not None:
+                entry["roi"].append((int(r["x_coordinate"]), int(r["y_coordinate"])))
+        return by_name
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self._by_name.get(name)
+
+    def all(self, active_only: bool = False) -> List[Dict[str, Any]]:
+        self.refresh()
+        return [e for e in self._by_name.values() if e["is_active"] or not active_only]
+
+    def roi(self, name: str) -> List[Tuple[int, int]]:
+        """ROI polygon points in order; empty when the location has none."""
+        entry = self.get(name)
+        return list(entry["roi"]) if entry else []
+
+    def attach_coords(self, rows: Iterable[Dict[str, Any]], key: str = "location") -> None:
+        """Set ``latitude``/``longitude`` on each row from its location name."""
+        self.refresh()
+        by_name = self._by_name  # one snapshot for the whole batch
+        for row in rows:
+            entry = by_name.get(row.get(key))
+            row["latitude"] = entry["latitude"] if entry else None
+            row["longitude"] = entry["longitude"] if entry else None
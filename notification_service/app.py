@@ -4,9 +4,23 @@ from pydantic import BaseModel
 from typing import List, Optional
 import os
 from dotenv import load_dotenv
-from notification.utils import init_firebase, send_to_token, send_multicast, send_to_topic
+from notification.utils import init_firebase, send_to_token, send_to_topic
 from notification.schemas.notification import RegisterTokenReq, PushReq
 
+try:
+    import mysql.connector
+    from mysql.connector import Error
+except Exception:  # registry then runs in memory only
+    mysql = None
+    Error = Exception
+
+try:
+    from .token_registry import TokenRegistry
+    from .fcm_sender import FcmSender, HttpV1Transport, firebase_credentials
+except Exception:
+    from token_registry import TokenRegistry
+    from fcm_sender import FcmSender, HttpV1Transport, firebase_credentials
+
 # Load environment variables
 load_dotenv()
 
@@ -24,8 +38,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage for demo (replace with database in production)
-device_tokens = []
+def get_db_connection():
+    if mysql is None:
+        return None
+    try:
+        connection = mysql.connector.connect(
+            host="localhost",
+            user="root",
+            password="Raihan26",
+            database="notification_service"
+        )
+        return connection
+    except Error as e:
+        print(f"[DB ERROR] {e}")
+        return None
+
+# Device tokens: in-memory hash index + device_tokens table
+registry = TokenRegistry(get_db_connection)
+
+# Chunked parallel FCM delivery; tokens FCM rejects are pruned from the registry
+_project_id, _access_token = firebase_credentials()
+if not _project_id:
+    print("[FCM] no Firebase project id (initialize firebase_admin or set FCM_PROJECT_ID); pushes will fail")
+sender = FcmSender(HttpV1Transport(_project_id or "local", _access_token), on_invalid=registry.mark_invalid)
+
+class RegisterDeviceReq(RegisterTokenReq):
+    user_id: Optional[str] = None
+    topics: Optional[List[str]] = None
+
+@app.on_event("startup")
+def load_registry():
+    registry.load()
+    registry.start()
+
+@app.on_event("shutdown")
+def stop_registry():
+    registry.stop()
+    sender.close()
+
+class UserPushReq(BaseModel):
+    title: str
+    body: str
+    user_ids: List[str]
+    data: Optional[dict] = None
 
 def admin_auth(x_api_key: str = Header(...)):
     if x_api_key != "admin123":  # Simple hardcoded key for demo
@@ -41,17 +96,19 @@ async def health_check_alt():
     return {"service": "notification", "status": "ok"}
 
 @app.post("/api/notification/device/register")
-def register_device(payload: RegisterTokenReq):
+def register_device(payload: RegisterDeviceReq):
     """Register device token for push notifications"""
-    token = payload.fcm_token
-    if token not in device_tokens:
-        device_tokens.append({
-            "fcm_token": token,
-            "platform": payload.platform,
-            "registered_at": "2025-01-01T00:00:00Z"  # Demo timestamp
-        })
+    is_new = registry.register(payload.fcm_token, payload.platform, payload.user_id, payload.topics)
+    print(f"[REGISTER] {'New device registered' if is_new else 'Device refreshed'}: {payload.fcm_token[:10]}...")
     return {"ok": True, "message": "Device registered successfully"}
 
+@app.delete("/api/notification/device/{fcm_token}")
+def unregister_device(fcm_token: str):
+    """Remove a device token (logout / uninstall)"""
+    if not registry.unregister(fcm_token):
+        raise HTTPException(status_code=404, detail="Device token not found")
+    return {"ok": True, "message": "Device unregistered"}
+
 @app.post("/api/notification/admin/push", dependencies=[Depends(admin_auth)])
 def admin_push(req: PushReq):
     """Send push notification to registered devices"""
@@ -67,74 +124,57 @@ def admin_push(req: PushReq):
             raise HTTPException(status_code=500, detail=f"Failed to send to topic: {str(e)}")
     else:
         # Send to all registered devices
-        tokens_to_send = [device["fcm_token"] for device in device_tokens]
+        tokens_to_send = registry.tokens()
 
     if not tokens_to_send:
         raise HTTPException(status_code=400, detail="No device tokens available")
 
     try:
-        resp = send_multicast(tokens_to_send, req.title, req.body, req.data)
-        
-        # Normalize response
-        normalized = []
-        if hasattr(resp, "responses") and isinstance(resp.responses, list):
-            for idx, r in enumerate(resp.responses):
-                if getattr(r, "success", False):
-                    normalized.append({
-                        "token": tokens_to_send[idx] if idx < len(tokens_to_send) else None,
-                        "success": True,
-                        "message_id": getattr(r, "message_id", None)
-                    })
-                else:
-                    err = getattr(r, "error", None) or str(getattr(r, "exception", "Unknown error"))
-                    normalized.append({
-                        "token": tokens_to_send[idx] if idx < len(tokens_to_send) else None,
-                        "success": False,
-                        "error": err
-                    })
-        else:
-            # Fallback response format
-            for i, token in enumerate(tokens_to_send):
-                normalized.append({
-                    "token": token,
-                    "success": True,
-                    "message_id": f"msg_{i}"
-                })
-
-        return {
-            "success_count": getattr(resp, "success_count", len(tokens_to_send)),
-            "failure_count": getattr(resp, "failure_count", 0),
-            "total_tokens": len(tokens_to_send),
-            "details": normalized
-        }
+        return sender.send(tokens_to_send, req.title, req.body, req.data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send notifications: {str(e)}")
 
+@app.post("/api/notification/admin/push-users", dependencies=[Depends(admin_auth)])
+def admin_push_users(req: UserPushReq):
+    """Send push notification only to the devices of the given users"""
+    tokens = registry.tokens(user_ids=req.user_ids)
+    if not tokens:
+        return {"success_count": 0, "failure_count": 0, "total_tokens": 0, "total_users": len(req.user_ids)}
+    result = admin_push(PushReq(title=req.title, body=req.body, tokens=tokens, data=req.data))
+    result["total_users"] = len(req.user_ids)
+    return result
+
 @app.get("/api/notification/devices")
-async def get_registered_devices():
+async def get_registered_devices(platform: Optional[str] = None, topic: Optional[str] = None, limit: int = 1000):
     """Get list of registered devices"""
     return {
-        "total_devices": len(device_tokens),
-        "devices": device_tokens
+        "total_devices": len(registry),
+        "devices": registry.devices(platform=platform, topic=topic, limit=limit)
     }
 
+@app.get("/api/notification/devices/stats")
+async def get_device_stats():
+    """Device counts per platform and topic"""
+    return registry.stats()
+
 @app.post("/api/notification/test")
 async def test_notification():
     """Test notification endpoint"""
     try:
         # Send test notification to all devices
-        resp = send_multicast(
-            [device["fcm_token"] for device in device_tokens],
+        resp = sender.send(
+            registry.tokens(),
             "🧪 Test Notification",
             "This is a test notification from JIR Smart City",
-            {"test": True, "timestamp": "2025-01-01T00:00:00Z"}
+            {"test": True, "timestamp": "2025-01-01T00:00:00Z"},
+            details=False
         )
         
         return {
             "success": True,
             "message": "Test notification sent",
-            "success_count": getattr(resp, "success_count", 0),
-            "failure_count": getattr(resp, "failure_count", 0)
+            "success_count": resp["success_count"],
+            "failure_count": resp["failure_count"]
         }
     except Exception as e:
         return {
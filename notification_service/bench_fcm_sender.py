@@ -0,0 +1,96 @@
+"""Benchmark ``FcmSender`` throughput against the local FCM stand-in.
+
+Starts ``fcm_standin`` in a separate process (so it does not share the
+GIL with the sender), pushes one notification to ``--tokens``
+recipients (``--invalid`` of them unregistered) for each HTTP concurrency,
+and reports messages/sec plus how many invalid tokens were handed to the
+pruning callback. Compares against sending the tokens one by one, which is
+roughly what a single un-chunked call costs::
+
+    python bench_fcm_sender.py [--tokens 20000] [--latency-ms 20] [--concurrency 8 32 64 128]
+"""
+import argparse
+import multiprocessing
+import socket
+import time
+from typing import List
+
+try:
+    from . import fcm_sender, fcm_standin
+except Exception:
+    import fcm_sender
+    import fcm_standin
+
+
+def make_tokens(n: int, invalid: float) -> List[str]:
+    n_invalid = int(n * invalid)
+    return [f"invalid-{i:08d}" if i < n_invalid else f"device-{i:08d}" for i in range(n)]
+
+
+def run_standin(port: int, latency_ms: float, unavailable_rate: float) -> None:
+    fcm_standin.FcmStandIn(("127.0.0.1", port), latency_ms, unavailable_rate).serve_forever()
+
+
+def start_standin(latency_ms: float, unavailable_rate: float):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = multiprocessing.Process(target=run_standin, args=(port, latency_ms, unavailable_rate), daemon=True)
+    proc.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--invalid", type=float, default=0.02, help="fraction of unregistered tokens")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--unavailable-rate", type=float, default=0.01)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 64, 128])
+    parser.add_argument("--chunks", type=int, default=fcm_sender.FCM_MAX_PARALLEL_CHUNKS, help="chunks in flight")
+    parser.add_argument("--sequential-sample", type=int, default=200, help="tokens for the one-by-one baseline")
+    args = parser.parse_args()
+
+    proc, endpoint = start_standin(args.latency_ms, args.unavailable_rate)
+    tokens = make_tokens(args.tokens, args.invalid)
+    print(f"stand-in {endpoint}: latency {args.latency_ms} ms, 503 rate {args.unavailable_rate}")
+
+    transport = fcm_sender.HttpV1Transport("bench", endpoint=endpoint, concurrency=1)
+    sample = tokens[-args.sequential_sample:]
+    message = fcm_sender.build_message("bench", "bench")
+    t = time.perf_counter()
+    for token in sample:
+        transport.send_chunk([token], message)
+    baseline = len(sample) / (time.perf_counter() - t)
+    transport.close()
+    print(f"one-by-one baseline: {baseline:,.0f} msg/s")
+
+    print(f"{'concurrency':>11} {'tokens':>7} {'ok':>7} {'invalid':>7} {'retried':>7} {'failed':>6} {'sec':>7} {'msg/s':>9} {'speedup':>8}")
+    for concurrency in args.concurrency:
+        pruned: List[str] = []
+        sender = fcm_sender.FcmSender(
+            fcm_sender.HttpV1Transport("bench", endpoint=endpoint, concurrency=concurrency),
+            on_invalid=pruned.extend,
+            max_parallel_chunks=args.chunks,
+            backoff_base_s=0.05,
+        )
+        report = sender.send(tokens, "bench", "bench", {"n": 1}, details=False)
+        sender.close()
+        rate = report["total_tokens"] / report["elapsed_s"]
+        failed = report["failure_count"] - report["invalid_count"]
+        assert len(pruned) == report["invalid_count"]
+        print(
+            f"{concurrency:>11} {report['total_tokens']:>7} {report['success_count']:>7} {report['invalid_count']:>7} "
+            f"{report['retried']:>7} {failed:>6} {report['elapsed_s']:>7.2f} {rate:>9,.0f} {rate / baseline:>7.1f}x"
+        )
+    proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Chunked, parallel FCM delivery with retry and invalid-token pruning.
+
+Recipients are split into chunks of ``FCM_CHUNK_SIZE`` (500, the FCM
+multicast cap). Up to ``FCM_MAX_PARALLEL_CHUNKS`` chunks are in flight at
+once; inside a chunk each token is one FCM HTTP v1 ``messages:send`` call,
+issued from a pool of ``FCM_HTTP_CONCURRENCY`` workers sharing one
+keep-alive ``requests.Session``, so the number of open connections and
+concurrent requests is bounded no matter how many tokens a push has.
+
+Outcomes per token:
+
+* ``ok`` -- delivered;
+* ``invalid`` -- UNREGISTERED / SENDER_ID_MISMATCH / invalid registration
+  token: reported to ``on_invalid`` (the token registry prunes them);
+* ``retry`` -- 429/500/503 or a network error: retried with exponential
+  backoff and full jitter (or the server's ``Retry-After``, capped at
+  ``FCM_BACKOFF_MAX_S``), at most ``FCM_MAX_RETRIES`` times;
+* ``failed`` -- anything else (bad payload, auth).
+
+``FCM_ENDPOINT`` points at Google by default; ``fcm_standin.py`` serves the
+same API locally for offline benchmarks (``bench_fcm_sender.py``).
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+FCM_ENDPOINT: str = os.getenv("FCM_ENDPOINT", "https://fcm.googleapis.com")
+FCM_CHUNK_SIZE: int = 500
+FCM_MAX_PARALLEL_CHUNKS: int = int(os.getenv("FCM_MAX_PARALLEL_CHUNKS", "4"))
+FCM_HTTP_CONCURRENCY: int = int(os.getenv("FCM_HTTP_CONCURRENCY", "64"))
+FCM_MAX_RETRIES: int = 4
+FCM_BACKOFF_BASE_S: float = 0.5
+FCM_BACKOFF_MAX_S: float = 30.0
+FCM_TIMEOUT_S: float = 10.0
+
+INVALID_ERROR_CODES = {"UNREGISTERED", "SENDER_ID_MISMATCH"}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+Outcome = Tuple[str, Any, Optional[float]]  # (kind, message id or error, retry-after seconds)
+
+
+def _error_code(body: Dict[str, Any]) -> Optional[str]:
+    err = body.get("error") or {}
+    for detail in err.get("details") or []:
+        if detail.get("errorCode"):
+            return detail["errorCode"]
+    return err.get("status")
+
+
+def classify(status: int, body: Dict[str, Any], retry_after: Optional[str] = None) -> Outcome:
+    """Map one HTTP v1 response to an outcome."""
+    if status == 200:
+        return "ok", body.get("name"), None
+    code = _error_code(body)
+    message = (body.get("error") or {}).get("message", "")
+    # only an explicit token error prunes: a bare 404 (wrong project id or
+    # endpoint) would otherwise mark every token invalid
+    if code in INVALID_ERROR_CODES:
+        return "invalid", code, None
+    if code == "INVALID_ARGUMENT" and "registration token" in message.lower():
+        return "invalid", code, None
+    if status in RETRY_STATUS:
+        try:
+            delay = float(retry_after) if retry_after else None
+        except ValueError:
+            delay = None
+        return "retry", code or f"HTTP {status}", delay
+    return "failed", f"{code or status}: {message}".strip(), None
+
+
+def firebase_credentials() -> Tuple[Optional[str], Optional[Callable[[], str]]]:
+    """(project_id, access-token getter) of the default firebase_admin app, if initialized."""
+    try:
+        import firebase_admin  # type: ignore
+        fb_app = firebase_admin.get_app()
+    except Exception:
+        return os.getenv("FCM_PROJECT_ID"), None
+    lock = threading.Lock()
+
+    def access_token() -> str:
+        with lock:  # google-auth caches and refreshes the token itself
+            return fb_app.credential.get_access_token().access_token
+
+    return fb_app.project_id or os.getenv("FCM_PROJECT_ID"), access_token
+
+
+class HttpV1Transport:
+    """FCM HTTP v1 over one pooled keep-alive session."""
+
+    def __init__(
+        self,
+        project_id: str,
+        access_token: Optional[Callable[[], str]] = None,
+        endpoint: str = FCM_ENDPOINT,
+        concurrency: int = FCM_HTTP_CONCURRENCY,
+    ):
+        self.url = f"{endpoint.rstrip('/')}/v1/projects/{project_id}/messages:send"
+        self._access_token = access_token
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fcm-http")
+
+    def _send_one(self, token: str, message: Dict[str, Any], headers: Dict[str, str]) -> Outcome:
+        payload = {"message": dict(message, token=token)}
+        try:
+            resp = self.session.post(self.url, json=payload, headers=headers, timeout=FCM_TIMEOUT_S)
+        except requests.RequestException as e:
+            return "retry", type(e).__name__, None
+        try:
+            body = resp.json()
+        except ValueError:
+            body = {}
+        return classify(resp.status_code, body, resp.headers.get("Retry-After"))
+
+    def send_chunk(self, tokens: List[str], message: Dict[str, Any]) -> List[Outcome]:
+        headers = {"Content-Type": "application/json"}
+        if self._access_token is not None:
+            headers["Authorization"] = f"Bearer {self._access_token()}"
+        return list(self._pool.map(lambda t: self._send_one(t, message, headers), tokens))
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+        self.session.close()
+
+
+def build_message(title: str, body: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    message: Dict[str, Any] = {"notification": {"title": title, "body": body}}
+    if data:
+        # FCM data values must be strings
+        message["data"] = {str(k): v if isinstance(v, str) else str(v) for k, v in data.items()}
+    return message
+
+
+class FcmSender:
+    def __init__(
+        self,
+        transport,
+        on_invalid: Optional[Callable[[List[str]], Any]] = None,
+        chunk_size: int = FCM_CHUNK_SIZE,
+        max_parallel_chunks: int = FCM_MAX_PARALLEL_CHUNKS,
+        max_retries: int = FCM_MAX_RETRIES,
+        backoff_base_s: float = FCM_BACKOFF_BASE_S,
+    ):
+        self.transport = transport
+        self.on_invalid = on_invalid
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self._chunks = ThreadPoolExecutor(max_workers=max_parallel_chunks, thread_name_prefix="fcm-chunk")
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(FCM_BACKOFF_MAX_S, self.backoff_base_s * 2 ** attempt))
+        return min(max(delay, retry_after or 0.0), FCM_BACKOFF_MAX_S)
+
+    def _deliver_chunk(self, tokens: List[str], message: Dict[str, Any]) -> Dict[str, Any]:
+        results: Dict[str, Outcome] = {}
+        pending = tokens
+        retries = 0
+        for attempt in range(self.max_retries + 1):
+            outcomes = self.transport.send_chunk(pending, message)
+            retry, wait = [], 0.0
+            for token, outcome in zip(pending, outcomes):
+                if outcome[0] == "retry" and attempt < self.max_retries:
+                    retry.append(token)
+                    wait = max(wait, outcome[2] or 0.0)
+                else:
+                    results[token] = outcome
+            if not retry:
+                break
+            retries += len(retry)
+            time.sleep(self._backoff(attempt, wait))
+            pending = retry
+        invalid = [t for t, o in results.items() if o[0] == "invalid"]
+        if invalid and self.on_invalid is not None:
+            self.on_invalid(invalid)
+        return {"results": results, "retries": retries}
+
+    def send(self, tokens: Iterable[str], title: str, body: str, data: Optional[Dict[str, Any]] = None, details: bool = True) -> Dict[str, Any]:
+        """Deliver one notification to every token; returns counts (and per-token details)."""
+        started = time.perf_counter()
+        tokens = list(dict.fromkeys(tokens))  # drop duplicates, keep order
+        message = build_message(title, body, data)
+        chunks = [tokens[i:i + self.chunk_size] for i in range(0, len(tokens), self.chunk_size)]
+        counts = {"ok": 0, "invalid": 0, "retry": 0, "failed": 0}
+        retries = 0
+        out: List[Dict[str, Any]] = []
+        for chunk_result in self._chunks.map(lambda c: self._deliver_chunk(c, message), chunks):
+            retries += chunk_result["retries"]
+            for token, (kind, info, _) in chunk_result["results"].items():
+                counts[kind] += 1
+                if details:
+                    item: Dict[str, Any] = {"token": token, "success": kind == "ok"}
+                    if kind == "ok":
+                        item["message_id"] = info
+                    else:
+                        item["error"] = info
+                        item["invalid"] = kind == "invalid"
+                    out.append(item)
+        elapsed = time.perf_counter() - started
+        report: Dict[str, Any] = {
+            "success_count": counts["ok"],
+            "failure_count": len(tokens) - counts["ok"],
+            "invalid_count": counts["invalid"],
+            "retried": retries,
+            "total_tokens": len(tokens),
+            "chunks": len(chunks),
+            "elapsed_s": round(elapsed, 3),
+        }
+        if details:
+            report["details"] = out
+        return report
+
+    def close(self) -> None:
+        self._chunks.shutdown(wait=False)
+        self.transport.close()
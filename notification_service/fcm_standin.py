@@ -0,0 +1,112 @@
+"""Local stand-in for the FCM HTTP v1 ``messages:send`` API.
+
+Answers ``POST /v1/projects/<project>/messages:send`` like FCM does, without
+delivering anything, so the sender can be exercised and benchmarked
+offline:
+
+* tokens starting with ``invalid`` get 404 ``UNREGISTERED``;
+* a fraction ``unavailable_rate`` of requests get 503 ``UNAVAILABLE``;
+* every request waits ``latency_ms`` first, to mimic the network.
+
+Run it standalone and point the service at it::
+
+    python fcm_standin.py --port 8090 --latency-ms 20
+    FCM_ENDPOINT=http://localhost:8090 FCM_PROJECT_ID=local uvicorn app:app --port 8006
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+
+class FcmStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: Tuple[str, int], latency_ms: float = 0.0, unavailable_rate: float = 0.0):
+        super().__init__(address, _Handler)
+        self.latency_s = latency_ms / 1000.0
+        self.unavailable_rate = unavailable_rate
+        self.counts: Dict[str, int] = {"ok": 0, "unregistered": 0, "unavailable": 0, "bad_request": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            self.counts[kind] += 1
+            return next(self._ids)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self, status: int, body: Dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        server: FcmStandIn = self.server  # type: ignore[assignment]
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 4 or parts[0] != "v1" or parts[1] != "projects" or parts[3] != "messages:send":
+            self._reply(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": "unknown path"}})
+            return
+        if server.latency_s:
+            time.sleep(server.latency_s)
+        try:
+            token = json.loads(raw)["message"]["token"]
+        except Exception:
+            server.count("bad_request")
+            self._reply(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT", "message": "Request contains an invalid argument."}})
+            return
+        if server.unavailable_rate and random.random() < server.unavailable_rate:
+            server.count("unavailable")
+            self._reply(503, {"error": {"code": 503, "status": "UNAVAILABLE", "message": "The service is currently unavailable."}})
+            return
+        if token.startswith("invalid"):
+            server.count("unregistered")
+            self._reply(404, {"error": {
+                "code": 404, "status": "NOT_FOUND", "message": "Requested entity was not found.",
+                "details": [{"@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError", "errorCode": "UNREGISTERED"}],
+            }})
+            return
+        n = server.count("ok")
+        self._reply(200, {"name": f"projects/{parts[2]}/messages/{n}"})
+
+
+def serve(port: int = 0, latency_ms: float = 0.0, unavailable_rate: float = 0.0) -> FcmStandIn:
+    """Start the stand-in on a background thread; ``port=0`` picks a free one."""
+    server = FcmStandIn(("127.0.0.1", port), latency_ms, unavailable_rate)
+    threading.Thread(target=server.serve_forever, name="fcm-standin", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local FCM HTTP v1 stand-in")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--unavailable-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FcmStandIn(("0.0.0.0", args.port), args.latency_ms, args.unavailable_rate)
+    print(f"[FCM STAND-IN] listening on :{args.port} (latency {args.latency_ms} ms, 503 rate {args.unavailable_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"[FCM STAND-IN] {server.counts}")
+
+
+if __name__ == "__main__":
+    main()
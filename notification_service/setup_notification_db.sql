@@ -0,0 +1,26 @@
+-- Setup Database untuk Notification Service
+-- Jalankan script ini di phpMyAdmin
+
+-- Buat database
+CREATE DATABASE IF NOT EXISTS notification_service;
+USE notification_service;
+
+-- Buat tabel untuk token perangkat (FCM)
+-- token_hash = SHA-256 dari fcm_token, dipakai sebagai primary key
+CREATE TABLE IF NOT EXISTS device_tokens (
+    token_hash CHAR(64) NOT NULL PRIMARY KEY,
+    fcm_token VARCHAR(4096) NOT NULL,
+    platform VARCHAR(20),
+    user_id VARCHAR(100),
+    topics VARCHAR(1024) DEFAULT '',  -- dipisah koma
+    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    invalid_at TIMESTAMP NULL,  -- diisi saat FCM menolak token; dihapus setelah masa tenggang
+    INDEX idx_platform (platform),
+    INDEX idx_user_id (user_id),
+    INDEX idx_last_seen (last_seen)
+);
+
+-- Tampilkan hasil setup
+SELECT 'Database notification_service berhasil dibuat!' as status;
+SELECT COUNT(*) as total_device_tokens FROM device_tokens;
@@ -5,6 +5,11 @@ from typing import List, Optional
 import json
 from datetime import datetime
 
+try:
+    from .token_registry import TokenRegistry
+except Exception:
+    from token_registry import TokenRegistry
+
 app = FastAPI(title="JIR Smart City Notification Service", version="1.0.0")
 
 # CORS middleware
@@ -16,13 +21,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage for demo
-device_tokens = []
+# In-memory storage for demo (registry without database)
+registry = TokenRegistry()
 notification_log = []
 
 class RegisterTokenReq(BaseModel):
     fcm_token: str
     platform: Optional[str] = None
+    user_id: Optional[str] = None
+    topics: Optional[List[str]] = None
 
 class PushReq(BaseModel):
     title: str
@@ -31,6 +38,12 @@ class PushReq(BaseModel):
     topic: Optional[str] = None
     data: Optional[dict] = None
 
+class UserPushReq(BaseModel):
+    title: str
+    body: str
+    user_ids: List[str]
+    data: Optional[dict] = None
+
 def admin_auth(x_api_key: str = Header(...)):
     if x_api_key != "admin123":
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -48,20 +61,11 @@ async def health_check_alt():
 def register_device(payload: RegisterTokenReq):
     """Register device token for push notifications"""
     token = payload.fcm_token
-    device_info = {
-        "fcm_token": token,
-        "platform": payload.platform,
-        "registered_at": datetime.now().isoformat()
-    }
-    
-    # Check if token already exists
-    existing = next((d for d in device_tokens if d["fcm_token"] == token), None)
-    if not existing:
-        device_tokens.append(device_info)
+    if registry.register(token, payload.platform, payload.user_id, payload.topics):
         print(f"[REGISTER] New device registered: {token[:10]}...")
     else:
         print(f"[REGISTER] Device already exists: {token[:10]}...")
-    
+
     return {"ok": True, "message": "Device registered successfully"}
 
 @app.post("/api/notification/admin/push", dependencies=[Depends(admin_auth)])
@@ -81,7 +85,7 @@ def admin_push(req: PushReq):
         }
     else:
         # Send to all registered devices
-        tokens_to_send = [device["fcm_token"] for device in device_tokens]
+        tokens_to_send = registry.tokens()
 
     if not tokens_to_send:
         raise HTTPException(status_code=400, detail="No device tokens available")
@@ -136,12 +140,22 @@ def admin_push(req: PushReq):
         "details": details
     }
 
+@app.post("/api/notification/admin/push-users", dependencies=[Depends(admin_auth)])
+def admin_push_users(req: UserPushReq):
+    """Send push notification only to the devices of the given users"""
+    tokens = registry.tokens(user_ids=req.user_ids)
+    if not tokens:
+        return {"success_count": 0, "failure_count": 0, "total_tokens": 0, "total_users": len(req.user_ids)}
+    result = admin_push(PushReq(title=req.title, body=req.body, tokens=tokens, data=req.data))
+    result["total_users"] = len(req.user_ids)
+    return result
+
 @app.get("/api/notification/devices")
 async def get_registered_devices():
     """Get list of registered devices"""
     return {
-        "total_devices": len(device_tokens),
-        "devices": device_tokens
+        "total_devices": len(registry),
+        "devices": registry.devices()
     }
 
 @app.get("/api/notification/log")
@@ -0,0 +1,265 @@
+"""Device token registry: hash-indexed in memory, persisted in MySQL.
+
+Tokens live in a dict keyed by the token itself, with secondary indexes
+``platform -> tokens``, ``topic -> tokens`` and ``user_id -> tokens``, so
+registering a device is O(1) and resolving a push target is O(k) in the
+number of tokens returned. Every change is written through to the
+``device_tokens`` table (primary key ``token_hash`` = SHA-256 of the token),
+and the registry is loaded from it at startup. If the database is down the
+registry keeps working in memory and logs the failed writes.
+
+Eviction:
+
+* tokens FCM reports as unregistered/invalid are excluded from targets at
+  once and deleted ``INVALID_GRACE_S`` later, unless re-registered;
+* tokens not seen (registered or refreshed) for ``TOKEN_TTL_DAYS`` are
+  deleted as stale.
+
+``sweep()`` does both and runs every ``SWEEP_INTERVAL_S`` once ``start()``
+is called.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+TOKEN_TTL_DAYS: int = 60
+INVALID_GRACE_S: float = 24 * 3600
+SWEEP_INTERVAL_S: float = 3600
+
+_UPSERT_SQL = """
+    INSERT INTO device_tokens (token_hash, fcm_token, platform, user_id, topics, registered_at, last_seen, invalid_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, NULL)
+    ON DUPLICATE KEY UPDATE
+        platform = VALUES(platform),
+        user_id = VALUES(user_id),
+        topics = VALUES(topics),
+        last_seen = VALUES(last_seen),
+        invalid_at = NULL
+"""
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenRegistry:
+    def __init__(self, get_connection: Optional[Callable[[], Any]] = None):
+        self._get_connection = get_connection
+        self._lock = threading.Lock()
+        self._devices: Dict[str, Dict[str, Any]] = {}
+        self._by_platform: Dict[str, Set[str]] = {}
+        self._by_topic: Dict[str, Set[str]] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+        self._invalid: Dict[str, float] = {}  # token -> time FCM rejected it
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- indexes (caller holds the lock) ---
+
+    def _index(self, token: str, device: Dict[str, Any]) -> None:
+        if device.get("platform"):
+            self._by_platform.setdefault(device["platform"], set()).add(token)
+        if device.get("user_id"):
+            self._by_user.setdefault(device["user_id"], set()).add(token)
+        for topic in device["topics"]:
+            self._by_topic.setdefault(topic, set()).add(token)
+
+    def _unindex(self, token: str, device: Dict[str, Any]) -> None:
+        for index, key in [(self._by_platform, device.get("platform")), (self._by_user, device.get("user_id"))] + [
+            (self._by_topic, topic) for topic in device["topics"]
+        ]:
+            members = index.get(key)
+            if members is not None:
+                members.discard(token)
+                if not members:
+                    del index[key]
+
+    def _remove(self, token: str) -> None:
+        device = self._devices.pop(token, None)
+        if device is not None:
+            self._unindex(token, device)
+        self._invalid.pop(token, None)
+
+    # --- persistence ---
+
+    def _execute(self, sql: str, rows: List[tuple]) -> None:
+        if not self._get_connection or not rows:
+            return
+        conn = self._get_connection()
+        if not conn:
+            print("[TOKENS] database unavailable; change kept in memory only")
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(sql, rows)
+            conn.commit()
+        except Exception as e:
+            print(f"[TOKENS DB ERROR] {e}")
+        finally:
+            cursor.close()
+            conn.close()
+
+    def load(self) -> int:
+        """Replace the in-memory state with the ``device_tokens`` table."""
+        if not self._get_connection:
+            return 0
+        conn = self._get_connection()
+        if not conn:
+            return 0
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT fcm_token, platform, user_id, topics, registered_at, last_seen, invalid_at FROM device_tokens")
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+        with self._lock:
+            self._devices.clear()
+            self._by_platform.clear()
+            self._by_topic.clear()
+            self._by_user.clear()
+            self._invalid.clear()
+            for r in rows:
+                device = {
+                    "fcm_token": r["fcm_token"],
+                    "platform": r["platform"],
+                    "user_id": r["user_id"],
+                    "topics": set(filter(None, (r["topics"] or "").split(","))),
+                    "registered_at": r["registered_at"],
+                    "last_seen": r["last_seen"],
+                }
+                self._devices[r["fcm_token"]] = device
+                self._index(r["fcm_token"], device)
+                if r["invalid_at"] is not None:
+                    self._invalid[r["fcm_token"]] = r["invalid_at"].timestamp()
+        print(f"[TOKENS] loaded {len(rows)} device tokens")
+        return len(rows)
+
+    # --- API ---
+
+    def register(self, token: str, platform: Optional[str] = None, user_id: Optional[str] = None, topics: Optional[Iterable[str]] = None) -> bool:
+        """Add or refresh a token; returns True if it was not registered before."""
+        now = datetime.now()
+        with self._lock:
+            old = self._devices.get(token)
+            if old is not None:
+                self._unindex(token, old)
+            device = {
+                "fcm_token": token,
+                "platform": platform if platform is not None else (old or {}).get("platform"),
+                "user_id": user_id if user_id is not None else (old or {}).get("user_id"),
+                "topics": set(topics) if topics is not None else (old or {}).get("topics", set()),
+                "registered_at": old["registered_at"] if old else now,
+                "last_seen": now,
+            }
+            self._devices[token] = device
+            self._index(token, device)
+            self._invalid.pop(token, None)
+        self._execute(_UPSERT_SQL, [(
+            token_hash(token), token, device["platform"], device["user_id"],
+            ",".join(sorted(device["topics"])), device["registered_at"], now,
+        )])
+        return old is None
+
+    def unregister(self, token: str) -> bool:
+        with self._lock:
+            known = token in self._devices
+            self._remove(token)
+        self._execute("DELETE FROM device_tokens WHERE token_hash = %s", [(token_hash(token),)])
+        return known
+
+    def mark_invalid(self, tokens: Iterable[str]) -> int:
+        """Exclude tokens FCM rejected as unregistered/invalid; deleted after the grace period."""
+        now = time.time()
+        marked = []
+        with self._lock:
+            for token in tokens:
+                if token in self._devices and token not in self._invalid:
+                    self._invalid[token] = now
+                    marked.append(token)
+        self._execute("UPDATE device_tokens SET invalid_at = %s WHERE token_hash = %s", [(datetime.fromtimestamp(now), token_hash(t)) for t in marked])
+        if marked:
+            print(f"[TOKENS] {len(marked)} tokens marked invalid")
+        return len(marked)
+
+    def _match(self, platform: Optional[str], topic: Optional[str], user_ids: Optional[Iterable[str]]) -> Iterable[str]:
+        """Tokens matching every given filter, smallest index first (caller holds the lock)."""
+        sets = []
+        if platform is not None:
+            sets.append(self._by_platform.get(platform, set()))
+        if topic is not None:
+            sets.append(self._by_topic.get(topic, set()))
+        if user_ids is not None:
+            sets.append(set().union(*(self._by_user.get(u, ()) for u in user_ids)))
+        if not sets:
+            return self._devices.keys()
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def tokens(self, platform: Optional[str] = None, topic: Optional[str] = None, user_ids: Optional[Iterable[str]] = None) -> List[str]:
+        """Valid tokens matching every given filter (no filter: all)."""
+        with self._lock:
+            return [t for t in self._match(platform, topic, user_ids) if t not in self._invalid]
+
+    def devices(self, platform: Optional[str] = None, topic: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        out = []
+        with self._lock:
+            for token in self._match(platform, topic, None):
+                if len(out) >= limit:
+                    break
+                d = self._devices[token]
+                out.append({
+                    "fcm_token": token,
+                    "platform": d["platform"],
+                    "user_id": d["user_id"],
+                    "topics": sorted(d["topics"]),
+                    "registered_at": d["registered_at"].isoformat(),
+                    "valid": token not in self._invalid,
+                })
+        return out
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Delete invalid tokens past their grace period and stale tokens."""
+        now = time.time() if now is None else now
+        stale_before = now - TOKEN_TTL_DAYS * 86400
+        with self._lock:
+            doomed = [t for t, at in self._invalid.items() if now - at >= INVALID_GRACE_S]
+            doomed += [t for t, d in self._devices.items() if t not in self._invalid and d["last_seen"].timestamp() < stale_before]
+            for token in doomed:
+                self._remove(token)
+        self._execute("DELETE FROM device_tokens WHERE token_hash = %s", [(token_hash(t),) for t in doomed])
+        if doomed:
+            print(f"[TOKENS] removed {len(doomed)} invalid/stale tokens")
+        return len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_devices": len(self._devices),
+                "invalid": len(self._invalid),
+                "platforms": {p: len(t) for p, t in self._by_platform.items()},
+                "topics": {t: len(v) for t, v in self._by_topic.items()},
+                "users": len(self._by_user),
+            }
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-sweep", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(SWEEP_INTERVAL_S):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[TOKENS ERROR] {e}")
@@ -1,16 +1,39 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from typing import Optional, List
 from io import BytesIO
+import asyncio
+import base64
 import os
 import json
+import math
+import shutil
 import tempfile
+import time
+from datetime import datetime
 from pathlib import Path
 import mysql.connector
 from mysql.connector import Error
 from pydantic import BaseModel
 
+try:
+    from . import blob_store, derivatives, geo, ocr_batch, ocr_jobs, search, timing
+    from .pdf_pages import load_pdf
+    from .upload_stream import ARCHIVE_KINDS, DOCUMENT_KINDS, MAX_BATCH_BYTES, MAX_DOCUMENT_BYTES, stream_upload, upload_limit
+except Exception:
+    import blob_store
+    import derivatives
+    import geo
+    import ocr_batch
+    import ocr_jobs
+    import search
+    import timing
+    from pdf_pages import load_pdf
+    from upload_stream import ARCHIVE_KINDS, DOCUMENT_KINDS, MAX_BATCH_BYTES, MAX_DOCUMENT_BYTES, stream_upload, upload_limit
+
 try:
     # Preferred: PaddleOCR (no external binary)
     from paddleocr import PaddleOCR  # type: ignore
@@ -43,6 +66,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def reject_oversize_uploads(request: Request, call_next):
+    """Refuse an upload from its Content-Length, before the multipart body is received."""
+    limit = upload_limit(request.method, request.url.path)
+    length = request.headers.get("content-length")
+    if limit is not None and length and length.isdigit() and int(length) > limit:
+        return JSONResponse(status_code=413, content={"detail": f"Request too large (max {limit} bytes)"})
+    return await call_next(request)
+
 # Pydantic models for form validation
 class ReportForm(BaseModel):
     report_type: str
@@ -61,6 +93,8 @@ OCR_ENGINE = {
     "name": None,
     "instance": None
 }
+OCR_EVENTS_TIMEOUT_SECONDS = 300
+
 def get_db_connection():
     try:
         connection = mysql.connector.connect(
@@ -199,148 +233,345 @@ def run_ocr_on_bytes(image_bytes: bytes, lang: str = "latin"):
     raise HTTPException(status_code=500, detail="No OCR engine available. Install paddleocr or tesseract.")
 
 
-@app.post("/ocr")
-async def ocr_final(file: UploadFile = File(...), lang: Optional[str] = "latin"):
-    """Upload dokumen (PDF/PNG/JPG/WebP) dan kembalikan hasil ringkas: message, lokasi, lat, long."""
-    if not file:
-        raise HTTPException(status_code=400, detail="No file uploaded")
-    content = await file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty file")
+def process_document(content: bytes, filename: Optional[str], content_type: Optional[str], content_sha256: Optional[str] = None):
+    """Run OCR -> LLM -> geocode on one document and store it in ocr_results.
 
-    # Save to temp files (handle image or PDF pages) and use existing pipeline from test_ocr.py
+    Returns ``(minimal, result_id)``; ``result_id`` is None when the DB insert
+    failed (persisting stays best-effort, as before).
+    """
+    # reuse pipeline (OCR -> LLM -> geocode)
     try:
-        # reuse pipeline (OCR -> LLM -> geocode)
-        try:
-            from .test_ocr import run_ocr_for
-        except Exception:
-            from test_ocr import run_ocr_for
+        from .test_ocr import analyze_text, run_ocr_for
+    except Exception:
+        from test_ocr import analyze_text, run_ocr_for
 
-        def _pdf_bytes_to_image_paths(pdf_bytes: bytes) -> List[Path]:
-            paths: List[Path] = []
-            # Try PyMuPDF (fitz)
+    temp_paths: List[Path] = []
+    text_pages: List[str] = []
+    ctype = (content_type or "").lower()
+    name = (filename or "").lower()
+    is_pdf = ctype == "application/pdf" or name.endswith(".pdf")
+    if is_pdf:
+        with timing.span("pdf_render") as sp:
+            pages = load_pdf(content)
+            text_pages = [pg.text for pg in pages if pg.text is not None]
+            temp_paths = [pg.image_path for pg in pages if pg.image_path is not None]
+            sp["pages"] = len(pages)
+            sp["text_layer_pages"] = len(text_pages)
+        if not pages:
+            raise HTTPException(status_code=415, detail="Cannot convert PDF to images (install PyMuPDF or pdf2image)")
+    else:
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(name)[1] or ".png", delete=False) as tmp:
+            tmp_path = Path(tmp.name)
+            tmp.write(content)
+            temp_paths = [tmp_path]
+
+    # Run OCR on pages, pick best (longest text)
+    # Pages with a usable text layer skip OCR
+    results = [analyze_text(t, filename or "document.pdf", "pdf-text") for t in text_pages]
+    try:
+        for p in temp_paths:
             try:
-                import fitz  # type: ignore
-                doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-                for page_idx in range(min(len(doc), 3)):  # limit first 3 pages
-                    page = doc.load_page(page_idx)
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x scale for quality
-                    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-                        tmp_path = Path(tmp.name)
-                        tmp.write(pix.tobytes())
-                        paths.append(tmp_path)
-                doc.close()
-                return paths
+                results.append(run_ocr_for(p))
             except Exception:
-                pass
-            # Try pdf2image
+                continue
+    finally:
+        for p in temp_paths:
             try:
-                from pdf2image import convert_from_bytes  # type: ignore
-                images = convert_from_bytes(pdf_bytes, fmt="png", dpi=200, first_page=1, last_page=3)
-                for img in images:
-                    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-                        tmp_path = Path(tmp.name)
-                        img.save(tmp_path, format="PNG")
-                        paths.append(tmp_path)
-                return paths
+                p.unlink(missing_ok=True)
             except Exception:
-                return []
-
-        temp_paths: List[Path] = []
-        ctype = (file.content_type or "").lower()
-        name = (file.filename or "").lower()
-        is_pdf = ctype == "application/pdf" or name.endswith(".pdf")
-        if is_pdf:
-            temp_paths = _pdf_bytes_to_image_paths(content)
-            if not temp_paths:
-                raise HTTPException(status_code=415, detail="Cannot convert PDF to images (install PyMuPDF or pdf2image)")
-        else:
-            with tempfile.NamedTemporaryFile(suffix=os.path.splitext(name)[1] or ".png", delete=False) as tmp:
-                tmp_path = Path(tmp.name)
-                tmp.write(content)
-                temp_paths = [tmp_path]
+                pass
 
-        # Run OCR on pages, pick best (longest text)
-        results = []
-        try:
-            for p in temp_paths:
-                try:
-                    results.append(run_ocr_for(p))
-                except Exception:
-                    continue
-        finally:
-            for p in temp_paths:
-                try:
-                    p.unlink(missing_ok=True)
-                except Exception:
-                    pass
-
-        if not results:
-            raise HTTPException(status_code=500, detail="OCR failed for all pages")
-
-        result = max(results, key=lambda r: (r.get("length") or 0))
-
-        # Build minimal object
-        geocoding = (result.get("geocoding") or {})
-        primary = (geocoding.get("primary") or {}) if isinstance(geocoding, dict) else {}
-        llm = (result.get("llm") or {})
-        llm_output = (llm.get("output") or {}) if isinstance(llm, dict) else {}
-        lokasi = None
-        if isinstance(llm_output, dict):
-            lb = llm_output.get("lokasi_banjir") or {}
-            if isinstance(lb, dict):
-                lokasi = lb.get("nama")
-        if not lokasi:
-            cand = (llm_output.get("normalized_query_candidates") if isinstance(llm_output, dict) else None) or []
-            if isinstance(cand, list) and cand:
-                lokasi = str(cand[0])
-            elif isinstance(primary, dict):
-                lokasi = primary.get("display_name")
-        message = (llm_output.get("ringkasan") if isinstance(llm_output, dict) else None) or ""
-
-        minimal = [{
-            "message": message,
-            "lokasi": lokasi or "",
-            "lat": primary.get("lat") if isinstance(primary, dict) else None,
-            "long": primary.get("lon") if isinstance(primary, dict) else None,
-        }]
-
-        # Persist to DB (best-effort)
-        try:
+    if not results:
+        raise HTTPException(status_code=500, detail="OCR failed for all pages")
+
+    result = max(results, key=lambda r: (r.get("length") or 0))
+
+    # Build minimal object
+    geocoding = (result.get("geocoding") or {})
+    primary = (geocoding.get("primary") or {}) if isinstance(geocoding, dict) else {}
+    llm = (result.get("llm") or {})
+    llm_output = (llm.get("output") or {}) if isinstance(llm, dict) else {}
+    lokasi = None
+    if isinstance(llm_output, dict):
+        lb = llm_output.get("lokasi_banjir") or {}
+        if isinstance(lb, dict):
+            lokasi = lb.get("nama")
+    if not lokasi:
+        cand = (llm_output.get("normalized_query_candidates") if isinstance(llm_output, dict) else None) or []
+        if isinstance(cand, list) and cand:
+            lokasi = str(cand[0])
+        elif isinstance(primary, dict):
+            lokasi = primary.get("display_name")
+    message = (llm_output.get("ringkasan") if isinstance(llm_output, dict) else None) or ""
+
+    minimal = [{
+        "message": message,
+        "lokasi": lokasi or "",
+        "lat": primary.get("lat") if isinstance(primary, dict) else None,
+        "long": primary.get("lon") if isinstance(primary, dict) else None,
+    }]
+
+    # Persist to DB (best-effort)
+    result_id = None
+    try:
+        with timing.span("db_insert"):
             conn = get_db_connection()
             if conn:
                 cur = conn.cursor()
                 cur.execute(
                     """
-                    INSERT INTO ocr_results (message, lokasi, latitude, longitude, source_file, engine)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    INSERT INTO ocr_results (message, lokasi, latitude, longitude, source_file, engine, content_sha256, search_text)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                     """,
                     (
                         message,
                         lokasi,
                         (primary.get("lat") if isinstance(primary, dict) else None),
                         (primary.get("lon") if isinstance(primary, dict) else None),
-                        file.filename,
-                        (OCR_ENGINE.get("name") or "unknown"),
+                        filename,
+                        (result.get("engine") or OCR_ENGINE.get("name") or "unknown"),
+                        content_sha256 or blob_store.hash_bytes(content),
+                        search.index_text(message, lokasi),
                     ),
                 )
+                result_id = cur.lastrowid
                 conn.commit()
                 cur.close()
                 conn.close()
-        except Exception as _:
-            pass
+    except Exception as _:
+        pass
+
+    return minimal, result_id
+
+
+def _process_job(job: dict):
+    content = Path(job["file_path"]).read_bytes()
+    if not content:
+        raise HTTPException(status_code=400, detail="Empty file")
+    return process_document(content, job.get("source_file"), job.get("content_type"), job.get("content_sha256"))
+
+
+OCR_WORKERS = ocr_jobs.JobWorkerPool(get_db_connection, _process_job)
+
+
+@app.on_event("startup")
+def start_ocr_workers():
+    ocr_jobs.JOB_DIR.mkdir(parents=True, exist_ok=True)
+    OCR_WORKERS.start()
+    derivatives.start_worker()
+
+
+@app.on_event("shutdown")
+def stop_ocr_workers():
+    OCR_WORKERS.stop()
+
+
+def _find_duplicate_ocr(conn, sha256: str):
+    """Return ``("result", row)`` or ``("job", job_id)`` for an already-seen document."""
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(
+            """
+            SELECT id, message, lokasi, latitude, longitude, source_file, engine, created_at
+            FROM ocr_results
+            WHERE content_sha256 = %s
+            ORDER BY id DESC
+            LIMIT 1
+            """,
+            (sha256,),
+        )
+        row = cur.fetchone()
+        if row:
+            return "result", row
+        cur.execute(
+            """
+            SELECT id FROM ocr_jobs
+            WHERE content_sha256 = %s AND status IN ('queued', 'processing')
+            ORDER BY id
+            LIMIT 1
+            """,
+            (sha256,),
+        )
+        job = cur.fetchone()
+        if job:
+            return "job", job["id"]
+        return None, None
+    finally:
+        cur.close()
+
+
+@app.post("/ocr", status_code=202)
+async def ocr_final(file: UploadFile = File(...), lang: Optional[str] = "latin"):
+    """Upload dokumen (PDF/PNG/JPG/WebP) dan antrekan untuk OCR.
+
+    Mengembalikan job id; hasil (message, lokasi, lat, long) diambil lewat
+    GET /ocr/jobs/{job_id} atau di-stream lewat GET /ocr/jobs/{job_id}/events.
+    """
+    if not file:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+
+    upload = await stream_upload(file, ocr_jobs.JOB_DIR, MAX_DOCUMENT_BYTES, DOCUMENT_KINDS)
+    if upload is None:
+        raise HTTPException(status_code=400, detail="Empty file")
+    dest, sha256 = upload.path, upload.sha256
+
+    conn = get_db_connection()
+    if not conn:
+        dest.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        # Same bytes seen before: answer from ocr_results or join the pending job
+        kind, found = await run_in_threadpool(_find_duplicate_ocr, conn, sha256)
+        if kind is not None:
+            dest.unlink(missing_ok=True)
+        if kind == "result":
+            return JSONResponse(jsonable_encoder({
+                "status": "done",
+                "duplicate": True,
+                "result_id": found["id"],
+                "result": [{
+                    "message": found.get("message") or "",
+                    "lokasi": found.get("lokasi") or "",
+                    "lat": found.get("latitude"),
+                    "long": found.get("longitude"),
+                }],
+            }))
+        if kind == "job":
+            job_id = found
+        else:
+            job_id = await run_in_threadpool(ocr_jobs.enqueue, conn, dest, file.filename, upload.content_type, lang, sha256)
+    except Error as e:
+        dest.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+    OCR_WORKERS.notify()
+
+    return JSONResponse(status_code=202, content={
+        "duplicate": kind == "job",
+        "status": "queued",
+        "job_id": job_id,
+        "status_url": f"/ocr/jobs/{job_id}",
+        "events_url": f"/ocr/jobs/{job_id}/events",
+    })
+
+
+def _fetch_job(job_id: int):
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        return ocr_jobs.get_job(conn, job_id)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+
+
+def _job_view(job: Optional[dict], debug: bool) -> Optional[dict]:
+    # per-stage timings (see timing.py) only when asked for
+    if job and not debug:
+        job.pop("timings", None)
+    return job
+
+
+@app.get("/ocr/jobs/{job_id}")
+async def get_ocr_job(job_id: int, debug: bool = False):
+    job = await run_in_threadpool(_fetch_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Not found")
+    return _job_view(job, debug)
+
+
+@app.get("/ocr/jobs/{job_id}/events")
+async def stream_ocr_job(job_id: int, debug: bool = False):
+    """Server-sent events: one ``status`` event per change until done/failed."""
+    first = _job_view(await run_in_threadpool(_fetch_job, job_id), debug)
+    if not first:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    async def events():
+        job, last = first, None
+        deadline = time.monotonic() + OCR_EVENTS_TIMEOUT_SECONDS
+        while True:
+            if job and job.get("status") != last:
+                last = job.get("status")
+                yield f"event: status\ndata: {json.dumps(job, default=str, ensure_ascii=False)}\n\n"
+            if last in ("done", "failed") or time.monotonic() > deadline:
+                return
+            await asyncio.sleep(1.0)
+            try:
+                job = _job_view(await run_in_threadpool(_fetch_job, job_id), debug)
+            except HTTPException:
+                job = None
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/ocr/batch", status_code=202)
+async def ocr_batch_ingest(file: Optional[UploadFile] = File(None), directory: Optional[str] = Form(None)):
+    """Ingest banyak dokumen sekaligus: upload satu .zip, atau sebut folder di bawah uploads/batch_inbox.
+
+    Batch berjalan di background (OCR paralel antar proses, geocode
+    di-dedup, insert massal); progres dan laporan throughput lewat
+    GET /ocr/batch/{batch_id}.
+    """
+    if (file is None) == (not directory):
+        raise HTTPException(status_code=400, detail="Provide either a zip file or a directory")
+
+    work_dir = None
+    if file is not None:
+        upload = await stream_upload(file, ocr_batch.BATCH_WORK_DIR, MAX_BATCH_BYTES, ARCHIVE_KINDS)
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Empty file")
+        work_dir = ocr_batch.BATCH_WORK_DIR / f"{upload.sha256[:16]}-{int(time.time() * 1000)}"
+        try:
+            docs = await run_in_threadpool(ocr_batch.extract_zip, upload.path, work_dir)
+        except Exception as e:
+            await run_in_threadpool(shutil.rmtree, work_dir, True)
+            raise HTTPException(status_code=400, detail=f"Invalid zip: {e}")
+        finally:
+            upload.path.unlink(missing_ok=True)
+    else:
+        inbox = ocr_batch.BATCH_INBOX.resolve()
+        src = (inbox / directory).resolve()
+        if not src.is_relative_to(inbox) or not src.is_dir():
+            raise HTTPException(status_code=400, detail=f"Directory not found under {ocr_batch.BATCH_INBOX}")
+        docs = await run_in_threadpool(ocr_batch.collect_directory, src)
+
+    if not docs:
+        if work_dir is not None:
+            await run_in_threadpool(shutil.rmtree, work_dir, True)
+        raise HTTPException(status_code=400, detail="No supported documents (PDF/JPEG/PNG/WebP) found")
+
+    batch_id = ocr_batch.submit(docs, get_db_connection, cleanup_dir=work_dir)
+    return {
+        "status": "queued",
+        "batch_id": batch_id,
+        "documents": len(docs),
+        "status_url": f"/ocr/batch/{batch_id}",
+    }
+
+
+@app.get("/ocr/batch/{batch_id}")
+async def get_ocr_batch(batch_id: str):
+    batch = ocr_batch.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Not found")
+    return JSONResponse(jsonable_encoder(batch))
 
-        return JSONResponse(minimal)
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"OCR pipeline failed: {e}")
 
 @app.get("/")
 async def root():
     return {"service": "report", "status": "ok", "ocr_engine": OCR_ENGINE.get("name")}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus exposition of per-stage pipeline histograms."""
+    return Response(content=timing.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/db/health")
 async def db_health():
     conn = get_db_connection()
@@ -486,48 +717,48 @@ async def submit_report(
     if urgency not in valid_urgency:
         raise HTTPException(status_code=400, detail=f"Invalid urgency. Must be one of: {valid_urgency}")
     
-    # Process evidence files
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    # Process evidence files: streamed to disk in chunks, then moved into the
+    # content-addressed store (identical files are stored once)
     evidence_file_names = []
+    created_blobs = []  # files this request added to the store; removed again on rollback
     if evidence_files:
-        # Create uploads directory if it doesn't exist
-        upload_dir = Path("uploads")
-        upload_dir.mkdir(exist_ok=True)
-        
-        import time
-        import random
-        
         for file in evidence_files:
             if file.filename and file.filename.strip():
                 try:
-                    # Generate unique filename
-                    file_extension = Path(file.filename).suffix
-                    timestamp = int(time.time())
-                    random_num = random.randint(1000, 9999)
-                    unique_filename = f"{report_type}_{timestamp}_{random_num}{file_extension}"
-                    file_path = upload_dir / unique_filename
-                    
-                    # Save file
-                    content = await file.read()
-                    if content:  # Only save if content is not empty
-                        with open(file_path, "wb") as f:
-                            f.write(content)
-                        evidence_file_names.append(unique_filename)
+                    upload = await stream_upload(file, blob_store.UPLOAD_ROOT / "tmp")
+                    if upload is None:  # Only save if content is not empty
+                        continue
+                    if any(upload.sha256 in n for n in evidence_file_names):
+                        upload.path.unlink(missing_ok=True)
+                        continue  # same file attached twice to this report
+                    stored_name = await run_in_threadpool(
+                        blob_store.put_file, conn, upload.path, upload.sha256, upload.size, upload.ext, upload.content_type,
+                        created_blobs
+                    )
+                    evidence_file_names.append(stored_name)
+                except HTTPException:
+                    # oversize / unsupported evidence rejects the whole report
+                    conn.rollback()
+                    blob_store.remove_files(conn, created_blobs)
+                    conn.close()
+                    raise
                 except Exception as e:
                     print(f"Error processing file {file.filename}: {e}")
                     continue
     
     # Save to database
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise HTTPException(status_code=500, detail="Database connection failed")
-        
         cur = conn.cursor()
         cur.execute(
             """
             INSERT INTO reports (report_type, title, description, location, latitude, longitude, 
-                               reporter_name, reporter_phone, reporter_email, urgency, evidence_files)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                               reporter_name, reporter_phone, reporter_email, urgency, evidence_files, geohash,
+                               search_text)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """,
             (
                 report_type,
@@ -540,13 +771,16 @@ async def submit_report(
                 reporter_phone,
                 reporter_email,
                 urgency,
-                json.dumps(evidence_file_names) if evidence_file_names else None
+                json.dumps(evidence_file_names) if evidence_file_names else None,
+                geo.geohash_encode(latitude, longitude) if latitude is not None and longitude is not None else None,
+                search.index_text(title, description, location)
             )
         )
         report_id = cur.lastrowid
         conn.commit()
         cur.close()
-        conn.close()
+        for name in evidence_file_names:
+            derivatives.enqueue(name)
         
         return JSONResponse({
             "status": "success",
@@ -556,9 +790,41 @@ async def submit_report(
         })
         
     except Error as e:
+        conn.rollback()
+        blob_store.remove_files(conn, created_blobs)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
+        conn.rollback()
+        blob_store.remove_files(conn, created_blobs)
         raise HTTPException(status_code=500, detail=f"Error submitting report: {str(e)}")
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+REPORT_COLUMNS_FULL = """id, report_type, title, description, location, latitude, longitude,
+                   reporter_name, reporter_phone, reporter_email, urgency, status,
+                   evidence_files, created_at, updated_at"""
+# Listing projection without description and reporter PII
+REPORT_COLUMNS_SUMMARY = """id, report_type, title, location, latitude, longitude,
+                   urgency, status, evidence_files, created_at, updated_at"""
+REPORTS_MAX_LIMIT = 200
+
+
+def encode_report_cursor(created_at, report_id: int) -> str:
+    raw = f"{created_at.isoformat() if hasattr(created_at, 'isoformat') else created_at}|{int(report_id)}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_report_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, report_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_at), int(report_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 # Get all reports
@@ -567,9 +833,21 @@ async def get_reports(
     limit: int = 50,
     report_type: Optional[str] = None,
     status: Optional[str] = None,
-    urgency: Optional[str] = None
+    urgency: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: str = "full"
 ):
-    """Get reports with optional filtering."""
+    """Get reports with optional filtering.
+
+    Keyset-paginated on (created_at, id): pass the returned ``next_cursor`` to
+    get the following page. ``fields=summary`` omits description and reporter
+    contact details.
+    """
+    if fields not in ("full", "summary"):
+        raise HTTPException(status_code=400, detail="Invalid fields. Must be one of: ['full', 'summary']")
+    limit = max(1, min(int(limit), REPORTS_MAX_LIMIT))
+    after = decode_report_cursor(cursor) if cursor else None
+
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -577,33 +855,38 @@ async def get_reports(
     try:
         cur = conn.cursor(dictionary=True)
         
-        # Build query with filters
-        query = """
-            SELECT id, report_type, title, description, location, latitude, longitude,
-                   reporter_name, reporter_phone, reporter_email, urgency, status,
-                   evidence_files, created_at, updated_at
-            FROM reports
-            WHERE 1=1
-        """
+        # Build query with filters; every filter combination has a matching
+        # (filters..., created_at) index, see setup_report_db.sql
+        columns = REPORT_COLUMNS_SUMMARY if fields == "summary" else REPORT_COLUMNS_FULL
+        conditions = []
         params = []
         
         if report_type:
-            query += " AND report_type = %s"
+            conditions.append("report_type = %s")
             params.append(report_type)
         
         if status:
-            query += " AND status = %s"
+            conditions.append("status = %s")
             params.append(status)
             
         if urgency:
-            query += " AND urgency = %s"
+            conditions.append("urgency = %s")
             params.append(urgency)
+
+        if after:
+            conditions.append("(created_at < %s OR (created_at = %s AND id < %s))")
+            params.extend([after[0], after[0], after[1]])
         
-        query += " ORDER BY created_at DESC LIMIT %s"
-        params.append(int(limit))
+        query = f"SELECT {columns} FROM reports"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+        params.append(limit + 1)
         
         cur.execute(query, params)
         rows = cur.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
         # Parse evidence_files JSON
         for row in rows:
@@ -614,8 +897,10 @@ async def get_reports(
                     row['evidence_files'] = []
             else:
                 row['evidence_files'] = []
+            row['evidence_media'] = [derivatives.media_urls(n) for n in row['evidence_files']]
         
-        return {"status": "success", "count": len(rows), "data": rows}
+        next_cursor = encode_report_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more and rows else None
+        return {"status": "success", "count": len(rows), "data": rows, "next_cursor": next_cursor}
         
     except Error as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -627,6 +912,159 @@ async def get_reports(
             pass
 
 
+NEARBY_MAX_RADIUS_M = 50000
+NEARBY_MAX_LIMIT = 500
+
+
+# Reports near a point
+@app.get("/reports/nearby")
+async def get_nearby_reports(
+    lat: float,
+    lon: float,
+    radius: float = 500,
+    since_minutes: Optional[int] = 60,
+    report_type: Optional[str] = None,
+    limit: int = 100
+):
+    """Reports within ``radius`` metres of (lat, lon), nearest first.
+
+    Candidates come from geohash prefix range scans on idx_geohash_created,
+    then exact haversine distance filters them. ``since_minutes`` limits to
+    recent reports (pass 0 for all time).
+    """
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    if radius <= 0 or radius > NEARBY_MAX_RADIUS_M:
+        raise HTTPException(status_code=400, detail=f"radius must be in (0, {NEARBY_MAX_RADIUS_M}] metres")
+    limit = max(1, min(int(limit), NEARBY_MAX_LIMIT))
+
+    cells = geo.covering_cells(lat, lon, radius)
+    conditions = ["(" + " OR ".join(["geohash LIKE %s"] * len(cells)) + ")"]
+    params: list = [f"{c}%" for c in cells]
+    if since_minutes:
+        conditions.append("created_at >= NOW() - INTERVAL %s MINUTE")
+        params.append(int(since_minutes))
+    if report_type:
+        conditions.append("report_type = %s")
+        params.append(report_type)
+
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            f"""
+            SELECT {REPORT_COLUMNS_SUMMARY}
+            FROM reports
+            WHERE {" AND ".join(conditions)}
+            """,
+            params,
+        )
+        rows = cur.fetchall()
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        try:
+            cur.close()
+            conn.close()
+        except Exception:
+            pass
+
+    found = []
+    for row in rows:
+        if row["latitude"] is None or row["longitude"] is None:
+            continue
+        d = geo.haversine_m(lat, lon, float(row["latitude"]), float(row["longitude"]))
+        if d <= radius:
+            row["distance_m"] = round(d, 1)
+            try:
+                row["evidence_files"] = json.loads(row["evidence_files"]) if row["evidence_files"] else []
+            except Exception:
+                row["evidence_files"] = []
+            row["evidence_media"] = [derivatives.media_urls(n) for n in row["evidence_files"]]
+            found.append(row)
+    found.sort(key=lambda r: r["distance_m"])
+    found = found[:limit]
+    return {"status": "success", "count": len(found), "center": {"lat": lat, "lon": lon}, "radius_m": radius, "data": found}
+
+
+# Report clusters per map tile
+@app.get("/reports/clusters")
+async def get_report_clusters(
+    zoom: int,
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    since_minutes: Optional[int] = None,
+    report_type: Optional[str] = None
+):
+    """Aggregate reports inside a bounding box into XYZ map tiles at ``zoom``."""
+    if not 0 <= zoom <= 22:
+        raise HTTPException(status_code=400, detail="zoom must be between 0 and 22")
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Invalid bounding box")
+
+    conditions = ["latitude BETWEEN %s AND %s", "longitude BETWEEN %s AND %s"]
+    params: list = [zoom, zoom, min_lat, max_lat, min_lon, max_lon]
+    if since_minutes:
+        conditions.append("created_at >= NOW() - INTERVAL %s MINUTE")
+        params.append(int(since_minutes))
+    if report_type:
+        conditions.append("report_type = %s")
+        params.append(report_type)
+
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        cur = conn.cursor(dictionary=True)
+        # tile x/y computed in SQL (Web Mercator) so only one row per tile comes back
+        cur.execute(
+            f"""
+            SELECT tx AS x, ty AS y, COUNT(*) AS count,
+                   AVG(latitude) AS latitude, AVG(longitude) AS longitude,
+                   SUM(urgency = 'darurat') AS darurat, MAX(created_at) AS latest
+            FROM (
+                SELECT latitude, longitude, urgency, created_at,
+                       FLOOR((longitude + 180) / 360 * POW(2, %s)) AS tx,
+                       FLOOR((1 - LN(TAN(RADIANS(latitude)) + 1 / COS(RADIANS(latitude))) / PI()) / 2 * POW(2, %s)) AS ty
+                FROM reports
+                WHERE {" AND ".join(conditions)}
+            ) t
+            GROUP BY tx, ty
+            ORDER BY count DESC
+            """,
+            params,
+        )
+        rows = cur.fetchall()
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        try:
+            cur.close()
+            conn.close()
+        except Exception:
+            pass
+
+    clusters = []
+    for row in rows:
+        x, y = int(row["x"]), int(row["y"])
+        clusters.append({
+            "x": x,
+            "y": y,
+            "zoom": zoom,
+            "count": int(row["count"]),
+            "darurat": int(row["darurat"] or 0),
+            "latitude": float(row["latitude"]),
+            "longitude": float(row["longitude"]),
+            "latest": row["latest"],
+            "bounds": geo.tile_bounds(x, y, zoom),
+        })
+    return {"status": "success", "zoom": zoom, "count": len(clusters), "data": clusters}
+
+
 # Get single report
 @app.get("/reports/{report_id}")
 async def get_report(report_id: int):
@@ -660,6 +1098,7 @@ async def get_report(report_id: int):
                 row['evidence_files'] = []
         else:
             row['evidence_files'] = []
+        row['evidence_media'] = [derivatives.media_urls(n) for n in row['evidence_files']]
         
         return row
         
@@ -727,6 +1166,8 @@ async def delete_report(report_id: int):
     
     try:
         cur = conn.cursor()
+        cur.execute("SELECT evidence_files FROM reports WHERE id = %s FOR UPDATE", (int(report_id),))
+        row = cur.fetchone()
         cur.execute(
             """
             DELETE FROM reports
@@ -739,7 +1180,14 @@ async def delete_report(report_id: int):
             conn.rollback()
             raise HTTPException(status_code=404, detail="Report not found")
         
+        # Drop this report's references to its evidence blobs
+        try:
+            names = json.loads(row[0]) if row and row[0] else []
+        except Exception:
+            names = []
+        orphans = blob_store.release(conn, names)
         conn.commit()
+        derivatives.remove_for(blob_store.remove_files(conn, orphans))
         return {"status": "success", "message": "Report deleted successfully"}
         
     except Error as e:
@@ -751,3 +1199,166 @@ async def delete_report(report_id: int):
             conn.close()
         except Exception:
             pass
+
+
+SEARCH_MAX_LIMIT = 100
+
+
+# Ranked full-text search over reports and OCR results
+@app.get("/search")
+async def search_documents(
+    q: str,
+    scope: str = "all",
+    report_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    location: Optional[str] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    radius: float = 2000,
+    match: str = "any",
+    limit: int = 20
+):
+    """Search ``reports`` (title, description, location) and ``ocr_results``
+    (message, lokasi) by relevance.
+
+    ``scope`` is ``all``, ``reports`` or ``ocr``; ``report_type`` applies to
+    reports only, so it narrows ``all`` to reports. ``location`` is a
+    substring filter on the stored location name, ``lat``/``lon``/``radius``
+    (metres) a distance filter. ``match=all`` requires every query term.
+    """
+    if scope not in ("all", "reports", "ocr"):
+        raise HTTPException(status_code=400, detail="scope must be one of: all, reports, ocr")
+    if match not in ("any", "all"):
+        raise HTTPException(status_code=400, detail="match must be 'any' or 'all'")
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="lat and lon must be given together")
+    if lat is not None and (radius <= 0 or radius > NEARBY_MAX_RADIUS_M):
+        raise HTTPException(status_code=400, detail=f"radius must be in (0, {NEARBY_MAX_RADIUS_M}] metres")
+    against = search.boolean_query(q, require_all=(match == "all"))
+    if not against:
+        raise HTTPException(status_code=400, detail="Query has no searchable terms")
+    limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+    if report_type and scope == "all":
+        scope = "reports"
+
+    def common_filters(location_col: str):
+        conds, params = [], []
+        if since:
+            conds.append("created_at >= %s")
+            params.append(since)
+        if until:
+            conds.append("created_at < %s")
+            params.append(until)
+        if location:
+            conds.append(f"{location_col} LIKE %s")
+            params.append(f"%{location}%")
+        if lat is not None:
+            # bounding box on idx_lat_lon; exact distance is checked below
+            dlat = radius / 111320.0
+            dlon = radius / (111320.0 * max(math.cos(math.radians(lat)), 1e-6))
+            conds.append("latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s")
+            params.extend([lat - dlat, lat + dlat, lon - dlon, lon + dlon])
+        return conds, params
+
+    # over-fetch when the radius filter may drop bounding-box corners
+    fetch = limit * 2 if lat is not None else limit
+    queries = []
+    if scope in ("all", "reports"):
+        conds, params = common_filters("location")
+        if report_type:
+            conds.append("report_type = %s")
+            params.append(report_type)
+        queries.append((
+            "report",
+            f"""
+            SELECT id, report_type, title, description, location, latitude, longitude,
+                   urgency, status, created_at,
+                   MATCH(search_text) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM reports
+            WHERE MATCH(search_text) AGAINST (%s IN BOOLEAN MODE)
+            {"".join(" AND " + c for c in conds)}
+            ORDER BY score DESC, created_at DESC
+            LIMIT %s
+            """,
+            [against, against, *params, fetch],
+        ))
+    if scope in ("all", "ocr"):
+        conds, params = common_filters("lokasi")
+        queries.append((
+            "ocr",
+            f"""
+            SELECT id, message, lokasi, latitude, longitude, source_file, created_at,
+                   MATCH(search_text) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM ocr_results
+            WHERE MATCH(search_text) AGAINST (%s IN BOOLEAN MODE)
+            {"".join(" AND " + c for c in conds)}
+            ORDER BY score DESC, created_at DESC
+            LIMIT %s
+            """,
+            [against, against, *params, fetch],
+        ))
+
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    hits = []
+    try:
+        cur = conn.cursor(dictionary=True)
+        for source, sql, params in queries:
+            cur.execute(sql, params)
+            for row in cur.fetchall():
+                if lat is not None:
+                    if row["latitude"] is None or row["longitude"] is None:
+                        continue
+                    d = geo.haversine_m(lat, lon, float(row["latitude"]), float(row["longitude"]))
+                    if d > radius:
+                        continue
+                    row["distance_m"] = round(d, 1)
+                row["source"] = source
+                row["score"] = float(row["score"] or 0.0)
+                hits.append(row)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        try:
+            cur.close()
+            conn.close()
+        except Exception:
+            pass
+
+    hits.sort(key=lambda r: (r["score"], r["created_at"] or datetime.min), reverse=True)
+    hits = hits[:limit]
+    return {"status": "success", "query": q, "terms": against, "count": len(hits), "data": hits}
+
+
+# Evidence media (originals + derivatives), immutable because content-addressed
+@app.get("/media/{sha256}/{variant}")
+async def get_media(sha256: str, variant: str, request: Request):
+    """Serve an evidence blob or one of its derivatives with long-lived caching."""
+    sha256 = sha256.lower()
+    if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+        raise HTTPException(status_code=400, detail="Invalid media id")
+    if variant != "original" and variant not in derivatives.VARIANTS:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+
+    etag = f'"{sha256}-{variant}"'
+    headers = {"Cache-Control": derivatives.CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    matches = sorted((blob_store.UPLOAD_ROOT / blob_store.BLOB_PREFIX / sha256[:2]).glob(f"{sha256}.*"))
+    if not matches:
+        raise HTTPException(status_code=404, detail="Media not found")
+    original = matches[0]
+    if variant == "original":
+        return FileResponse(original, headers=headers)
+
+    path = derivatives.variant_path(sha256, variant)
+    if path is None:
+        stored_name = original.relative_to(blob_store.UPLOAD_ROOT).as_posix()
+        rendered = await run_in_threadpool(derivatives.render, stored_name)
+        path = rendered.get(variant)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No preview available for this media")
+    return FileResponse(path, headers=headers)
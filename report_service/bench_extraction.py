@@ -0,0 +1,215 @@
+"""Benchmark ``extraction`` against the previous per-call closure implementation.
+
+Checks that both return identical ``metadata``/``locations`` on randomized
+letters, then times them on long multi-page letters::
+
+    python bench_extraction.py [--pages 1 5 20 50] [--repeat 20] [--fuzz 2000]
+"""
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+try:
+    from . import extraction
+except Exception:
+    import extraction
+
+
+# --- reference: the closures run_ocr_for used to define on every call -------
+
+def legacy_pipeline(text: str) -> Dict[str, Any]:
+    def normalize_text(t: str) -> str:
+        import re
+        t = t.replace("\r", "")
+        t = "\n".join(line.strip() for line in t.splitlines())
+        t = re.sub(r"\n{3,}", "\n\n", t)
+        t = re.sub(r"[ \t]{2,}", " ", t)
+        return t.strip()
+
+    def split_lines(t: str) -> List[str]:
+        lines = [ln.strip() for ln in t.splitlines()]
+        return [ln for ln in lines if ln]
+
+    def split_paragraphs(t: str) -> List[str]:
+        import re
+        parts = re.split(r"\n\s*\n+", t)
+        return [p.strip() for p in parts if p.strip()]
+
+    def extract_metadata(t: str) -> Dict[str, Any]:
+        import re
+        meta: Dict[str, Any] = {}
+        first_lines = [ln for ln in t.splitlines() if ln.strip()]
+        if first_lines:
+            meta["title"] = first_lines[0][:200]
+        m = re.search(r"Soreang[,\s]+([0-9]{1,2} .*? 20\d{2})", t, re.I)
+        if m:
+            meta["tanggal"] = m.group(1).strip()
+        m = re.search(r"Nomor\s*\n?\s*([\w\-/\. ]+)", t, re.I)
+        if m:
+            meta["nomor"] = m.group(1).strip()
+        m = re.search(r"Sifat\s*\n?\s*([A-Za-z]+)", t, re.I)
+        if m:
+            meta["sifat"] = m.group(1).strip()
+        m = re.search(r"Perihal\s*\n?\s*([^\n]+)", t, re.I)
+        if m:
+            meta["perihal"] = m.group(1).strip()
+        if re.search(r"SURAT\s+PERNYA?TAAN", t, re.I):
+            meta["jenis_dokumen"] = "surat pernyataan"
+        return meta
+
+    def extract_locations(t: str) -> Dict[str, Any]:
+        import re
+        found: Dict[str, Any] = {
+            "provinsi": [], "kabupaten": [], "kota": [], "kecamatan": [], "kelurahan": [],
+            "rt_rw": [], "alamat": [], "perumahan": [], "raw_matches": [],
+        }
+
+        def push_unique(key: str, val: str) -> None:
+            if not val:
+                return
+            val_norm = re.sub(r"\s+", " ", val).strip()
+            arr = found[key]
+            if isinstance(arr, list) and val_norm and val_norm not in arr:
+                arr.append(val_norm)
+
+        def clean_admin_name(name: str) -> str:
+            name = re.split(r"\b(dan|yang|sekitamya|sekitarnya|dengan|yang\s+mengakibatkan)\b|[,\n]", name, 1, flags=re.I)[0] or name
+            name = re.sub(r"[^A-Za-z\- '\.]", " ", name)
+            name = re.sub(r"\s+", " ", name).strip()
+            parts = name.split()
+            return " ".join(parts[:3])
+
+        for m in re.finditer(r"\bProvinsi\s+([A-Z][A-Za-z .'-]+)", t, re.I):
+            push_unique("provinsi", m.group(1))
+            found["raw_matches"].append(m.group(0))
+        for m in re.finditer(r"\bKabupaten\s+([A-Z][A-Za-z .'-]+)", t, re.I):
+            push_unique("kabupaten", m.group(1))
+            found["raw_matches"].append(m.group(0))
+        for m in re.finditer(r"\bKota\s+([A-Z][A-Za-z .'-]+)", t, re.I):
+            push_unique("kota", m.group(1))
+            found["raw_matches"].append(m.group(0))
+        for m in re.finditer(r"\bKecamatan\s+([^\n,]+)", t, re.I):
+            push_unique("kecamatan", clean_admin_name(m.group(1)))
+            found["raw_matches"].append(m.group(0))
+        for m in re.finditer(r"\bKelurahan\s+([^\n,]+)", t, re.I):
+            push_unique("kelurahan", clean_admin_name(m.group(1)))
+            found["raw_matches"].append(m.group(0))
+        for m in re.finditer(r"RT[ .:]?0?(\d+)\s*/?\s*RW[ .:]?0?(\d+)(?:,?\s*Kelurahan\s+([^\n]+))?", t, re.I):
+            rt, rw, kel = m.group(1), m.group(2), (m.group(3) or "").strip()
+            entry: Dict[str, Any] = {"rt": int(rt), "rw": int(rw)}
+            if kel:
+                kelc = clean_admin_name(kel)
+                entry["kelurahan"] = kelc
+                push_unique("kelurahan", kelc)
+            found["rt_rw"].append(entry)
+            found["raw_matches"].append(m.group(0))
+        for m in re.finditer(r"\bLadang\s+[A-Z][^\n,]*?(RT\.?\s*0?\d+\s*RW\.?\s*0?\d+)", t, re.I):
+            push_unique("alamat", m.group(0))
+            found["raw_matches"].append(m.group(0))
+        for m in re.finditer(r"\b(Perumahan|Kompleks|Taman)\s+[A-Z][A-Za-z ]*\d*", t, re.I):
+            push_unique("perumahan", m.group(0))
+            found["raw_matches"].append(m.group(0))
+        return found
+
+    norm = normalize_text(text)
+    return {
+        "lines": split_lines(norm),
+        "paragraphs": split_paragraphs(norm),
+        "metadata": extract_metadata(norm),
+        "locations": extract_locations(norm),
+    }
+
+
+def engine_pipeline(text: str) -> Dict[str, Any]:
+    norm = extraction.normalize_text(text)
+    return {
+        "lines": extraction.split_lines(norm),
+        "paragraphs": extraction.split_paragraphs(norm),
+        "metadata": extraction.extract_metadata(norm),
+        "locations": extraction.extract_locations(norm),
+    }
+
+
+# --- synthetic letters --------------------------------------------------------
+
+KELURAHAN = ["Kampung Melayu", "Bidara Cina", "Cawang", "Pejaten Timur", "Rawajati", "Cililitan", "Bukit Duri", "Kebon Baru"]
+KECAMATAN = ["Jatinegara", "Kramat Jati", "Pasar Minggu", "Tebet", "Pancoran"]
+KOTA = ["Jakarta Timur", "Jakarta Selatan", "Bandung", "Bekasi"]
+FILLER = (
+    "Sehubungan dengan curah hujan yang tinggi sejak dini hari, debit air meningkat dan "
+    "sebagian permukiman warga terendam dengan ketinggian air 50 sampai 120 cm. "
+    "Warga telah dievakuasi ke posko pengungsian terdekat dan bantuan logistik sedang disalurkan."
+)
+FUZZ_WORDS = [
+    "Provinsi", "Kabupaten", "Kota", "Kecamatan", "Kelurahan", "RT", "RW", "RT.04", "RW.06", "RT 5", "/",
+    "Ladang", "Perumahan", "Kompleks", "Taman", "dan", "yang", "sekitarnya", ",", "\n", "\n\n", "  ",
+    "Jawa", "Barat", "Bandung", "Asri", "8", "012", "Melayu", "kota", "rt:3", "Rw:2", "ALERT", "Kotabaru",
+    "Nomor", "Sifat", "Penting", "Perihal", "Soreang,", "12 Januari 2024", "SURAT PERNYATAAN", "x'y", "-",
+    "pertamanan", "Kotamadya", "PROV\u0130NS\u0130", "\u212aOTA", "Perumahan\u00a0Asri", "kelurahan:", "RT05RW03",
+]
+
+
+def make_letter(pages: int, rng: random.Random) -> str:
+    out = []
+    for p in range(pages):
+        kel, kec, kota = rng.choice(KELURAHAN), rng.choice(KECAMATAN), rng.choice(KOTA)
+        out.append(
+            f"PEMERINTAH KOTA {kota.upper()}\n"
+            f"KECAMATAN {kec.upper()}\n\n"
+            f"Nomor : {rng.randint(100, 999)}/BPBD/{2024 + p % 2}\n"
+            f"Sifat : Penting\n"
+            f"Perihal : Laporan kejadian banjir\n\n"
+            f"Soreang, {rng.randint(1, 28)} Januari 2025\n\n"
+            + " ".join(
+                f"Banjir melanda RT.{rng.randint(1, 15):02d}/RW.{rng.randint(1, 12):02d}, Kelurahan {kel} "
+                f"Kecamatan {kec} dan sekitarnya di Kota {kota} Provinsi DKI Jakarta. {FILLER}"
+                for _ in range(12)
+            )
+            + f"\n\nLadang Kaladi RT.0{rng.randint(1, 9)} RW.0{rng.randint(1, 9)} serta Perumahan Taman Asri {rng.randint(1, 9)}\n"
+            + "\n".join(FILLER for _ in range(6))
+            + "\n\n\n"
+        )
+    return "\n".join(out)
+
+
+def fuzz_text(rng: random.Random) -> str:
+    return " ".join(rng.choice(FUZZ_WORDS) for _ in range(rng.randint(5, 80)))
+
+
+def best_of(fn: Callable[[str], Any], text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--fuzz", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    for i in range(args.fuzz):
+        text = fuzz_text(rng) if i % 2 else make_letter(1, rng)
+        a, b = legacy_pipeline(text), engine_pipeline(text)
+        if a != b:
+            raise SystemExit(f"MISMATCH on input {i}:\n{text!r}\nlegacy={a}\nengine={b}")
+    print(f"equivalence: {args.fuzz} randomized inputs identical")
+
+    print(f"{'pages':>5} {'chars':>9} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8}")
+    for pages in args.pages:
+        text = make_letter(pages, rng)
+        assert legacy_pipeline(text) == engine_pipeline(text)
+        old = best_of(legacy_pipeline, text, args.repeat)
+        new = best_of(engine_pipeline, text, args.repeat)
+        print(f"{pages:>5} {len(text):>9} {old * 1000:>10.2f} {new * 1000:>10.2f} {old / new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Content-addressed storage for uploaded files.
+
+Files live under ``uploads/blobs/<sha[:2]>/<sha><ext>`` and are tracked in the
+``file_blobs`` table with a reference count, so the same photo attached to
+many reports is stored once and removed when the last report goes away.
+Stored names are relative to ``uploads/`` like the legacy evidence names.
+
+The ``file_blobs`` row is the lock for its file: ``put_*`` take a reference
+(locking the row) *before* placing the file, and ``remove_files`` re-reads
+the row ``FOR UPDATE`` before unlinking, so a file is never deleted while a
+concurrent upload of the same content is registering it.
+"""
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+UPLOAD_ROOT: Path = Path("uploads")
+BLOB_PREFIX: str = "blobs"
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def stored_name_for(sha256: str, ext: str = "") -> str:
+    ext = (ext or "").lower()
+    if ext and not ext.startswith("."):
+        ext = f".{ext}"
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256}{ext}"
+
+
+def is_blob_name(name: str) -> bool:
+    return isinstance(name, str) and name.startswith(f"{BLOB_PREFIX}/")
+
+
+def sha_of(name: str) -> str:
+    return Path(name).name.split(".", 1)[0]
+
+
+def _place(src: Path, dest: Path) -> bool:
+    """Move ``src`` to ``dest`` unless it is already there; True if it was placed."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        src.unlink(missing_ok=True)
+        return False
+    # rename is atomic on the same filesystem; fall back to copy across devices
+    try:
+        os.replace(src, dest)
+    except OSError:
+        shutil.move(str(src), str(dest))
+    return True
+
+
+def _register(conn, sha256: str, stored_name: str, size: int, content_type: Optional[str]) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO file_blobs (sha256, stored_name, size_bytes, content_type, ref_count)
+            VALUES (%s, %s, %s, %s, 1)
+            ON DUPLICATE KEY UPDATE ref_count = ref_count + 1, last_used_at = CURRENT_TIMESTAMP
+            """,
+            (sha256, stored_name, int(size), content_type),
+        )
+    finally:
+        cur.close()
+
+
+def existing_name(conn, sha256: str) -> Optional[str]:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT stored_name FROM file_blobs WHERE sha256 = %s", (sha256,))
+        row = cur.fetchone()
+        return row[0] if row else None
+    finally:
+        cur.close()
+
+
+def put_bytes(
+    conn, data: bytes, ext: str = "", content_type: Optional[str] = None, created: Optional[List[Path]] = None
+) -> Tuple[str, str]:
+    """Store ``data`` (or add a reference to an identical blob); returns ``(sha256, stored_name)``.
+
+    Files this call wrote are appended to ``created``, so a caller that rolls
+    back can pass them to ``remove_files``.
+    """
+    sha = hash_bytes(data)
+    name = existing_name(conn, sha) or stored_name_for(sha, ext)
+    _register(conn, sha, name, len(data), content_type)
+    dest = UPLOAD_ROOT / name
+    if not dest.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{dest.name}.tmp")
+        tmp.write_bytes(data)
+        if _place(tmp, dest) and created is not None:
+            created.append(dest)
+    return sha, name
+
+
+def put_file(
+    conn, tmp_path: Path, sha256: str, size: int, ext: str = "", content_type: Optional[str] = None,
+    created: Optional[List[Path]] = None,
+) -> str:
+    """Move an already-hashed temp file into the store; returns the stored name."""
+    name = existing_name(conn, sha256) or stored_name_for(sha256, ext)
+    _register(conn, sha256, name, size, content_type)
+    dest = UPLOAD_ROOT / name
+    if _place(Path(tmp_path), dest) and created is not None:
+        created.append(dest)
+    return name
+
+
+def release(conn, names: Iterable[str]) -> List[Path]:
+    """Drop one reference per blob name.
+
+    Legacy (non content-addressed) names are ignored. Returns the files whose
+    count reached zero; the caller commits, then passes them to ``remove_files``.
+    """
+    orphans: List[Path] = []
+    cur = conn.cursor()
+    try:
+        for name in names:
+            if not is_blob_name(name):
+                continue
+            cur.execute(
+                "UPDATE file_blobs SET ref_count = ref_count - 1 WHERE stored_name = %s AND ref_count > 0",
+                (name,),
+            )
+            cur.execute("SELECT ref_count FROM file_blobs WHERE stored_name = %s", (name,))
+            row = cur.fetchone()
+            if row is not None and int(row[0]) <= 0:
+                cur.execute("DELETE FROM file_blobs WHERE stored_name = %s", (name,))
+                orphans.append(UPLOAD_ROOT / name)
+    finally:
+        cur.close()
+    return orphans
+
+
+def remove_files(conn, paths: Iterable[Path]) -> List[Path]:
+    """Unlink blob files that no ``file_blobs`` row references; returns the ones removed.
+
+    Each row is re-read ``FOR UPDATE`` (a gap lock when it is gone), so an
+    upload registering the same content either waits for the unlink and then
+    writes the file again, or has committed its reference and the file stays.
+    Call after the transaction that dropped the references has been committed
+    or rolled back.
+    """
+    removed: List[Path] = []
+    cur = conn.cursor()
+    try:
+        for p in paths:
+            p = Path(p)
+            try:
+                cur.execute("SELECT ref_count FROM file_blobs WHERE sha256 = %s FOR UPDATE", (sha_of(p.name),))
+                row = cur.fetchone()
+                if row is None or int(row[0]) <= 0:
+                    p.unlink(missing_ok=True)
+                    removed.append(p)
+                conn.commit()
+            except Exception as e:
+                print(f"[BLOBS] could not remove {p}: {e}")
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+    finally:
+        cur.close()
+    return removed
@@ -0,0 +1,147 @@
+"""Thumbnails and previews for report evidence images.
+
+After ``submit_report`` stores an image blob, a background thread renders a
+``thumb`` and a ``medium`` derivative (WebP, JPEG when Pillow lacks WebP)
+under ``uploads/derived/``. Derivatives are keyed by the blob's SHA-256, so
+they never change and can be served with an immutable cache policy. A
+missing derivative is rendered on demand by the media endpoint.
+"""
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    from PIL import Image, ImageOps
+except Exception:  # pragma: no cover
+    Image = None
+    ImageOps = None
+
+try:
+    from . import blob_store
+except Exception:
+    import blob_store
+
+DERIVED_DIR: Path = blob_store.UPLOAD_ROOT / "derived"
+VARIANTS: Dict[str, int] = {"thumb": 256, "medium": 1024}  # longest side in px
+WEBP_QUALITY: int = 75
+JPEG_QUALITY: int = 80
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+CACHE_CONTROL: str = "public, max-age=31536000, immutable"
+
+_queue: "queue.Queue[str]" = queue.Queue()
+_pending = set()
+_pending_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+def _sha_of(stored_name: str) -> Optional[str]:
+    if not blob_store.is_blob_name(stored_name):
+        return None
+    return Path(stored_name).stem
+
+
+def is_image(stored_name: str) -> bool:
+    return Path(stored_name).suffix.lower() in IMAGE_EXTS
+
+
+def _webp_supported() -> bool:
+    try:
+        from PIL import features
+        return bool(features.check("webp"))
+    except Exception:
+        return False
+
+
+def variant_path(sha256: str, variant: str) -> Optional[Path]:
+    """Existing derivative file for ``sha256``/``variant``, if rendered."""
+    base = DERIVED_DIR / sha256[:2]
+    for ext in (".webp", ".jpg"):
+        p = base / f"{sha256}_{variant}{ext}"
+        if p.exists():
+            return p
+    return None
+
+
+def render(stored_name: str) -> Dict[str, Path]:
+    """Render every variant of one blob (idempotent); returns variant -> path."""
+    sha = _sha_of(stored_name)
+    out: Dict[str, Path] = {}
+    if not sha or Image is None or not is_image(stored_name):
+        return out
+    todo = {v: s for v, s in VARIANTS.items() if variant_path(sha, v) is None}
+    if todo:
+        src = blob_store.UPLOAD_ROOT / stored_name
+        use_webp = _webp_supported()
+        ext, fmt, opts = (".webp", "WEBP", {"quality": WEBP_QUALITY, "method": 4}) if use_webp else \
+            (".jpg", "JPEG", {"quality": JPEG_QUALITY, "optimize": True, "progressive": True})
+        with Image.open(src) as im:
+            im = ImageOps.exif_transpose(im)
+            im = im.convert("RGB")
+            # largest first so each smaller variant downsamples the previous one
+            for variant, side in sorted(todo.items(), key=lambda kv: -kv[1]):
+                im.thumbnail((side, side), Image.LANCZOS)
+                dest = DERIVED_DIR / sha[:2] / f"{sha}_{variant}{ext}"
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                tmp = dest.with_name(f".{dest.name}.tmp")
+                im.save(tmp, format=fmt, **opts)
+                tmp.replace(dest)
+    for v in VARIANTS:
+        p = variant_path(sha, v)
+        if p is not None:
+            out[v] = p
+    return out
+
+
+def remove_for(blob_paths) -> None:
+    """Delete the derivatives of blobs that were just removed from the store."""
+    for p in blob_paths:
+        sha = Path(p).stem
+        for v in VARIANTS:
+            dp = variant_path(sha, v)
+            if dp is not None:
+                dp.unlink(missing_ok=True)
+
+
+def enqueue(stored_name: str) -> None:
+    if not is_image(stored_name) or _sha_of(stored_name) is None:
+        return
+    with _pending_lock:
+        if stored_name in _pending:
+            return
+        _pending.add(stored_name)
+    _queue.put(stored_name)
+
+
+def _worker() -> None:
+    while True:
+        name = _queue.get()
+        try:
+            render(name)
+        except Exception as e:
+            print(f"[DERIVATIVES] {name}: {e}")
+        finally:
+            with _pending_lock:
+                _pending.discard(name)
+            _queue.task_done()
+
+
+def start_worker() -> None:
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_worker, name="derivatives", daemon=True)
+        _thread.start()
+
+
+def media_urls(stored_name: str) -> Dict[str, Any]:
+    """URLs the dashboard should use for one evidence entry."""
+    sha = _sha_of(stored_name)
+    if sha is None:  # legacy evidence name, no derivatives
+        return {"file": stored_name, "original": None, "thumbnail": None, "medium": None}
+    image = is_image(stored_name)
+    return {
+        "file": stored_name,
+        "original": f"/media/{sha}/original",
+        "thumbnail": f"/media/{sha}/thumb" if image else None,
+        "medium": f"/media/{sha}/medium" if image else None,
+    }
@@ -0,0 +1,196 @@
+"""Text normalization and entity extraction for OCR'd letters.
+
+All patterns are compiled once at import. ``extract_locations`` finds every
+entity in a single scan: one alternation of the entity keywords (Provinsi,
+Kabupaten, Kota, Kecamatan, Kelurahan, RT/RW, Ladang, Perumahan/Kompleks/
+Taman) walks a case-folded copy of the text, and at each keyword the
+entity's own pattern is matched in place on the original. Per-entity
+non-overlap and the output order (entity type first, then text position)
+are kept exactly as the former one-``finditer``-per-entity implementation
+produced them; ``bench_extraction.py`` checks that and times both.
+"""
+import re
+import string
+from typing import Any, Dict, List, Optional
+
+_MANY_NEWLINES_RE = re.compile(r"\n{3,}")
+_MANY_SPACES_RE = re.compile(r"[ \t]{2,}")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n+")
+_WS_RE = re.compile(r"\s+")
+
+# (field, folded literal every match starts with, pattern)
+_META_FIELDS = (
+    ("tanggal", "soreang", re.compile(r"Soreang[,\s]+([0-9]{1,2} .*? 20\d{2})", re.I)),
+    ("nomor", "nomor", re.compile(r"Nomor\s*\n?\s*([\w\-/\. ]+)", re.I)),
+    ("sifat", "sifat", re.compile(r"Sifat\s*\n?\s*([A-Za-z]+)", re.I)),
+    ("perihal", "perihal", re.compile(r"Perihal\s*\n?\s*([^\n]+)", re.I)),
+)
+_META_PERNYATAAN_RE = re.compile(r"SURAT\s+PERNYA?TAAN", re.I)
+
+_ADMIN_STOP_RE = re.compile(r"\b(dan|yang|sekitamya|sekitarnya|dengan|yang\s+mengakibatkan)\b|[,\n]", re.I)
+_ADMIN_JUNK_RE = re.compile(r"[^A-Za-z\- '\.]")
+
+# Entity patterns, in the order their results are reported
+LOCATION_PATTERNS: Dict[str, "re.Pattern[str]"] = {
+    "provinsi": re.compile(r"\bProvinsi\s+([A-Z][A-Za-z .'-]+)", re.I),
+    "kabupaten": re.compile(r"\bKabupaten\s+([A-Z][A-Za-z .'-]+)", re.I),
+    "kota": re.compile(r"\bKota\s+([A-Z][A-Za-z .'-]+)", re.I),
+    "kecamatan": re.compile(r"\bKecamatan\s+([^\n,]+)", re.I),
+    "kelurahan": re.compile(r"\bKelurahan\s+([^\n,]+)", re.I),
+    "rt_rw": re.compile(r"RT[ .:]?0?(\d+)\s*/?\s*RW[ .:]?0?(\d+)(?:,?\s*Kelurahan\s+([^\n]+))?", re.I),
+    "alamat": re.compile(r"\bLadang\s+[A-Z][^\n,]*?(RT\.?\s*0?\d+\s*RW\.?\s*0?\d+)", re.I),
+    "perumahan": re.compile(r"\b(Perumahan|Kompleks|Taman)\s+[A-Z][A-Za-z ]*\d*", re.I),
+}
+# Where each entity pattern can start. The scan runs case-sensitively over a
+# folded copy of the text, which is several times faster than one IGNORECASE
+# alternation, and leaves word-boundary/whitespace checks to the entity
+# pattern that confirms each candidate. A keyword match can only swallow a
+# keyword starting mid-word, which its \b would reject anyway.
+_ANCHOR_RE = re.compile(r"provinsi|kabupaten|kota|kecamatan|kelurahan|ladang|perumahan|kompleks|taman|rt")
+_ANCHOR_KIND = {
+    "provinsi": "provinsi",
+    "kabupaten": "kabupaten",
+    "kota": "kota",
+    "kecamatan": "kecamatan",
+    "kelurahan": "kelurahan",
+    "rt": "rt_rw",
+    "ladang": "alamat",
+    "perumahan": "perumahan",
+    "kompleks": "perumahan",
+    "taman": "perumahan",
+}
+# Length-preserving fold (str.lower() turns "\u0130" into two characters) that
+# also maps the non-ASCII letters re.IGNORECASE equates with i, k and s.
+_FOLD = str.maketrans({
+    **{c: c.lower() for c in string.ascii_uppercase},
+    "\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k",
+})
+
+
+def normalize_text(t: str) -> str:
+    t = t.replace("\r", "")
+    # trim each line, cap blank runs at one empty line, collapse inner spaces
+    t = "\n".join(line.strip() for line in t.splitlines())
+    t = _MANY_NEWLINES_RE.sub("\n\n", t)
+    t = _MANY_SPACES_RE.sub(" ", t)
+    return t.strip()
+
+
+def split_lines(t: str) -> List[str]:
+    lines = [ln.strip() for ln in t.splitlines()]
+    return [ln for ln in lines if ln]
+
+
+def split_paragraphs(t: str) -> List[str]:
+    parts = _PARAGRAPH_RE.split(t)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _search_from_literal(pattern: "re.Pattern[str]", literal: str, t: str, folded: str) -> Optional["re.Match[str]"]:
+    """``pattern.search(t)`` for a pattern that always starts with ``literal``.
+
+    ``str.find`` on the folded text jumps between occurrences of the literal;
+    an IGNORECASE search would try the pattern at every position.
+    """
+    i = folded.find(literal)
+    while i != -1:
+        m = pattern.match(t, i)
+        if m:
+            return m
+        i = folded.find(literal, i + 1)
+    return None
+
+
+def extract_metadata(t: str) -> Dict[str, Any]:
+    meta: Dict[str, Any] = {}
+    # generic title: first non-empty line
+    for ln in t.splitlines():
+        if ln.strip():
+            meta["title"] = ln[:200]
+            break
+    # common fields in Indonesian letters
+    folded = t.translate(_FOLD)
+    for field, literal, pattern in _META_FIELDS:
+        m = _search_from_literal(pattern, literal, t, folded)
+        if m:
+            meta[field] = m.group(1).strip()
+    if _search_from_literal(_META_PERNYATAAN_RE, "surat", t, folded):
+        meta["jenis_dokumen"] = "surat pernyataan"
+    return meta
+
+
+def clean_admin_name(name: str) -> str:
+    """Cut an admin-area name at the first connector/comma, keep up to 3 words."""
+    name = _ADMIN_STOP_RE.split(name, 1)[0] or name
+    name = _ADMIN_JUNK_RE.sub(" ", name)
+    return " ".join(name.split()[:3])
+
+
+def scan_entities(t: str) -> Dict[str, List["re.Match[str]"]]:
+    """Entity matches per type from one pass over ``t``.
+
+    Within a type, matches do not overlap (a match consumes its text for that
+    type only), exactly like ``finditer`` per pattern.
+    """
+    hits: Dict[str, List["re.Match[str]"]] = {k: [] for k in LOCATION_PATTERNS}
+    resume = dict.fromkeys(LOCATION_PATTERNS, 0)
+    for a in _ANCHOR_RE.finditer(t.translate(_FOLD)):
+        kind = _ANCHOR_KIND[a.group()]
+        pos = a.start()
+        if pos < resume[kind]:
+            continue
+        m = LOCATION_PATTERNS[kind].match(t, pos)
+        if m:
+            hits[kind].append(m)
+            resume[kind] = m.end()
+    return hits
+
+
+def extract_locations(t: str) -> Dict[str, Any]:
+    found: Dict[str, Any] = {
+        "provinsi": [],
+        "kabupaten": [],
+        "kota": [],
+        "kecamatan": [],
+        "kelurahan": [],
+        "rt_rw": [],  # list of {rt, rw, kelurahan?}
+        "alamat": [],
+        "perumahan": [],
+        "raw_matches": [],
+    }
+    raw = found["raw_matches"]
+    seen: Dict[str, set] = {}
+
+    def push_unique(key: str, val: str) -> None:
+        if not val:
+            return
+        val_norm = _WS_RE.sub(" ", val).strip()
+        keys = seen.setdefault(key, set())
+        if val_norm and val_norm not in keys:
+            keys.add(val_norm)
+            found[key].append(val_norm)
+
+    hits = scan_entities(t)
+    for kind in ("provinsi", "kabupaten", "kota"):
+        for m in hits[kind]:
+            push_unique(kind, m.group(1))
+            raw.append(m.group(0))
+    for kind in ("kecamatan", "kelurahan"):
+        for m in hits[kind]:
+            push_unique(kind, clean_admin_name(m.group(1)))
+            raw.append(m.group(0))
+    for m in hits["rt_rw"]:
+        rt, rw, kel = m.group(1), m.group(2), (m.group(3) or "").strip()
+        entry: Dict[str, Any] = {"rt": int(rt), "rw": int(rw)}
+        if kel:
+            kelc = clean_admin_name(kel)
+            entry["kelurahan"] = kelc
+            push_unique("kelurahan", kelc)
+        found["rt_rw"].append(entry)
+        raw.append(m.group(0))
+    # Address-like lines (e.g., Ladang Kaladi RT.04 RW.06, Perumahan Taman Asri 8)
+    for kind in ("alamat", "perumahan"):
+        for m in hits[kind]:
+            push_unique(kind, m.group(0))
+            raw.append(m.group(0))
+    return found
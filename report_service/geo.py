@@ -0,0 +1,107 @@
+"""Small geospatial helpers: geohash, haversine distance and map tiles."""
+import math
+from typing import Dict, List, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+EARTH_RADIUS_M: float = 6371008.8
+GEOHASH_PRECISION: int = 9  # ~4.8 m x 4.8 m cells, stored per report
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    out: List[str] = []
+    bits, ch, even = 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def geohash_bounds(gh: str) -> Tuple[float, float, float, float]:
+    """Return ``(min_lat, max_lat, min_lon, max_lon)`` of a geohash cell."""
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for c in gh:
+        v = _DECODE[c]
+        for shift in range(4, -1, -1):
+            bit = (v >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+
+def cell_size_m(precision: int, lat: float = 0.0) -> Tuple[float, float]:
+    """Approximate ``(height, width)`` in metres of a geohash cell at ``lat``."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    height = 180.0 / (1 << lat_bits) * 111320.0
+    width = 360.0 / (1 << lon_bits) * 111320.0 * max(math.cos(math.radians(lat)), 1e-6)
+    return height, width
+
+
+def covering_cells(lat: float, lon: float, radius_m: float) -> List[str]:
+    """Geohash prefixes whose union covers the circle around (lat, lon).
+
+    Picks the longest precision whose cells are at least ``radius_m`` on each
+    side, then returns the centre cell plus its 8 neighbours.
+    """
+    precision = 1
+    for p in range(GEOHASH_PRECISION, 0, -1):
+        h, w = cell_size_m(p, lat)
+        if h >= radius_m and w >= radius_m:
+            precision = p
+            break
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_bounds(geohash_encode(lat, lon, precision))
+    dlat, dlon = lat_hi - lat_lo, lon_hi - lon_lo
+    cells: List[str] = []
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            clat = max(min(lat + i * dlat, 89.999999), -89.999999)
+            clon = ((lon + j * dlon + 180.0) % 360.0) - 180.0
+            gh = geohash_encode(clat, clon, precision)
+            if gh not in cells:
+                cells.append(gh)
+    return cells
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def tile_bounds(x: int, y: int, zoom: int) -> Dict[str, float]:
+    """Slippy-map (XYZ) tile bounds."""
+    n = 2 ** zoom
+
+    def lat_of(yy: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * yy / n))))
+
+    return {"min_lat": lat_of(y + 1), "max_lat": lat_of(y), "min_lon": x / n * 360.0 - 180.0, "max_lon": (x + 1) / n * 360.0 - 180.0}
@@ -0,0 +1,315 @@
+"""Concurrent geocoding with per-provider rate limits.
+
+Nominatim and Photon have separate usage policies, so each provider gets its
+own token bucket shared by every thread in the process (all concurrent /ocr
+uploads draw from the same buckets). Candidate queries are raced on a small
+worker pool and the first acceptable hit wins; the remaining attempts are
+cancelled before they spend a token.
+"""
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+try:
+    from . import timing
+except Exception:
+    import timing
+
+USER_AGENT: str = "backend_JIR OCR geocoder (contact: local-dev)"
+NOMINATIM_URL: str = "https://nominatim.openstreetmap.org/search"
+PHOTON_URL: str = "https://photon.komoot.io/api/"
+REQUEST_TIMEOUT_SECONDS: float = 10
+# (requests per second, burst) per provider; Nominatim policy is max 1 req/s
+PROVIDER_RATES: Dict[str, Tuple[float, int]] = {
+    "nominatim": (1 / 1.1, 1),
+    "photon": (3.0, 3),
+}
+GEOCODE_MAX_WORKERS: int = 6  # process-wide, shared by all requests
+GEOCODE_PARALLELISM: int = 3  # in-flight attempts per resolve() call
+GEOCODE_BUDGET_SECONDS: float = 25.0  # overall deadline per resolve() call
+# Rough bounding box of Indonesia; hits outside it are rejected
+INDONESIA_BBOX: Tuple[float, float, float, float] = (-11.5, 6.5, 94.0, 141.5)
+
+
+class TokenBucket:
+    """Thread-safe token bucket in GCRA form.
+
+    Each ``acquire`` reserves the next free slot under the lock and then
+    sleeps until it, so waiters are served in FIFO order and the configured
+    rate holds no matter how many requests share the bucket.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.interval = 1.0 / float(rate)
+        self.tolerance = (max(int(capacity), 1) - 1) * self.interval
+        self._tat = time.monotonic()  # theoretical arrival time of the next token
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float, cancelled: Optional[threading.Event] = None) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            start = max(tat - self.tolerance, now)
+            if start > deadline:
+                return False
+            self._tat = tat + self.interval
+        wait_s = start - time.monotonic()
+        if wait_s > 0:
+            if cancelled is not None:
+                return not cancelled.wait(wait_s)
+            time.sleep(wait_s)
+        return True
+
+
+_BUCKETS: Dict[str, TokenBucket] = {name: TokenBucket(rate, burst) for name, (rate, burst) in PROVIDER_RATES.items()}
+_EXECUTOR = ThreadPoolExecutor(max_workers=GEOCODE_MAX_WORKERS, thread_name_prefix="geocode")
+
+
+def _get_json(url: str) -> Any:
+    req = Request(url, headers={"User-Agent": USER_AGENT})
+    with urlopen(req, timeout=REQUEST_TIMEOUT_SECONDS) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def _nominatim_item(items: Any) -> Dict[str, Any]:
+    if isinstance(items, list) and items:
+        it = items[0]
+        return {
+            "lat": float(it.get("lat")),
+            "lon": float(it.get("lon")),
+            "display_name": it.get("display_name"),
+            "class": it.get("class"),
+            "type": it.get("type"),
+            "importance": it.get("importance"),
+        }
+    return {}
+
+
+def query_nominatim(q: str) -> Dict[str, Any]:
+    params = {"format": "jsonv2", "q": q, "addressdetails": 1, "limit": 1, "countrycodes": "id"}
+    try:
+        return _nominatim_item(_get_json(f"{NOMINATIM_URL}?{urlencode(params)}"))
+    except Exception:
+        return {}
+
+
+def query_nominatim_structured(street: str = "", suburb: str = "", city: str = "", state: str = "", country: str = "Indonesia") -> Dict[str, Any]:
+    params: Dict[str, Any] = {"format": "jsonv2", "addressdetails": 1, "limit": 1, "countrycodes": "id"}
+    for key, val in (("street", street), ("suburb", suburb), ("city", city), ("state", state), ("country", country)):
+        if val:
+            params[key] = val
+    try:
+        return _nominatim_item(_get_json(f"{NOMINATIM_URL}?{urlencode(params)}"))
+    except Exception:
+        return {}
+
+
+def query_photon(q: str) -> Dict[str, Any]:
+    params = {"q": q, "limit": 1, "lang": "id"}
+    try:
+        obj = _get_json(f"{PHOTON_URL}?{urlencode(params)}")
+        feats = (obj or {}).get("features") or []
+        if feats:
+            g = feats[0].get("geometry", {})
+            props = feats[0].get("properties", {})
+            coords = g.get("coordinates") or []
+            if len(coords) >= 2:
+                return {
+                    "lat": float(coords[1]),
+                    "lon": float(coords[0]),
+                    "display_name": props.get("name"),
+                    "class": props.get("osm_value"),
+                    "type": props.get("type"),
+                    "importance": props.get("extent"),
+                }
+    except Exception:
+        return {}
+    return {}
+
+
+def is_acceptable(res: Optional[Dict[str, Any]]) -> bool:
+    if not res:
+        return False
+    lat, lon = res.get("lat"), res.get("lon")
+    if not isinstance(lat, float) or not isinstance(lon, float):
+        return False
+    s, n, w, e = INDONESIA_BBOX
+    return s <= lat <= n and w <= lon <= e
+
+
+def _attempt(kind: str, payload: Any) -> Tuple[str, Dict[str, Any]]:
+    if kind == "structured":
+        return "nominatim", {"structured": payload}
+    return kind, {"query": payload}
+
+
+class AttemptAborted(Exception):
+    """The attempt was not made: its ``resolve`` was cancelled or out of budget."""
+
+
+class AttemptMemo:
+    """Shares attempt results across many ``resolve`` calls.
+
+    Batch ingestion geocodes hundreds of letters that mostly name the same
+    few kelurahan; with a memo each distinct (provider, query) goes out once
+    and concurrent duplicates wait for the in-flight call instead of spending
+    another token. Attempts that were cancelled or ran out of budget are not
+    remembered; their waiters see ``AttemptAborted`` and run the attempt
+    themselves instead of taking the owner's give-up for a miss.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+        self.requested = 0
+        self.executed = 0
+
+    @staticmethod
+    def key(kind: str, payload: Any) -> str:
+        return json.dumps([kind, payload], sort_keys=True, ensure_ascii=False)
+
+    def run(self, kind: str, payload: Any, fn, deadline: float) -> Optional[Dict[str, Any]]:
+        """``fn()`` once per key; raises ``AttemptAborted`` if this caller's attempt was not made."""
+        k = self.key(kind, payload)
+        with self._lock:
+            self.requested += 1
+        while True:
+            with self._lock:
+                fut = self._futures.get(k)
+                owner = fut is None
+                if owner:
+                    fut = self._futures[k] = Future()
+            if owner:
+                break
+            try:
+                return fut.result(timeout=max(deadline - time.monotonic(), 0))
+            except AttemptAborted:
+                continue  # the owner gave up; take over or wait for the next owner
+            except FutureTimeout:
+                raise AttemptAborted()
+            except Exception:  # the owner's call failed
+                return None
+        try:
+            res = fn()
+        except BaseException as e:
+            with self._lock:
+                self._futures.pop(k, None)
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            if res is None:
+                self._futures.pop(k, None)
+            else:
+                self.executed += 1
+        fut.set_result(res)
+        return res
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requested": self.requested, "executed": self.executed, "distinct": len(self._futures)}
+
+
+def _execute_attempt(kind: str, payload: Any, cancelled: threading.Event, deadline: float) -> Optional[Dict[str, Any]]:
+    provider, _ = _attempt(kind, payload)
+    if cancelled.is_set():
+        raise AttemptAborted()
+    with timing.span("geocode_wait", provider=provider):
+        acquired = _BUCKETS[provider].acquire(deadline, cancelled)
+    if not acquired or cancelled.is_set():
+        raise AttemptAborted()
+    with timing.span("geocode_attempt", provider=provider, kind=kind) as sp:
+        if kind == "structured":
+            res = query_nominatim_structured(**payload)
+        elif kind == "photon":
+            res = query_photon(payload)
+        else:
+            res = query_nominatim(payload)
+        sp["ok"] = is_acceptable(res)
+    return res
+
+
+def _run_attempt(
+    kind: str,
+    payload: Any,
+    cancelled: threading.Event,
+    deadline: float,
+    memo: Optional[AttemptMemo] = None,
+) -> Optional[Dict[str, Any]]:
+    try:
+        if memo is not None:
+            return memo.run(kind, payload, lambda: _execute_attempt(kind, payload, cancelled, deadline), deadline)
+        return _execute_attempt(kind, payload, cancelled, deadline)
+    except AttemptAborted:
+        return None
+
+
+def resolve(
+    structured: List[Dict[str, str]],
+    queries: List[str],
+    budget: float = GEOCODE_BUDGET_SECONDS,
+    memo: Optional[AttemptMemo] = None,
+) -> Dict[str, Any]:
+    """Race geocoding candidates and return the first acceptable hit.
+
+    Attempts are started in priority order (structured candidates, then each
+    free-text query on Nominatim and Photon), at most ``GEOCODE_PARALLELISM``
+    at a time. The returned ``results`` list records finished attempts in
+    completion order, in the same shape ``geocode_locations`` always used.
+    ``memo`` deduplicates attempts across calls (see ``AttemptMemo``).
+    """
+    attempts: List[Tuple[str, Any]] = [("structured", sc) for sc in structured]
+    for q in queries:
+        attempts.append(("nominatim", q))
+        attempts.append(("photon", q))
+
+    cancelled = threading.Event()
+    deadline = time.monotonic() + budget
+    pending: Dict[Future, Tuple[str, Any]] = {}
+    queue = iter(attempts)
+    results: List[Dict[str, Any]] = []
+    primary: Optional[Dict[str, Any]] = None
+
+    def fill() -> None:
+        while len(pending) < GEOCODE_PARALLELISM:
+            nxt = next(queue, None)
+            if nxt is None:
+                return
+            # copy the context so attempt spans land on the caller's timing trace
+            ctx = contextvars.copy_context()
+            pending[_EXECUTOR.submit(ctx.run, _run_attempt, nxt[0], nxt[1], cancelled, deadline, memo)] = nxt
+
+    try:
+        fill()
+        while pending and primary is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(list(pending), timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                kind, payload = pending.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception:
+                    res = None
+                if res is None and cancelled.is_set():
+                    continue
+                provider, entry = _attempt(kind, payload)
+                ok = is_acceptable(res)
+                entry.update({"provider": provider, "result": res if ok else None})
+                results.append(entry)
+                if ok and primary is None:
+                    primary = res
+            if primary is None:
+                fill()
+    finally:
+        cancelled.set()
+        for fut in pending:
+            fut.cancel()
+
+    return {"enabled": True, "primary": primary, "results": results}
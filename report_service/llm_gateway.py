@@ -0,0 +1,150 @@
+"""OpenRouter gateway used for location normalization.
+
+Wraps the chat-completions call with a content-hash keyed response cache,
+coalescing of identical in-flight prompts (multi-page uploads and re-sent
+letters hit the LLM once), a process-wide concurrency cap and a hard
+timeout. Any failure returns ``None`` so callers fall back to the regex-only
+extraction result.
+
+Point ``OPENROUTER_BASE_URL`` at ``mock_llm_server.py`` to exercise this path
+offline.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.request import Request, urlopen
+
+OPENROUTER_MODEL: str = os.environ.get("OPENROUTER_MODEL", "deepseek/deepseek-chat-v3.1:free")
+OPENROUTER_BASE_URL: str = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+OPENROUTER_REFERER: str = "http://localhost"
+OPENROUTER_TITLE: str = "backend_JIR"
+OPENROUTER_API_KEY_DEFAULT: str = "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"
+LLM_TIMEOUT_SECONDS: float = 30.0
+LLM_MAX_CONCURRENCY: int = 4  # simultaneous upstream calls per process
+LLM_CACHE_SIZE: int = 1024  # cached responses (LRU)
+LLM_CACHE_TTL_SECONDS: float = 24 * 3600
+
+_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_inflight: Dict[str, Future] = {}
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+
+def _api_key() -> str:
+    key = os.environ.get("OPENROUTER_API_KEY")
+    if not key:
+        key_path = Path(__file__).resolve().parent / "key.txt"
+        if key_path.exists():
+            key = key_path.read_text(encoding="utf-8").strip()
+    return key or OPENROUTER_API_KEY_DEFAULT
+
+
+def cache_key(prompt: str, model: str = OPENROUTER_MODEL) -> str:
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def _cache_get(key: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        hit = _cache.get(key)
+        if hit is None:
+            return None
+        stored_at, value = hit
+        if time.monotonic() - stored_at > LLM_CACHE_TTL_SECONDS:
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return value
+
+
+def _cache_put(key: str, value: Dict[str, Any]) -> None:
+    with _lock:
+        _cache[key] = (time.monotonic(), value)
+        _cache.move_to_end(key)
+        while len(_cache) > LLM_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def call_openrouter(prompt: str, timeout: float = LLM_TIMEOUT_SECONDS) -> Dict[str, Any]:
+    """Single uncached chat-completions call; returns parsed JSON or {}."""
+    key = _api_key()
+    if not key:
+        return {}
+    body = json.dumps({
+        "model": OPENROUTER_MODEL,
+        "messages": [
+            {"role": "system", "content": "Kembalikan hanya JSON sesuai skema."},
+            {"role": "user", "content": prompt},
+        ],
+    }).encode("utf-8")
+    req = Request(f"{OPENROUTER_BASE_URL}/chat/completions", data=body)
+    req.add_header("Authorization", f"Bearer {key}")
+    req.add_header("Content-Type", "application/json")
+    if OPENROUTER_REFERER:
+        req.add_header("HTTP-Referer", OPENROUTER_REFERER)
+    if OPENROUTER_TITLE:
+        req.add_header("X-Title", OPENROUTER_TITLE)
+    try:
+        with urlopen(req, timeout=timeout) as resp:
+            txt = resp.read().decode("utf-8")
+    except Exception:
+        return {}
+    try:
+        obj = json.loads(txt)
+        content = obj.get("choices", [{}])[0].get("message", {}).get("content", "")
+        s = content.find("{")
+        e = content.rfind("}")
+        if s != -1 and e != -1 and e > s:
+            return json.loads(content[s:e+1])
+        return {}
+    except Exception:
+        return {}
+
+
+def complete_json(prompt: str, timeout: float = LLM_TIMEOUT_SECONDS) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Return ``(output, source)`` for ``prompt``.
+
+    ``source`` is one of ``cache``, ``live``, ``coalesced`` or ``fallback``;
+    ``output`` is ``None`` only for ``fallback``.
+    """
+    key = cache_key(prompt)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached, "cache"
+
+    with _lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = Future()
+            _inflight[key] = fut
+
+    if not leader:
+        try:
+            out = fut.result(timeout=timeout)
+        except Exception:
+            out = None
+        return (out, "coalesced") if out else (None, "fallback")
+
+    out: Optional[Dict[str, Any]] = None
+    deadline = time.monotonic() + timeout
+    try:
+        if _slots.acquire(timeout=timeout):
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    out = call_openrouter(prompt, timeout=remaining) or None
+            finally:
+                _slots.release()
+        if out:
+            _cache_put(key, out)
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        fut.set_result(out)
+    return (out, "live") if out else (None, "fallback")
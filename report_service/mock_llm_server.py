@@ -0,0 +1,119 @@
+"""Local stand-in for the OpenRouter chat-completions API.
+
+Answers with a deterministic JSON built from the ENTITAS_LOKASI block of the
+prompt, so the OCR -> LLM -> geocode path can run offline:
+
+    python mock_llm_server.py --port 8787 --delay 2
+    OPENROUTER_BASE_URL=http://127.0.0.1:8787/v1 python test_ocr.py
+
+``GET /stats`` returns how many completions were served, which makes cache
+and coalescing behaviour easy to observe.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+STATS: Dict[str, int] = {"completions": 0}
+_stats_lock = threading.Lock()
+
+
+def fake_completion(prompt: str) -> Dict[str, Any]:
+    locs: Dict[str, Any] = {}
+    marker = "ENTITAS_LOKASI\n"
+    if marker in prompt:
+        block = prompt.split(marker, 1)[1].split("\n\n", 1)[0]
+        try:
+            locs = json.loads(block)
+        except Exception:
+            locs = {}
+
+    def first(key: str) -> Any:
+        vals = locs.get(key) or []
+        return vals[0] if vals else None
+
+    kel, kec, kota = first("kelurahan"), first("kecamatan"), first("kota")
+    rt_rw = first("rt_rw") or {}
+    nama = ", ".join(p for p in [kel, kec, kota] if p) or "Tidak diketahui"
+    return {
+        "lokasi_banjir": {
+            "nama": nama,
+            "komponen": {
+                "provinsi": None,
+                "kota": kota,
+                "kecamatan": kec,
+                "kelurahan": kel,
+                "rt": rt_rw.get("rt", 0),
+                "rw": rt_rw.get("rw", 0),
+                "area": None,
+            },
+        },
+        "normalized_query_candidates": [f"{nama}, Indonesia"] if kel or kec or kota else [],
+        "ringkasan": f"Laporan banjir di {nama}.",
+    }
+
+
+def make_handler(delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            pass
+
+        def _send(self, code: int, obj: Any) -> None:
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/").endswith("/stats"):
+                with _stats_lock:
+                    self._send(200, dict(STATS))
+                return
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": "not found"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                req = json.loads(self.rfile.read(length) or b"{}")
+                prompt = req["messages"][-1]["content"]
+            except Exception:
+                self._send(400, {"error": "bad request"})
+                return
+            if delay:
+                time.sleep(delay)
+            with _stats_lock:
+                STATS["completions"] += 1
+            content = json.dumps(fake_completion(prompt), ensure_ascii=False)
+            self._send(200, {
+                "id": f"mock-{STATS['completions']}",
+                "model": req.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+            })
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8787, delay: float = 0.0) -> ThreadingHTTPServer:
+    return ThreadingHTTPServer((host, port), make_handler(delay))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock OpenRouter server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds of simulated LLM latency")
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.delay)
+    print(f"Mock OpenRouter on http://{args.host}:{args.port}/v1 (delay={args.delay}s)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
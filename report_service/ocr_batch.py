@@ -0,0 +1,506 @@
+"""Batch OCR ingestion for document backlogs.
+
+Regional agencies send hundreds of letters at once. A batch:
+
+1. collects documents from a directory or a zip (typed by content, not by
+   extension), skipping files already in ``ocr_results`` or repeated in the
+   batch (same SHA-256);
+2. renders and OCRs them on a process pool, one task per document so every
+   page of a letter is handled by the same worker;
+3. joins each document's pages into one text, so the LLM sees a letter once
+   instead of once per page;
+4. geocodes through one ``geocoder.AttemptMemo``, so a kelurahan named in
+   fifty letters is looked up once;
+5. writes ``ocr_results`` with multi-row inserts.
+
+The returned report carries docs/min and the seconds spent in each stage
+(summed over workers). CLI::
+
+    python ocr_batch.py <directory-or-zip> [--workers N] [--report out.json] [--dry-run]
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from . import search, timing
+    from .blob_store import UPLOAD_ROOT
+    from .geocoder import AttemptMemo, resolve as resolve_geocode
+    from .pdf_pages import PdfPage, load_pdf
+    from .test_ocr import analyze_text, ocr_image, summarize_result
+    from .upload_stream import CHUNK_SIZE, DOCUMENT_KINDS, KIND_INFO, MAX_BATCH_BYTES, MAX_DOCUMENT_BYTES, sniff_kind
+except Exception:
+    import search
+    import timing
+    from blob_store import UPLOAD_ROOT
+    from geocoder import AttemptMemo, resolve as resolve_geocode
+    from pdf_pages import PdfPage, load_pdf
+    from test_ocr import analyze_text, ocr_image, summarize_result
+    from upload_stream import CHUNK_SIZE, DOCUMENT_KINDS, KIND_INFO, MAX_BATCH_BYTES, MAX_DOCUMENT_BYTES, sniff_kind
+
+BATCH_INBOX: Path = UPLOAD_ROOT / "batch_inbox"  # POST /ocr/batch only reads directories under here
+BATCH_WORK_DIR: Path = UPLOAD_ROOT / "ocr_batches"
+OCR_BATCH_PROCESSES: int = int(os.environ.get("OCR_BATCH_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+OCR_BATCH_ANALYZE_THREADS: int = 4  # LLM + geocode are network bound
+MAX_BATCH_DOCUMENTS: int = 1000
+INSERT_CHUNK_SIZE: int = 200
+STAGES = ("render", "ocr", "llm_extract", "geocode", "db_insert")
+
+
+@dataclass
+class BatchDocument:
+    name: str
+    path: Path
+    sha256: str
+    kind: str
+
+
+class StageTimes:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.seconds: Dict[str, float] = {s: 0.0 for s in STAGES}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+
+def _hash_and_sniff(path: Path) -> Tuple[str, Optional[str]]:
+    digest = hashlib.sha256()
+    kind = None
+    with open(path, "rb") as f:
+        chunk = f.read(CHUNK_SIZE)
+        kind = sniff_kind(chunk[:32])
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(CHUNK_SIZE)
+    return digest.hexdigest(), kind
+
+
+def collect_directory(directory: Path) -> List[BatchDocument]:
+    """Supported documents under ``directory`` (recursive, sorted by path)."""
+    docs: List[BatchDocument] = []
+    for p in sorted(Path(directory).rglob("*")):
+        if not p.is_file() or p.name.startswith("."):
+            continue
+        if p.stat().st_size > MAX_DOCUMENT_BYTES:
+            continue
+        sha, kind = _hash_and_sniff(p)
+        if kind in DOCUMENT_KINDS:
+            docs.append(BatchDocument(name=str(p.relative_to(directory)), path=p, sha256=sha, kind=kind))
+            if len(docs) >= MAX_BATCH_DOCUMENTS:
+                break
+    return docs
+
+
+def extract_zip(zip_path: Path, dest_dir: Path) -> List[BatchDocument]:
+    """Extract supported documents from a zip into ``dest_dir``.
+
+    Member names are never used as paths (no zip-slip), each member is capped
+    at ``MAX_DOCUMENT_BYTES`` and the whole archive at ``MAX_BATCH_BYTES``
+    of actual decompressed data, whatever the headers claim.
+    Raises ``zipfile.BadZipFile`` for a corrupt archive.
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    docs: List[BatchDocument] = []
+    total = 0
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            base = Path(info.filename).name
+            if info.is_dir() or not base or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            if len(docs) >= MAX_BATCH_DOCUMENTS:
+                break
+            target = dest_dir / f"{len(docs):05d}.part"
+            digest = hashlib.sha256()
+            kind = None
+            size = 0
+            with zf.open(info) as src, open(target, "wb") as out:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if kind is None:
+                        kind = sniff_kind(chunk[:32]) or ""
+                        if kind not in DOCUMENT_KINDS:
+                            break
+                    size += len(chunk)
+                    if size > MAX_DOCUMENT_BYTES or total + size > MAX_BATCH_BYTES:
+                        kind = ""
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+            if kind not in DOCUMENT_KINDS:
+                target.unlink(missing_ok=True)
+                if total + size > MAX_BATCH_BYTES:
+                    break
+                continue
+            total += size
+            final = target.with_suffix(KIND_INFO[kind][0])
+            target.replace(final)
+            docs.append(BatchDocument(name=info.filename, path=final, sha256=digest.hexdigest(), kind=kind))
+    return docs
+
+
+def _ocr_document(path: str, kind: str) -> Dict[str, Any]:
+    """Process-pool task: load (PDF) and OCR every page of one document.
+
+    PDF pages with a usable text layer are taken as-is; only the rest are OCR'd.
+    """
+    t0 = time.perf_counter()
+    temp_paths: List[Path] = []
+    if kind == "pdf":
+        pages = load_pdf(Path(path).read_bytes())
+        temp_paths = [pg.image_path for pg in pages if pg.image_path is not None]
+    else:
+        pages = [PdfPage(index=0, image_path=Path(path))]
+    t1 = time.perf_counter()
+    texts: List[str] = []
+    errors: List[str] = []
+    engine = None
+    words_count = 0
+    text_layer_pages = 0
+    try:
+        for pg in pages:
+            if pg.text is not None:
+                texts.append(pg.text)
+                text_layer_pages += 1
+                continue
+            try:
+                text, words, eng = ocr_image(pg.image_path)
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            if text and text.strip():
+                texts.append(text)
+            words_count += len(words)
+            engine = engine or eng
+    finally:
+        for p in temp_paths:
+            p.unlink(missing_ok=True)
+    if text_layer_pages and not engine:
+        engine = "pdf-text"
+    error = None
+    if not pages:
+        error = "Cannot convert PDF to images (install PyMuPDF or pdf2image)"
+    elif not texts:
+        error = errors[0] if errors else "No text found"
+    return {
+        "texts": texts,
+        "engine": engine,
+        "words_count": words_count,
+        "pages": len(pages),
+        "text_layer_pages": text_layer_pages,
+        "error": error,
+        "render_s": t1 - t0,
+        "ocr_s": time.perf_counter() - t1,
+    }
+
+
+def _existing_hashes(conn, hashes: List[str]) -> set:
+    found = set()
+    cur = conn.cursor()
+    try:
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            cur.execute(
+                f"SELECT DISTINCT content_sha256 FROM ocr_results WHERE content_sha256 IN ({', '.join(['%s'] * len(chunk))})",
+                chunk,
+            )
+            found.update(r[0] for r in cur.fetchall())
+    finally:
+        cur.close()
+    return found
+
+
+def _insert_rows(conn, rows: List[Tuple]) -> int:
+    cur = conn.cursor()
+    try:
+        for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+            # mysql-connector turns executemany INSERT ... VALUES into one multi-row statement
+            cur.executemany(
+                """
+                INSERT INTO ocr_results (message, lokasi, latitude, longitude, source_file, engine, content_sha256, search_text)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                rows[i:i + INSERT_CHUNK_SIZE],
+            )
+        conn.commit()
+    finally:
+        cur.close()
+    return len(rows)
+
+
+def run_batch(
+    docs: List[BatchDocument],
+    get_connection: Optional[Callable[[], Any]] = None,
+    processes: Optional[int] = None,
+    threads: int = OCR_BATCH_ANALYZE_THREADS,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Any]:
+    """Run the whole pipeline over ``docs``; returns the throughput report.
+
+    Without ``get_connection`` nothing is deduplicated against or written to
+    the database (dry run). Results are inserted in ``INSERT_CHUNK_SIZE``
+    chunks as their analysis finishes, so an interrupted batch keeps what it
+    stored and a re-run skips those documents.
+    """
+    started = time.perf_counter()
+    times = StageTimes()
+    memo = AttemptMemo()
+    failures: List[Dict[str, Any]] = []
+    items: List[Dict[str, Any]] = []
+    rows: List[Tuple] = []
+    pages = 0
+    text_layer_pages = 0
+
+    # duplicates within the batch, then against what is already stored
+    unique: Dict[str, BatchDocument] = {}
+    for d in docs:
+        unique.setdefault(d.sha256, d)
+    todo = list(unique.values())
+    if get_connection is not None and todo:
+        conn = get_connection()
+        if conn:
+            try:
+                seen = _existing_hashes(conn, [d.sha256 for d in todo])
+            finally:
+                conn.close()
+            todo = [d for d in todo if d.sha256 not in seen]
+    skipped = len(docs) - len(todo)
+
+    def analyze(d: BatchDocument, ocr: Dict[str, Any]) -> Tuple[Dict[str, Any], Tuple]:
+        geocode_s = [0.0]
+
+        def geocode(structured, queries):
+            t = time.perf_counter()
+            try:
+                return resolve_geocode(structured, queries, memo=memo)
+            finally:
+                geocode_s[0] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        result = analyze_text("\n\n".join(ocr["texts"]), d.name, ocr["engine"] or "unknown", geocode=geocode)
+        times.add("geocode", geocode_s[0])
+        times.add("llm_extract", time.perf_counter() - t - geocode_s[0])
+        item = summarize_result(result)
+        row = (
+            item["message"],
+            item["lokasi"] or None,
+            item["lat"],
+            item["long"],
+            d.name,
+            ocr["engine"] or "unknown",
+            d.sha256,
+            search.index_text(item["message"], item["lokasi"]),
+        )
+        return {"name": d.name, **item}, row
+
+    done = 0
+    inserted = 0
+
+    def take(fut, d: BatchDocument) -> None:
+        nonlocal done
+        try:
+            item, row = fut.result()
+        except Exception as e:
+            failures.append({"name": d.name, "stage": "analyze", "error": str(e)})
+            return
+        items.append(item)
+        rows.append(row)
+        done += 1
+        if progress is not None:
+            progress(done)
+
+    def flush(final: bool = False) -> None:
+        nonlocal inserted
+        if get_connection is None or not rows or (len(rows) < INSERT_CHUNK_SIZE and not final):
+            return
+        chunk = rows[:]
+        rows.clear()
+        t = time.perf_counter()
+        conn = get_connection()
+        if conn:
+            try:
+                inserted += _insert_rows(conn, chunk)
+            except Exception as e:
+                conn.rollback()
+                failures.append({"name": None, "stage": "db_insert", "error": str(e), "rows": len(chunk)})
+            finally:
+                conn.close()
+        else:
+            failures.append({"name": None, "stage": "db_insert", "error": "Database connection failed", "rows": len(chunk)})
+        times.add("db_insert", time.perf_counter() - t)
+
+    ctx = multiprocessing.get_context("spawn")  # the caller may be a threaded web server
+    with ProcessPoolExecutor(max_workers=processes or OCR_BATCH_PROCESSES, mp_context=ctx) as pool, \
+            ThreadPoolExecutor(max_workers=threads, thread_name_prefix="ocr-batch") as analyzers:
+        ocr_futs = {pool.submit(_ocr_document, str(d.path), d.kind): d for d in todo}
+        analyze_futs = {}
+        for fut in as_completed(ocr_futs):
+            d = ocr_futs[fut]
+            try:
+                ocr = fut.result()
+            except Exception as e:
+                failures.append({"name": d.name, "stage": "ocr", "error": str(e)})
+                continue
+            times.add("render", ocr["render_s"])
+            times.add("ocr", ocr["ocr_s"])
+            # measured in the worker process; feed this process's histograms
+            if d.kind == "pdf":
+                timing.record("pdf_render", ocr["render_s"])
+            timing.record("ocr", ocr["ocr_s"])
+            pages += ocr["pages"]
+            text_layer_pages += ocr["text_layer_pages"]
+            if ocr["error"]:
+                failures.append({"name": d.name, "stage": "ocr", "error": ocr["error"]})
+                continue
+            analyze_futs[analyzers.submit(analyze, d, ocr)] = d
+            for f in [f for f in analyze_futs if f.done()]:
+                take(f, analyze_futs.pop(f))
+            flush()
+        for fut in as_completed(analyze_futs):
+            take(fut, analyze_futs[fut])
+            flush()
+    flush(final=True)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "documents": len(docs),
+        "skipped_duplicates": skipped,
+        "processed": len(items),
+        "failed": len(failures),
+        "inserted": inserted,
+        "pages": pages,
+        "text_layer_pages": text_layer_pages,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_min": round(len(items) / elapsed * 60, 2) if elapsed > 0 else None,
+        "stages_s": {k: round(v, 3) for k, v in times.seconds.items()},
+        "geocode_attempts": memo.stats(),
+        "failures": failures,
+        "results": items,
+    }
+
+
+# --- background batches for POST /ocr/batch ---------------------------------
+
+MAX_BATCHES: int = 100  # finished batches kept for GET /ocr/batch/{id}
+BATCH_TTL_S: float = 24 * 3600
+
+BATCHES: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_BATCHES_LOCK = threading.Lock()
+# one batch at a time; each already fans out over every core
+_RUNNER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-batch-runner")
+
+
+def _run_background(batch_id: str, docs: List[BatchDocument], get_connection, cleanup_dir: Optional[Path]) -> None:
+    state = BATCHES[batch_id]
+    state.update(status="running", started_at=time.time())
+
+    def progress(n: int) -> None:
+        state["completed"] = n
+
+    try:
+        state["report"] = run_batch(docs, get_connection, progress=progress)
+        state["status"] = "done"
+    except Exception as e:
+        state.update(status="failed", error=str(e))
+    finally:
+        state["finished_at"] = time.time()
+        if cleanup_dir is not None:
+            shutil.rmtree(cleanup_dir, ignore_errors=True)
+
+
+def _prune(now: float) -> None:
+    """Forget finished batches past ``BATCH_TTL_S``, then the oldest beyond ``MAX_BATCHES`` (caller holds the lock)."""
+    finished = [bid for bid, st in BATCHES.items() if st.get("finished_at") is not None]
+    for bid in finished:
+        if now - BATCHES[bid]["finished_at"] > BATCH_TTL_S:
+            del BATCHES[bid]
+    finished = [bid for bid in finished if bid in BATCHES]
+    for bid in finished[: max(0, len(BATCHES) - MAX_BATCHES)]:
+        del BATCHES[bid]
+
+
+def submit(docs: List[BatchDocument], get_connection, cleanup_dir: Optional[Path] = None) -> str:
+    """Queue a batch in the background; returns its id (see ``get_batch``)."""
+    batch_id = uuid.uuid4().hex
+    with _BATCHES_LOCK:
+        _prune(time.time())
+        BATCHES[batch_id] = {
+            "batch_id": batch_id,
+            "status": "queued",
+            "documents": len(docs),
+            "completed": 0,
+            "created_at": time.time(),
+        }
+    _RUNNER.submit(_run_background, batch_id, docs, get_connection, cleanup_dir)
+    return batch_id
+
+
+def get_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    with _BATCHES_LOCK:
+        _prune(time.time())
+        state = BATCHES.get(batch_id)
+        return dict(state) if state is not None else None
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Batch OCR ingestion into ocr_results")
+    parser.add_argument("source", type=Path, help="directory or .zip of letters (PDF/JPEG/PNG/WebP)")
+    parser.add_argument("--workers", type=int, default=None, help=f"OCR processes (default {OCR_BATCH_PROCESSES})")
+    parser.add_argument("--threads", type=int, default=OCR_BATCH_ANALYZE_THREADS, help="LLM/geocode threads")
+    parser.add_argument("--report", type=Path, default=None, help="write the full JSON report here")
+    parser.add_argument("--dry-run", action="store_true", help="do not read from or write to the database")
+    args = parser.parse_args(argv)
+
+    work_dir = None
+    if args.source.is_dir():
+        docs = collect_directory(args.source)
+    else:
+        work_dir = BATCH_WORK_DIR / uuid.uuid4().hex
+        docs = extract_zip(args.source, work_dir)
+    if not docs:
+        print("No supported documents found")
+        return 1
+
+    get_connection = None
+    if not args.dry_run:
+        from app import get_db_connection as get_connection
+
+    print(f"Processing {len(docs)} documents ...")
+    try:
+        report = run_batch(docs, get_connection, processes=args.workers, threads=args.threads,
+                           progress=lambda n: print(f"  {n}/{len(docs)}", end="\r", flush=True))
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(
+        f"\nprocessed={report['processed']} failed={report['failed']} skipped={report['skipped_duplicates']} "
+        f"inserted={report['inserted']} pages={report['pages']}"
+    )
+    print(f"elapsed={report['elapsed_s']}s docs/min={report['docs_per_min']}")
+    print("stage seconds: " + ", ".join(f"{k}={v}" for k, v in report["stages_s"].items()))
+    print(f"geocode attempts: {report['geocode_attempts']}")
+    if args.report:
+        args.report.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+        print(f"Saved: {args.report}")
+    return 0 if report["processed"] or not report["failed"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,321 @@
+"""Durable OCR job queue backed by the ``ocr_jobs`` table.
+
+``POST /ocr`` only stores the upload and enqueues a row; a pool of worker
+threads claims queued rows (``SELECT ... FOR UPDATE SKIP LOCKED``, so several
+service processes can share the table), runs the OCR -> LLM -> geocode
+pipeline and records the outcome. Each pool stamps the rows it claimed
+with its owner id and refreshes their ``heartbeat_at`` every
+``OCR_JOB_HEARTBEAT_SECONDS``; a ``processing`` row whose heartbeat is older
+than ``OCR_JOB_STALE_SECONDS`` belongs to a dead process and is re-queued by
+whichever pool sweeps first. Long jobs of live workers keep beating and are
+never taken away.
+"""
+import json
+import os
+import socket
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from . import timing
+except Exception:
+    import timing
+
+JOB_DIR: Path = Path("uploads") / "ocr_jobs"
+OCR_JOB_WORKERS: int = int(os.environ.get("OCR_JOB_WORKERS", "2"))
+OCR_JOB_MAX_ATTEMPTS: int = 3
+OCR_JOB_POLL_SECONDS: float = 2.0
+OCR_JOB_HEARTBEAT_SECONDS: float = 30.0
+OCR_JOB_STALE_SECONDS: int = 5 * 60  # no heartbeat for this long = dead worker
+
+JOB_COLUMNS = (
+    "id, status, source_file, content_type, lang, attempts, error, result, result_id, timings, "
+    "created_at, started_at, finished_at"
+)
+
+
+def enqueue(conn, file_path: Path, source_file: Optional[str], content_type: Optional[str], lang: Optional[str], content_sha256: Optional[str] = None) -> int:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO ocr_jobs (status, source_file, content_type, lang, file_path, content_sha256)
+            VALUES ('queued', %s, %s, %s, %s, %s)
+            """,
+            (source_file, content_type, lang, str(file_path), content_sha256),
+        )
+        conn.commit()
+        return int(cur.lastrowid)
+    finally:
+        cur.close()
+
+
+def claim_next(conn, owner: str) -> Optional[Dict[str, Any]]:
+    """Atomically move the oldest queued job to ``processing`` under ``owner`` and return it."""
+    cur = conn.cursor(dictionary=True)
+    try:
+        conn.start_transaction()
+        cur.execute(
+            """
+            SELECT id, source_file, content_type, lang, file_path, content_sha256, attempts
+            FROM ocr_jobs
+            WHERE status = 'queued'
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+            """
+        )
+        job = cur.fetchone()
+        if not job:
+            conn.rollback()
+            return None
+        cur.execute(
+            """
+            UPDATE ocr_jobs
+            SET status = 'processing', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP,
+                worker_id = %s, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            """,
+            (owner, job["id"]),
+        )
+        conn.commit()
+        job["attempts"] = int(job["attempts"] or 0) + 1
+        return job
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def complete(conn, job_id: int, result: Any, result_id: Optional[int], timings: Optional[Dict[str, Any]] = None) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            UPDATE ocr_jobs
+            SET status = 'done', result = %s, result_id = %s, timings = %s, error = NULL, finished_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            """,
+            (
+                json.dumps(result, ensure_ascii=False),
+                result_id,
+                json.dumps(timings) if timings is not None else None,
+                int(job_id),
+            ),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def fail(conn, job_id: int, error: str, retry: bool, timings: Optional[Dict[str, Any]] = None) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            UPDATE ocr_jobs
+            SET status = %s, error = %s, timings = %s, finished_at = IF(%s, NULL, CURRENT_TIMESTAMP)
+            WHERE id = %s
+            """,
+            (
+                "queued" if retry else "failed",
+                error[:2000],
+                json.dumps(timings) if timings is not None else None,
+                retry,
+                int(job_id),
+            ),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def heartbeat(conn, owner: str) -> int:
+    """Mark every job ``owner`` is processing as still alive."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "UPDATE ocr_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE status = 'processing' AND worker_id = %s",
+            (owner,),
+        )
+        conn.commit()
+        return cur.rowcount
+    finally:
+        cur.close()
+
+
+def fail_exhausted(conn, older_than_seconds: int = OCR_JOB_STALE_SECONDS) -> List[Dict[str, Any]]:
+    """Fail stale jobs that already used every attempt; returns them (``id``, ``file_path``).
+
+    A job that keeps killing its process (OOM, a crash inside the OCR engine)
+    would otherwise be re-queued and claimed again forever.
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        conn.start_transaction()
+        cur.execute(
+            """
+            SELECT id, file_path FROM ocr_jobs
+            WHERE status = 'processing' AND attempts >= %s
+              AND COALESCE(heartbeat_at, started_at) < NOW() - INTERVAL %s SECOND
+            FOR UPDATE SKIP LOCKED
+            """,
+            (OCR_JOB_MAX_ATTEMPTS, int(older_than_seconds)),
+        )
+        jobs = cur.fetchall()
+        if jobs:
+            cur.execute(
+                f"""
+                UPDATE ocr_jobs
+                SET status = 'failed', worker_id = NULL, finished_at = CURRENT_TIMESTAMP,
+                    error = 'worker died while processing this job on every attempt'
+                WHERE id IN ({', '.join(['%s'] * len(jobs))})
+                """,
+                [j["id"] for j in jobs],
+            )
+        conn.commit()
+        return jobs
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def requeue_stale(conn, older_than_seconds: int = OCR_JOB_STALE_SECONDS) -> int:
+    """Re-queue ``processing`` jobs whose owner has not beaten for ``older_than_seconds``."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            UPDATE ocr_jobs
+            SET status = 'queued', worker_id = NULL
+            WHERE status = 'processing'
+              AND COALESCE(heartbeat_at, started_at) < NOW() - INTERVAL %s SECOND
+            """,
+            (int(older_than_seconds),),
+        )
+        conn.commit()
+        return cur.rowcount
+    finally:
+        cur.close()
+
+
+def get_job(conn, job_id: int) -> Optional[Dict[str, Any]]:
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(f"SELECT {JOB_COLUMNS} FROM ocr_jobs WHERE id = %s", (int(job_id),))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    for col in ("result", "timings"):
+        if row and row.get(col):
+            try:
+                row[col] = json.loads(row[col])
+            except Exception:
+                pass
+    return row
+
+
+class JobWorkerPool:
+    """Threads that drain ``ocr_jobs`` through ``process``.
+
+    ``process(job)`` returns ``(result, result_id)`` and may raise; server-side
+    failures are retried up to ``OCR_JOB_MAX_ATTEMPTS`` times.
+    """
+
+    def __init__(self, get_connection: Callable[[], Any], process: Callable[[Dict[str, Any]], Any], workers: int = OCR_JOB_WORKERS):
+        self.get_connection = get_connection
+        self.process = process
+        self.workers = max(int(workers), 1)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def start(self) -> None:
+        t = threading.Thread(target=self._monitor, name="ocr-job-monitor", daemon=True)
+        t.start()
+        self._threads.append(t)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"ocr-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _monitor(self) -> None:
+        """Keep this pool's jobs alive and re-queue those of dead processes."""
+        while not self._stop.is_set():
+            conn = self.get_connection()
+            if conn:
+                try:
+                    heartbeat(conn, self.owner)
+                    dead = fail_exhausted(conn)
+                    for job in dead:
+                        self._discard_upload(job)
+                    if dead:
+                        print(f"[OCR JOBS] Failed {len(dead)} job(s) that crashed on every attempt")
+                    n = requeue_stale(conn)
+                    if n:
+                        print(f"[OCR JOBS] Re-queued {n} stale job(s)")
+                        self._wake.set()
+                except Exception as e:
+                    print(f"[OCR JOBS] heartbeat/requeue failed: {e}")
+                finally:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._stop.wait(OCR_JOB_HEARTBEAT_SECONDS)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            conn = self.get_connection()
+            if not conn:
+                self._stop.wait(OCR_JOB_POLL_SECONDS)
+                continue
+            try:
+                while not self._stop.is_set():
+                    job = claim_next(conn, self.owner)
+                    if not job:
+                        break
+                    self._run(conn, job)
+            except Exception as e:
+                print(f"[OCR JOBS] worker error: {e}")
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._wake.wait(OCR_JOB_POLL_SECONDS)
+            self._wake.clear()
+
+    def _run(self, conn, job: Dict[str, Any]) -> None:
+        try:
+            with timing.trace("ocr_job", job_id=job["id"], source_file=job.get("source_file")) as tr:
+                result, result_id = self.process(job)
+        except Exception as e:
+            # client errors (bad/unsupported file) are not worth retrying
+            retry = job["attempts"] < OCR_JOB_MAX_ATTEMPTS and getattr(e, "status_code", 500) >= 500
+            fail(conn, job["id"], str(getattr(e, "detail", None) or e), retry, tr.summary())
+            if not retry:
+                self._discard_upload(job)
+            return
+        complete(conn, job["id"], result, result_id, tr.summary())
+        self._discard_upload(job)
+
+    @staticmethod
+    def _discard_upload(job: Dict[str, Any]) -> None:
+        try:
+            Path(job["file_path"]).unlink(missing_ok=True)
+        except Exception:
+            pass
@@ -0,0 +1,98 @@
+"""Adaptive PDF loading for OCR.
+
+Most letters we receive are born-digital, so each page's embedded text layer
+is read first (PyMuPDF) and only pages where it is missing or looks like
+garbage are rasterized for OCR. Rasterized pages are rendered at a DPI chosen
+from the page size so the long side lands near ``RENDER_TARGET_PX``, instead
+of a fixed 2x zoom. Without PyMuPDF, pdf2image renders every page.
+"""
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+PDF_MAX_PAGES: int = int(os.environ.get("PDF_MAX_PAGES", "3"))
+RENDER_TARGET_PX: int = 2200  # long side of a rendered page; ~190 dpi for A4
+MIN_RENDER_DPI: int = 120
+MAX_RENDER_DPI: int = 300
+TEXT_LAYER_MIN_CHARS: int = 80  # fewer = scanned page (at most a stamp or page number)
+TEXT_LAYER_MIN_CLEAN_RATIO: float = 0.85  # share of letters/digits/spaces/punctuation
+
+
+@dataclass
+class PdfPage:
+    index: int
+    text: Optional[str] = None  # text layer, when usable
+    image_path: Optional[Path] = None  # rendered PNG otherwise (caller deletes it)
+    dpi: Optional[int] = None
+
+
+def render_dpi(width_pt: float, height_pt: float) -> int:
+    """DPI that renders the page's long side at about ``RENDER_TARGET_PX``."""
+    long_in = max(width_pt, height_pt, 1.0) / 72.0
+    return int(min(max(RENDER_TARGET_PX / long_in, MIN_RENDER_DPI), MAX_RENDER_DPI))
+
+
+def usable_text_layer(text: Optional[str]) -> bool:
+    """Heuristic: enough characters and mostly ordinary ones.
+
+    Broken font encodings come out as replacement characters or private-use
+    glyphs, which pull the clean ratio down.
+    """
+    if not text:
+        return False
+    body = "".join(text.split())
+    if len(body) < TEXT_LAYER_MIN_CHARS:
+        return False
+    clean = sum(1 for c in body if c.isalnum() or c in ".,:;/()-'\"%&+*#@!?")
+    return clean / len(body) >= TEXT_LAYER_MIN_CLEAN_RATIO
+
+
+def _write_png(data: bytes) -> Path:
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+        tmp.write(data)
+        return Path(tmp.name)
+
+
+def load_pdf(pdf_bytes: bytes, max_pages: int = PDF_MAX_PAGES, use_text_layer: bool = True) -> List[PdfPage]:
+    """Text or a rendered image for each of the first ``max_pages`` pages.
+
+    Returns an empty list when neither PyMuPDF nor pdf2image can open the file.
+    """
+    pages: List[PdfPage] = []
+    # Try PyMuPDF (fitz)
+    try:
+        import fitz  # type: ignore
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            for page_idx in range(min(len(doc), max_pages)):
+                page = doc.load_page(page_idx)
+                if use_text_layer:
+                    text = page.get_text("text")
+                    if usable_text_layer(text):
+                        pages.append(PdfPage(index=page_idx, text=text))
+                        continue
+                dpi = render_dpi(page.rect.width, page.rect.height)
+                pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72.0, dpi / 72.0))
+                pages.append(PdfPage(index=page_idx, image_path=_write_png(pix.tobytes("png")), dpi=dpi))
+        finally:
+            doc.close()
+        return pages
+    except Exception:
+        for p in pages:
+            if p.image_path is not None:
+                p.image_path.unlink(missing_ok=True)
+        pages = []
+    # Try pdf2image (no text layer access); size= fits the long side
+    try:
+        from pdf2image import convert_from_bytes  # type: ignore
+        images = convert_from_bytes(pdf_bytes, fmt="png", size=RENDER_TARGET_PX, first_page=1, last_page=max_pages)
+        for page_idx, img in enumerate(images):
+            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+                tmp_path = Path(tmp.name)
+            img.save(tmp_path, format="PNG")
+            pages.append(PdfPage(index=page_idx, image_path=tmp_path))
+        return pages
+    except Exception:
+        return []
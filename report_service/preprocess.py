@@ -0,0 +1,203 @@
+"""Image preprocessing before OCR.
+
+Phone captures arrive at ~4000 px while the text on them would OCR just as
+well at half that, and every engine's time grows with the pixel count. For
+each page image this:
+
+1. applies the EXIF orientation and converts to grayscale,
+2. optionally deskews (projection-profile search over small angles),
+3. crops empty margins around the ink,
+4. rescales so a text line is about ``TARGET_TEXT_HEIGHT_PX`` tall,
+5. optionally binarizes (Otsu).
+
+Layout analysis runs on a downsampled copy, so the cost is a few resizes.
+``OCR_PREPROCESS=0`` turns the whole stage off. Requires Pillow and numpy;
+without them pages go to OCR untouched.
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+    from PIL import Image, ImageOps  # type: ignore
+except Exception:  # pragma: no cover
+    np = None
+    Image = None
+    ImageOps = None
+
+ENABLE_PREPROCESS: bool = os.environ.get("OCR_PREPROCESS", "1") != "0"
+ENABLE_DESKEW: bool = os.environ.get("OCR_DESKEW", "0") == "1"
+ENABLE_BINARIZE: bool = os.environ.get("OCR_BINARIZE", "0") == "1"  # Paddle/EasyOCR do better on grayscale
+TARGET_TEXT_HEIGHT_PX: int = int(os.environ.get("OCR_TARGET_TEXT_PX", "36"))  # one text line, ascender to descender
+MAX_SIDE_PX: int = 3000
+MIN_SCALE, MAX_SCALE = 0.25, 2.0
+RESCALE_TOLERANCE: float = 0.15  # leave images within 15% of the target alone
+ANALYSIS_SIDE_PX: int = 1200  # long side of the copy used for layout analysis
+DESKEW_MAX_DEGREES: float = 5.0
+DESKEW_STEP_DEGREES: float = 0.25
+MARGIN_PAD: float = 0.02  # kept around the ink bbox, as a share of each side
+
+
+def available() -> bool:
+    return np is not None and Image is not None
+
+
+def otsu_threshold(gray: "np.ndarray") -> int:
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 128
+    levels = np.arange(256)
+    w0 = np.cumsum(hist)
+    mu0 = np.cumsum(hist * levels)
+    w1 = total - w0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mu0[-1] * w0 / total - mu0) ** 2 / (w0 * w1)
+    between[~np.isfinite(between)] = 0
+    return int(np.argmax(between))
+
+
+def _analysis_ink(gray_img: "Image.Image") -> Tuple["np.ndarray", float]:
+    """Ink mask of a downsampled copy and the factor back to full size."""
+    factor = max(gray_img.size) / ANALYSIS_SIDE_PX
+    small = gray_img
+    if factor > 1:
+        small = gray_img.resize((max(1, round(gray_img.width / factor)), max(1, round(gray_img.height / factor))), Image.BILINEAR)
+    else:
+        factor = 1.0
+    arr = np.asarray(small, dtype=np.uint8)
+    return arr < otsu_threshold(arr), factor
+
+
+def skew_angle(ink: "np.ndarray") -> float:
+    """Angle (degrees, counter-clockwise) that makes text rows horizontal.
+
+    Shears the ink pixels' row coordinates for each candidate angle and keeps
+    the one whose row histogram is sharpest.
+    """
+    ys, xs = np.nonzero(ink)
+    if len(ys) < 50:
+        return 0.0
+    if len(ys) > 200_000:
+        pick = np.random.default_rng(0).choice(len(ys), 200_000, replace=False)
+        ys, xs = ys[pick], xs[pick]
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64)
+    best, best_score = 0.0, -1.0
+    for deg in np.arange(-DESKEW_MAX_DEGREES, DESKEW_MAX_DEGREES + 1e-9, DESKEW_STEP_DEGREES):
+        rows = np.round(ys - xs * np.tan(np.radians(deg))).astype(np.int64)
+        counts = np.bincount(rows - rows.min())
+        score = float(np.dot(counts, counts))
+        if score > best_score:
+            best, best_score = float(deg), score
+    return best
+
+
+def ink_bbox(ink: "np.ndarray") -> Optional[Tuple[int, int, int, int]]:
+    """(left, top, right, bottom) of rows/columns holding more than stray specks."""
+    rows = np.nonzero(ink.sum(axis=1) > max(1, ink.shape[1] // 500))[0]
+    cols = np.nonzero(ink.sum(axis=0) > max(1, ink.shape[0] // 500))[0]
+    if not len(rows) or not len(cols):
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def line_height(ink: "np.ndarray") -> Optional[float]:
+    """Median height of the horizontal ink bands (text lines), in mask pixels."""
+    on = ink.mean(axis=1) > 0.01
+    edges = np.diff(np.concatenate(([0], on.astype(np.int8), [0])))
+    starts, ends = np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]
+    heights = ends - starts
+    heights = heights[heights >= 2]
+    if len(heights) < 3:
+        return None
+    return float(np.median(heights))
+
+
+def preprocess(img: "Image.Image") -> Tuple["Image.Image", Dict[str, Any]]:
+    """Returns the prepared image and what was done to it.
+
+    ``info`` holds ``scale``, ``offset`` (crop origin in the source image) and
+    ``angle``; with ``angle == 0`` a box in the prepared image maps back as
+    ``source = prepared / scale + offset``.
+    """
+    img = ImageOps.exif_transpose(img)
+    gray = img.convert("L")
+    info: Dict[str, Any] = {"source_size": list(gray.size), "angle": 0.0, "offset": [0, 0], "scale": 1.0}
+
+    ink, factor = _analysis_ink(gray)
+    if ENABLE_DESKEW:
+        angle = skew_angle(ink)
+        if angle:
+            gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+            info["angle"] = angle
+            ink, factor = _analysis_ink(gray)
+
+    box = ink_bbox(ink)
+    if box is not None:
+        h, w = ink.shape
+        pad_x, pad_y = int(w * MARGIN_PAD), int(h * MARGIN_PAD)
+        left, top = max(0, box[0] - pad_x), max(0, box[1] - pad_y)
+        right, bottom = min(w, box[2] + pad_x), min(h, box[3] + pad_y)
+        if (right - left) * (bottom - top) < 0.95 * w * h:
+            crop = (int(left * factor), int(top * factor), min(gray.width, int(right * factor)), min(gray.height, int(bottom * factor)))
+            gray = gray.crop(crop)
+            ink = ink[top:bottom, left:right]
+            info["offset"] = [crop[0], crop[1]]
+
+    scale = 1.0
+    lh = line_height(ink)
+    if lh is not None:
+        scale = min(max(TARGET_TEXT_HEIGHT_PX / (lh * factor), MIN_SCALE), MAX_SCALE)
+        if abs(scale - 1.0) <= RESCALE_TOLERANCE:
+            scale = 1.0
+    scale = min(scale, MAX_SIDE_PX / max(gray.size))
+    if scale != 1.0:
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.LANCZOS if scale < 1 else Image.BICUBIC)
+    info["scale"] = round(scale, 4)
+    info["line_height_px"] = round(lh * factor, 1) if lh is not None else None
+
+    if ENABLE_BINARIZE:
+        arr = np.asarray(gray, dtype=np.uint8)
+        gray = Image.fromarray(np.where(arr < otsu_threshold(arr), 0, 255).astype(np.uint8))
+        info["binarized"] = True
+    info["size"] = list(gray.size)
+    return gray, info
+
+
+def prepare_file(image_path: Path) -> Tuple[Optional[Path], Dict[str, Any]]:
+    """Preprocess an image file into a temporary PNG (the caller deletes it).
+
+    Returns ``(None, {})`` when disabled or unavailable, or when the image
+    cannot be read, so the caller OCRs the original.
+    """
+    if not ENABLE_PREPROCESS or not available():
+        return None, {}
+    try:
+        with Image.open(image_path) as img:
+            prepared, info = preprocess(img)
+    except Exception as e:
+        print(f"[OCR PREPROCESS] skipped {image_path}: {e}")
+        return None, {}
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+        out = Path(tmp.name)
+    prepared.save(out, format="PNG", compress_level=1)
+    return out, info
+
+
+def map_words_back(words: List[Dict[str, Any]], info: Dict[str, Any]) -> None:
+    """Rewrite word boxes from prepared-image to source-image coordinates.
+
+    Deskewed images are left in prepared coordinates (``info['angle']`` says so).
+    """
+    if not info or info.get("angle") or not words:
+        return
+    scale = info.get("scale") or 1.0
+    ox, oy = info.get("offset") or (0, 0)
+    for w in words:
+        b = w.get("bbox") or {}
+        for key, off in (("left", ox), ("top", oy), ("width", 0), ("height", 0)):
+            if b.get(key) is not None:
+                b[key] = int(round(b[key] / scale + off))
@@ -0,0 +1,204 @@
+"""Full-text search over OCR results and reports.
+
+MySQL's built-in FULLTEXT parser only splits on whitespace and knows English
+stopwords, so Indonesian text is analyzed here instead: lower-cased,
+abbreviations expanded (``kel.`` -> ``kelurahan``), Indonesian stopwords
+dropped and each word reduced with a light affix-stripping stemmer
+(``kebanjiran`` -> ``banjir``). Each word is stored in a ``search_text``
+column with a FULLTEXT index both as written and as its stem, since a
+dictionary-less stemmer also clips place names (``Melayu`` -> ``layu``);
+queries go through the same analyzer and match either form, so exact words
+rank above stem-only matches.
+
+Run ``python search.py reindex`` once after adding the column to fill it for
+existing rows.
+"""
+import re
+import sys
+import unicodedata
+from typing import Iterable, List, Optional
+
+SEARCH_TABLES = {
+    "reports": ("title", "description", "location"),
+    "ocr_results": ("message", "lokasi"),
+}
+REINDEX_BATCH_SIZE: int = 500
+MIN_STEM_LENGTH: int = 3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# "RT 05", "rt.5", "RW: 012" -> single tokens rt5 / rw12 (InnoDB skips tokens shorter than 3 chars)
+_RT_RW_RE = re.compile(r"\b(rt|rw)\s*[.:/]?\s*0*(\d{1,3})\b")
+
+ABBREVIATIONS = {
+    "kel": "kelurahan",
+    "kec": "kecamatan",
+    "kab": "kabupaten",
+    "jl": "jalan",
+    "jln": "jalan",
+    "gg": "gang",
+    "prov": "provinsi",
+    "jakut": "jakarta utara",
+    "jaksel": "jakarta selatan",
+    "jakbar": "jakarta barat",
+    "jaktim": "jakarta timur",
+    "jakpus": "jakarta pusat",
+}
+
+STOPWORDS = frozenset("""
+ada adalah agar akan aku anda atau bagi bahwa bapak begitu belum bisa boleh dan dapat dari daripada
+dengan di dia ibu ini itu jadi jika juga kalau kami kamu karena ke kepada kita lagi lah maka mana
+masih mereka nya oleh pada para pun saat saja sampai sangat saya sebagai sebuah secara sedang sejak
+seperti serta setelah sudah supaya tapi telah tentang tersebut tetapi tidak untuk yaitu yakni yang
+""".split())
+
+_PARTICLES = ("lah", "kah", "tah", "pun")
+_POSSESSIVES = ("nya", "ku", "mu")
+_SUFFIXES = ("kan", "an")
+_VOWELS = "aeiou"
+
+
+def _strip_prefix(word: str) -> str:
+    """Remove one derivational prefix, recoding the nasal where it replaced a consonant."""
+    if len(word) <= 4:
+        return word
+    if word.startswith(("meny", "peny")) and word[4:5] in _VOWELS:
+        return "s" + word[4:]
+    if word.startswith(("meng", "peng")):
+        return word[4:]
+    if word.startswith(("mem", "pem")):
+        return ("p" + word[3:]) if word[3:4] in _VOWELS else word[3:]
+    if word.startswith(("men", "pen")):
+        return ("t" + word[3:]) if word[3:4] in _VOWELS else word[3:]
+    for prefix in ("ber", "ter", "per"):
+        if word.startswith(prefix):
+            return word[3:]
+    for prefix in ("me", "pe", "be", "di", "ke", "se"):
+        if word.startswith(prefix):
+            return word[2:]
+    return word
+
+
+def stem(word: str) -> str:
+    """Light Indonesian stemmer: particles, possessives, suffixes, then prefixes."""
+    if len(word) <= 4 or word.isdigit():
+        return word
+    w = word
+    for group in (_PARTICLES, _POSSESSIVES, _SUFFIXES):
+        for suffix in group:
+            if w.endswith(suffix) and len(w) - len(suffix) >= MIN_STEM_LENGTH + 1:
+                w = w[: -len(suffix)]
+                break
+    stripped = _strip_prefix(w)
+    if len(stripped) >= MIN_STEM_LENGTH:
+        w = stripped
+    # di-per-, mem-per-, ke-ter-: only "per" is common enough as a second prefix
+    if w != word and w.startswith("per") and len(w) - 3 >= MIN_STEM_LENGTH:
+        w = w[3:]
+    return w
+
+
+def words(text: Optional[str]) -> List[str]:
+    """Normalized words of ``text``: abbreviations expanded, stopwords removed."""
+    if not text:
+        return []
+    s = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    s = _RT_RW_RE.sub(lambda m: f" {m.group(1)}{int(m.group(2))} ", s)
+    out: List[str] = []
+    for tok in _TOKEN_RE.findall(s):
+        for word in ABBREVIATIONS.get(tok, tok).split():
+            if word not in STOPWORDS:
+                out.append(word)
+    return out
+
+
+def analyze(text: Optional[str]) -> List[str]:
+    """Stems of the words of ``text``."""
+    return [stem(w) for w in words(text)]
+
+
+def index_text(*parts: Optional[str]) -> str:
+    """Value for the ``search_text`` column of a row built from ``parts``."""
+    out: List[str] = []
+    for part in parts:
+        for word in words(part):
+            out.append(word)
+            s = stem(word)
+            if s != word:
+                out.append(s)
+    return " ".join(out)
+
+
+def boolean_query(q: str, require_all: bool = False) -> str:
+    """MATCH ... AGAINST string (BOOLEAN MODE) for a user query.
+
+    Each query word becomes ``(word stem)``. Terms are optional by default so
+    partial matches still rank, with rows containing more of the terms scoring
+    higher; ``require_all`` makes every term mandatory.
+    """
+    seen: List[str] = []
+    for word in words(q):
+        if word not in seen:
+            seen.append(word)
+    op = "+" if require_all else ""
+    terms = []
+    for word in seen:
+        s = stem(word)
+        terms.append(f"{op}({word} {s})" if s != word else f"{op}{word}")
+    return " ".join(terms)
+
+
+def reindex(conn, table: str, only_missing: bool = True, batch_size: int = REINDEX_BATCH_SIZE) -> int:
+    """Fill ``search_text`` for ``table`` in id order; returns rows updated."""
+    columns = SEARCH_TABLES[table]
+    cur = conn.cursor()
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            cur.execute(
+                f"""
+                SELECT id, {", ".join(columns)}
+                FROM {table}
+                WHERE id > %s {"AND search_text IS NULL" if only_missing else ""}
+                ORDER BY id
+                LIMIT %s
+                """,
+                (last_id, int(batch_size)),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+            cur.executemany(
+                f"UPDATE {table} SET search_text = %s WHERE id = %s",
+                [(index_text(*row[1:]), row[0]) for row in rows],
+            )
+            conn.commit()
+            updated += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        cur.close()
+    return updated
+
+
+def _main(argv: Iterable[str]) -> int:
+    args = list(argv)
+    if not args or args[0] != "reindex":
+        print("usage: python search.py reindex [--all]")
+        return 2
+    from app import get_db_connection
+
+    conn = get_db_connection()
+    if not conn:
+        print("Database connection failed")
+        return 1
+    try:
+        for table in SEARCH_TABLES:
+            n = reindex(conn, table, only_missing="--all" not in args)
+            print(f"{table}: {n} rows indexed")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -16,11 +16,15 @@ CREATE TABLE IF NOT EXISTS ocr_results (
   longitude DECIMAL(9,6) NULL,
   source_file VARCHAR(255) NULL,
   engine VARCHAR(100) NULL,
+  content_sha256 CHAR(64) NULL, -- SHA-256 of the uploaded document (dedup)
+  search_text TEXT NULL, -- analyzed message + lokasi (see search.py)
   created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (id),
   INDEX idx_created_at (created_at),
   INDEX idx_lokasi (lokasi),
-  INDEX idx_lat_lon (latitude, longitude)
+  INDEX idx_lat_lon (latitude, longitude),
+  INDEX idx_content_sha256 (content_sha256),
+  FULLTEXT INDEX ft_search_text (search_text)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 CREATE TABLE IF NOT EXISTS reports (
@@ -37,17 +41,99 @@ CREATE TABLE IF NOT EXISTS reports (
   urgency ENUM('rendah', 'sedang', 'tinggi', 'darurat') NOT NULL DEFAULT 'sedang',
   status ENUM('dilaporkan', 'diproses', 'selesai', 'ditolak') NOT NULL DEFAULT 'dilaporkan',
   evidence_files JSON NULL, -- Store array of file paths/names
+  geohash CHAR(9) NULL, -- of (latitude, longitude), for /reports/nearby
+  search_text TEXT NULL, -- analyzed title + description + location (see search.py)
   created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (id),
-  INDEX idx_report_type (report_type),
-  INDEX idx_status (status),
-  INDEX idx_urgency (urgency),
+  -- Keyset listing (ORDER BY created_at DESC, id DESC) per filter combination;
+  -- InnoDB appends the primary key (id) to every secondary index.
   INDEX idx_created_at (created_at),
+  INDEX idx_type_created (report_type, created_at),
+  INDEX idx_status_created (status, created_at),
+  INDEX idx_urgency_created (urgency, created_at),
+  INDEX idx_type_status_created (report_type, status, created_at),
+  INDEX idx_type_urgency_created (report_type, urgency, created_at),
+  INDEX idx_status_urgency_created (status, urgency, created_at),
+  INDEX idx_type_status_urgency_created (report_type, status, urgency, created_at),
   INDEX idx_location (location),
-  INDEX idx_lat_lon (latitude, longitude)
+  INDEX idx_lat_lon (latitude, longitude),
+  INDEX idx_geohash_created (geohash, created_at),
+  FULLTEXT INDEX ft_search_text (search_text)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Table: ocr_jobs (durable queue behind POST /ocr; needs MySQL 8.0+ for SKIP LOCKED)
+CREATE TABLE IF NOT EXISTS ocr_jobs (
+  id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  status ENUM('queued', 'processing', 'done', 'failed') NOT NULL DEFAULT 'queued',
+  source_file VARCHAR(255) NULL,
+  content_type VARCHAR(100) NULL,
+  lang VARCHAR(20) NULL,
+  file_path VARCHAR(512) NOT NULL,
+  content_sha256 CHAR(64) NULL,
+  attempts INT UNSIGNED NOT NULL DEFAULT 0,
+  error TEXT NULL,
+  result JSON NULL, -- minimal [{message, lokasi, lat, long}] as returned by the old sync /ocr
+  result_id BIGINT UNSIGNED NULL,
+  timings JSON NULL, -- per-stage spans of the last attempt (GET /ocr/jobs/{id}?debug=true)
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  started_at TIMESTAMP NULL,
+  finished_at TIMESTAMP NULL,
+  worker_id VARCHAR(64) NULL, -- pool that claimed the job (host:pid:random)
+  heartbeat_at TIMESTAMP NULL, -- refreshed by that pool while it runs; stale = dead worker
+  PRIMARY KEY (id),
+  INDEX idx_status_id (status, id),
+  INDEX idx_result_id (result_id),
+  INDEX idx_content_sha256_status (content_sha256, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Table: file_blobs (content-addressed uploads under uploads/blobs/, reference counted)
+CREATE TABLE IF NOT EXISTS file_blobs (
+  sha256 CHAR(64) NOT NULL,
+  stored_name VARCHAR(255) NOT NULL, -- relative to uploads/, e.g. blobs/ab/<sha256>.png
+  size_bytes BIGINT UNSIGNED NOT NULL,
+  content_type VARCHAR(100) NULL,
+  ref_count INT UNSIGNED NOT NULL DEFAULT 0,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  last_used_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (sha256),
+  UNIQUE KEY uniq_stored_name (stored_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Upgrading an existing database created before per-stage timings:
+-- ALTER TABLE ocr_jobs ADD COLUMN timings JSON NULL AFTER result_id;
+
+-- Upgrading an existing database created before job heartbeats:
+-- ALTER TABLE ocr_jobs ADD COLUMN worker_id VARCHAR(64) NULL AFTER finished_at,
+--   ADD COLUMN heartbeat_at TIMESTAMP NULL AFTER worker_id;
+
+-- Upgrading an existing database created before full-text search
+-- (then run `python search.py reindex` to fill search_text):
+-- ALTER TABLE ocr_results ADD COLUMN search_text TEXT NULL AFTER content_sha256,
+--   ADD FULLTEXT INDEX ft_search_text (search_text);
+-- ALTER TABLE reports ADD COLUMN search_text TEXT NULL AFTER geohash,
+--   ADD FULLTEXT INDEX ft_search_text (search_text);
+
+-- Upgrading an existing database created before geohash indexing:
+-- ALTER TABLE reports ADD COLUMN geohash CHAR(9) NULL AFTER evidence_files,
+--   ADD INDEX idx_geohash_created (geohash, created_at);
+-- UPDATE reports SET geohash = ST_GeoHash(longitude, latitude, 9)
+--   WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND geohash IS NULL;
+
+-- Upgrading an existing database created before keyset pagination:
+-- ALTER TABLE reports DROP INDEX idx_report_type, DROP INDEX idx_status, DROP INDEX idx_urgency,
+--   ADD INDEX idx_type_created (report_type, created_at),
+--   ADD INDEX idx_status_created (status, created_at),
+--   ADD INDEX idx_urgency_created (urgency, created_at),
+--   ADD INDEX idx_type_status_created (report_type, status, created_at),
+--   ADD INDEX idx_type_urgency_created (report_type, urgency, created_at),
+--   ADD INDEX idx_status_urgency_created (status, urgency, created_at),
+--   ADD INDEX idx_type_status_urgency_created (report_type, status, urgency, created_at);
+
+-- Upgrading an existing database created before content hashing:
+-- ALTER TABLE ocr_results ADD COLUMN content_sha256 CHAR(64) NULL AFTER engine,
+--   ADD INDEX idx_content_sha256 (content_sha256);
+
 -- Optional view for quick latest items
 CREATE OR REPLACE VIEW v_ocr_results_latest AS
 SELECT id, message, lokasi, latitude, longitude, source_file, engine, created_at
@@ -0,0 +1,130 @@
+"""Per-stage timing for the OCR -> LLM -> geocode pipeline.
+
+``span(stage)`` times a block. Every span feeds a process-wide histogram
+served by ``GET /metrics`` in the Prometheus text format; spans that run
+inside ``trace(...)`` are also recorded on that trace, which is stored with
+the job (``GET /ocr/jobs/{id}?debug=true``) and printed as a slow-request
+line when the whole pipeline takes longer than ``SLOW_PIPELINE_SECONDS``.
+
+The active trace lives in a ``ContextVar``; code that hands work to a thread
+pool must submit through ``contextvars.copy_context().run`` for the spans to
+land on the caller's trace (the geocoder does).
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SLOW_PIPELINE_SECONDS: float = float(os.environ.get("SLOW_PIPELINE_SECONDS", "20"))
+SPAN_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+class Histogram:
+    """Minimal labelled Prometheus histogram (cumulative buckets, sum, count)."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Sequence[float] = SPAN_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[str, List[float]] = {}  # label value -> bucket counts + [sum, count]
+
+    def observe(self, label_value: str, seconds: float) -> None:
+        with self._lock:
+            s = self._series.get(label_value)
+            if s is None:
+                s = self._series[label_value] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if seconds <= b:
+                    s[i] += 1
+            s[-2] += seconds
+            s[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for value, s in sorted(series.items()):
+            lbl = f'{self.label}="{value}"'
+            for i, b in enumerate(self.buckets):
+                lines.append(f'{self.name}_bucket{{{lbl},le="{b:g}"}} {int(s[i])}')
+            lines.append(f'{self.name}_bucket{{{lbl},le="+Inf"}} {int(s[-1])}')
+            lines.append(f"{self.name}_sum{{{lbl}}} {s[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{lbl}}} {int(s[-1])}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("ocr_stage_duration_seconds", "Time spent per OCR pipeline stage.", "stage")
+PIPELINE_SECONDS = Histogram("ocr_pipeline_duration_seconds", "End-to-end time per traced pipeline run.", "pipeline")
+
+
+class Trace:
+    def __init__(self, name: str, **attrs: Any):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.total: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, attrs: Dict[str, Any]) -> None:
+        entry = {"stage": stage, "start_s": round(time.perf_counter() - seconds - self.started, 4), "seconds": round(seconds, 4)}
+        entry.update(attrs)
+        with self._lock:
+            self.spans.append(entry)
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-ready breakdown: total, per-stage count/seconds, and the raw spans."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_s"])
+        stages: Dict[str, Dict[str, float]] = {}
+        for s in spans:
+            agg = stages.setdefault(s["stage"], {"count": 0, "seconds": 0.0})
+            agg["count"] += 1
+            agg["seconds"] = round(agg["seconds"] + s["seconds"], 4)
+        total = self.total if self.total is not None else time.perf_counter() - self.started
+        return {"pipeline": self.name, "total_s": round(total, 4), "stages": stages, "spans": spans}
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("ocr_trace", default=None)
+
+
+def record(stage: str, seconds: float, **attrs: Any) -> None:
+    """Record a duration measured elsewhere (e.g. in a worker process)."""
+    STAGE_SECONDS.observe(stage, seconds)
+    tr = _current.get()
+    if tr is not None:
+        tr.add(stage, seconds, attrs)
+
+
+@contextmanager
+def span(stage: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """Time the block as ``stage``; the yielded dict can take extra attributes."""
+    t = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record(stage, time.perf_counter() - t, **attrs)
+
+
+@contextmanager
+def trace(name: str, **attrs: Any) -> Iterator[Trace]:
+    tr = Trace(name, **attrs)
+    token = _current.set(tr)
+    try:
+        yield tr
+    finally:
+        _current.reset(token)
+        tr.total = time.perf_counter() - tr.started
+        PIPELINE_SECONDS.observe(name, tr.total)
+        if tr.total >= SLOW_PIPELINE_SECONDS:
+            s = tr.summary()
+            print(f"[SLOW OCR] {json.dumps({**attrs, 'total_s': s['total_s'], 'stages': s['stages']}, default=str)}")
+
+
+def render_metrics() -> str:
+    return "\n".join(STAGE_SECONDS.render() + PIPELINE_SECONDS.render()) + "\n"
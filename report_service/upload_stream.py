@@ -0,0 +1,151 @@
+"""Streaming upload handling.
+
+Copies an ``UploadFile`` to disk in fixed-size chunks (file I/O runs in the
+threadpool), hashing on the fly and sniffing the real type from the first
+bytes, so memory per upload stays at one chunk and oversize files are
+rejected as soon as they cross the cap. Starlette has already spooled the
+whole multipart body by the time an endpoint runs, so ``upload_limit`` also
+gives the per-route cap the app checks against ``Content-Length`` before
+the form is parsed.
+"""
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+CHUNK_SIZE: int = 1024 * 1024
+MAX_EVIDENCE_BYTES: int = int(os.environ.get("MAX_EVIDENCE_BYTES", str(100 * 1024 * 1024)))
+MAX_DOCUMENT_BYTES: int = int(os.environ.get("MAX_DOCUMENT_BYTES", str(25 * 1024 * 1024)))
+MAX_BATCH_BYTES: int = int(os.environ.get("MAX_BATCH_BYTES", str(500 * 1024 * 1024)))
+MAX_REPORT_BYTES: int = int(os.environ.get("MAX_REPORT_BYTES", str(500 * 1024 * 1024)))  # all evidence of one report
+FORM_OVERHEAD_BYTES: int = 64 * 1024  # multipart boundaries and text fields
+
+UPLOAD_ROUTES = {
+    "/reports": MAX_REPORT_BYTES,
+    "/ocr": MAX_DOCUMENT_BYTES + FORM_OVERHEAD_BYTES,
+    "/ocr/batch": MAX_BATCH_BYTES + FORM_OVERHEAD_BYTES,
+}
+
+IMAGE_KINDS = ("jpeg", "png", "gif", "webp", "heic")
+VIDEO_KINDS = ("mp4", "mov", "webm")
+EVIDENCE_KINDS = IMAGE_KINDS + VIDEO_KINDS + ("pdf",)
+DOCUMENT_KINDS = ("jpeg", "png", "webp", "pdf")
+ARCHIVE_KINDS = ("zip",)
+
+KIND_INFO = {
+    "jpeg": (".jpg", "image/jpeg"),
+    "png": (".png", "image/png"),
+    "gif": (".gif", "image/gif"),
+    "webp": (".webp", "image/webp"),
+    "heic": (".heic", "image/heic"),
+    "mp4": (".mp4", "video/mp4"),
+    "mov": (".mov", "video/quicktime"),
+    "webm": (".webm", "video/webm"),
+    "pdf": (".pdf", "application/pdf"),
+    "zip": (".zip", "application/zip"),
+}
+
+
+@dataclass
+class StreamedUpload:
+    path: Path
+    sha256: str
+    size: int
+    kind: str
+
+    @property
+    def ext(self) -> str:
+        return KIND_INFO[self.kind][0]
+
+    @property
+    def content_type(self) -> str:
+        return KIND_INFO[self.kind][1]
+
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    """Identify a file type from its leading bytes (magic numbers)."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"heic", b"heix", b"mif1", b"msf1", b"hevc"):
+            return "heic"
+        if brand == b"qt  ":
+            return "mov"
+        return "mp4"
+    return None
+
+
+def upload_limit(method: str, path: str) -> Optional[int]:
+    """Largest request body accepted by an upload route, or None if not one."""
+    if method != "POST":
+        return None
+    return UPLOAD_ROUTES.get(path.rstrip("/") or "/")
+
+
+def _open(path: Path):
+    return open(path, "wb")
+
+
+def _discard(path: Path) -> None:
+    try:
+        path.unlink(missing_ok=True)
+    except Exception:
+        pass
+
+
+async def stream_upload(
+    file: UploadFile,
+    dest_dir: Path,
+    max_bytes: int = MAX_EVIDENCE_BYTES,
+    allowed_kinds: Iterable[str] = EVIDENCE_KINDS,
+) -> Optional[StreamedUpload]:
+    """Stream ``file`` into ``dest_dir``; returns None for an empty upload.
+
+    Raises 415 for unsupported content and 413 once ``max_bytes`` is exceeded;
+    the partial file is removed in both cases.
+    """
+    head = await file.read(CHUNK_SIZE)
+    if not head:
+        return None
+    kind = sniff_kind(head[:32])
+    if kind not in tuple(allowed_kinds):
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {file.filename}")
+
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    path = dest_dir / f".{uuid.uuid4().hex}{KIND_INFO[kind][0]}.part"
+    digest = hashlib.sha256()
+    size = 0
+    out = await run_in_threadpool(_open, path)
+    try:
+        chunk = head
+        while chunk:
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"File too large: {file.filename} (max {max_bytes} bytes)")
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+            chunk = await file.read(CHUNK_SIZE)
+    except BaseException:
+        await run_in_threadpool(out.close)
+        _discard(path)
+        raise
+    await run_in_threadpool(out.close)
+    return StreamedUpload(path=path, sha256=digest.hexdigest(), size=size, kind=kind)
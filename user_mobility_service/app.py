@@ -1,11 +1,28 @@
-from fastapi import FastAPI
+import asyncio
+import base64
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import mysql.connector
 from mysql.connector import Error
 from typing import List, Optional
 from datetime import datetime, date
 
+try:
+    from . import columnar_export, density_index, favorites_index, hazard_alerts, mobility_ingest, mobility_partitions, mobility_stats, route_exposure
+except Exception:
+    import columnar_export
+    import density_index
+    import favorites_index
+    import hazard_alerts
+    import mobility_ingest
+    import mobility_partitions
+    import mobility_stats
+    import route_exposure
+
 app = FastAPI()
 
 # === Izinkan semua domain untuk akses API ===
@@ -40,14 +57,23 @@ class FavoriteLocation(BaseModel):
     is_home: bool = False
     is_work: bool = False
 
+class PolygonQuery(BaseModel):
+    polygon: List[List[float]]  # [[lat, lon], ...]
+
+class FavoritePolygonQuery(PolygonQuery):
+    home_work_only: bool = False
+
+class RtTerdampakBatch(BaseModel):
+    rows: List[dict]  # baris rt_terdampak (kolom tabel atau format scraper)
+
 # === DB helper ===
-def get_connection():
+def get_connection(database: str = "user_mobility"):
     try:
         connection = mysql.connector.connect(
             host="localhost",
             user="root",
             password="Raihan26",
-            database="user_mobility"
+            database=database
         )
         return connection
     except Error as e:
@@ -85,79 +111,300 @@ async def root():
 async def health_check():
     return check_database_connection()
 
+# === Writer bersama untuk semua titik mobilitas (multi-row INSERT, group commit) ===
+mobility_writer = mobility_ingest.MobilityWriter(get_connection)
+# Statistik trip per user-hari diperbarui setiap kali titik baru tersimpan
+trip_stats = mobility_stats.TripStats(get_connection)
+mobility_writer.add_listener(trip_stats.on_rows)
+# Posisi terakhir tiap user aktif, untuk kepadatan real-time
+user_density = density_index.DensityIndex()
+mobility_writer.add_listener(user_density.on_rows)
+# Bahaya aktif (banjir, pintu air, keramaian) dicocokkan ke user di sekitarnya
+hazard_watcher = hazard_alerts.HazardWatcher(get_connection, user_density)
+# Lokasi kamera & kelurahan di sepanjang rute asal -> tujuan, di-cache per pasangan sel
+route_exposures = route_exposure.RouteExposure(get_connection, hazard_watcher)
+mobility_writer.add_listener(route_exposures.on_rows)
+BATCH_ACK_TIMEOUT_S = 30.0
+
+@app.on_event("startup")
+def start_mobility_writer():
+    mobility_writer.start()
+    # partisi bulanan ke depan + arsip partisi lama, sekali sehari
+    mobility_partitions.start_maintenance(get_connection)
+    conn = get_connection()
+    if conn:
+        try:
+            n = user_density.warm(conn)
+            print(f"[DENSITY] {n} posisi terbaru dimuat")
+            n = favorites_index.backfill(conn)
+            if n:
+                print(f"[FAVORITES] geohash diisi untuk {n} lokasi favorit")
+        except Error as e:
+            print(f"[DB ERROR] {e}")
+        finally:
+            conn.close()
+    hazard_watcher.start()
+    route_exposures.start()
+
+@app.on_event("shutdown")
+def stop_mobility_writer():
+    hazard_watcher.stop()
+    route_exposures.stop()
+    mobility_writer.stop()
+
 # === POST data user mobility ===
 @app.post("/mobility")
 def post_mobility(data: MobilityData):
+    row = (data.user_id, data.latitude, data.longitude, data.dest_latitude, data.dest_longitude, datetime.now())
+    try:
+        batch_id, fut = mobility_writer.submit([row])
+    except mobility_ingest.BufferFull as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    try:
+        ack = fut.result(timeout=BATCH_ACK_TIMEOUT_S)
+    except FutureTimeoutError:
+        # belum di-commit, tapi masih antre; cek di GET /mobility/batch/{batch_id}
+        return JSONResponse(status_code=202, content={"status": "queued", "batch_id": batch_id})
+    if ack["status"] != "committed":
+        return {"error": ack.get("error")}
+    return {"status": "success", "data": data}
+
+# === POST batch titik mobilitas (JSON array / NDJSON, boleh gzip) ===
+@app.post("/mobility/batch")
+async def post_mobility_batch(request: Request, wait: bool = True):
+    """Terima banyak titik sekaligus.
+
+    Body: JSON array, {"points": [...]}, atau NDJSON (satu objek per baris),
+    boleh dikompres gzip (Content-Encoding: gzip). Field sama dengan POST
+    /mobility ditambah `timestamp` opsional (ISO 8601 atau epoch).
+    Titik yang tidak valid dilaporkan per index; sisanya tetap disimpan.
+    wait=false langsung membalas 202 dengan batch_id untuk dicek di
+    GET /mobility/batch/{batch_id}.
+    """
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > mobility_ingest.MAX_BODY_BYTES:
+            return JSONResponse(status_code=413, content={"error": "Request body too large"})
+    try:
+        points = await run_in_threadpool(
+            mobility_ingest.parse_points,
+            bytes(body),
+            request.headers.get("content-type"),
+            request.headers.get("content-encoding"),
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if len(points) > mobility_ingest.MAX_BATCH_POINTS:
+        return JSONResponse(status_code=413, content={"error": f"At most {mobility_ingest.MAX_BATCH_POINTS} points per batch"})
+
+    rows, rejected = await run_in_threadpool(mobility_ingest.validate_points, points)
+    result = {"received": len(points), "accepted": len(rows), "rejected": rejected}
+    if not rows:
+        return JSONResponse(status_code=400, content={"status": "rejected", **result})
+    try:
+        batch_id, fut = mobility_writer.submit(rows)
+    except mobility_ingest.BufferFull as e:
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": "1"})
+    if not wait:
+        return JSONResponse(status_code=202, content={"status": "queued", "batch_id": batch_id, **result})
+    try:
+        ack = await asyncio.wait_for(asyncio.wrap_future(fut), BATCH_ACK_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        return JSONResponse(status_code=202, content={"status": "queued", "batch_id": batch_id, **result})
+    status_code = 200 if ack["status"] == "committed" else 500
+    return JSONResponse(status_code=status_code, content={**ack, **result})
+
+# === GET status batch ===
+@app.get("/mobility/batch/{batch_id}")
+def get_mobility_batch(batch_id: str):
+    ack = mobility_writer.ack(batch_id)
+    if not ack:
+        return JSONResponse(status_code=404, content={"error": "Batch tidak ditemukan"})
+    return ack
+
+# === Paginasi keyset (timestamp, id) ===
+MOBILITY_MAX_LIMIT = 1000
+
+def encode_mobility_cursor(ts, row_id: int) -> str:
+    raw = f"{ts.isoformat() if hasattr(ts, 'isoformat') else ts}|{int(row_id)}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_mobility_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, row_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        return None
+
+def query_mobility_page(user_id: Optional[str], limit: Optional[int], cursor: Optional[str], start: Optional[str], end: Optional[str]):
+    """Satu halaman mobility terbaru dulu, dibatasi jendela waktu [start, end).
+
+    Filter timestamp membuat MySQL hanya membuka partisi bulan yang tersentuh;
+    lanjutkan dengan `next_cursor` dari respons sebelumnya.
+    """
+    try:
+        safe_limit = int(limit) if limit is not None else 100
+    except Exception:
+        safe_limit = 100
+    safe_limit = min(max(safe_limit, 1), MOBILITY_MAX_LIMIT)
+    conditions, params = [], []
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    try:
+        if start:
+            conditions.append("timestamp >= %s")
+            params.append(datetime.fromisoformat(start))
+        if end:
+            conditions.append("timestamp < %s")
+            params.append(datetime.fromisoformat(end))
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "start/end harus format ISO 8601"})
+    if cursor:
+        after = decode_mobility_cursor(cursor)
+        if after is None:
+            return JSONResponse(status_code=400, content={"error": "Invalid cursor"})
+        conditions.append("(timestamp < %s OR (timestamp = %s AND id < %s))")
+        params.extend([after[0], after[0], after[1]])
+
     conn = get_connection()
     if not conn:
         return {"error": "Database connection failed."}
-    
+    db_cursor = conn.cursor(dictionary=True)
     try:
-        cursor = conn.cursor()
-        query = """
-            INSERT INTO mobility (user_id, latitude, longitude, dest_latitude, dest_longitude)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        cursor.execute(query, (
-            data.user_id,
-            data.latitude,
-            data.longitude,
-            data.dest_latitude,
-            data.dest_longitude
-        ))
-        conn.commit()
-        return {"status": "success", "data": data}
+        query = "SELECT * FROM mobility"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY timestamp DESC, id DESC LIMIT %s"
+        params.append(safe_limit + 1)
+        db_cursor.execute(query, params)
+        result = db_cursor.fetchall()
+        has_more = len(result) > safe_limit
+        result = result[:safe_limit]
+        next_cursor = encode_mobility_cursor(result[-1]["timestamp"], result[-1]["id"]) if has_more and result else None
+        return {"status": "success", "data": result, "count": len(result), "next_cursor": next_cursor}
     except Error as e:
         return {"error": str(e)}
     finally:
-        cursor.close()
+        db_cursor.close()
         conn.close()
 
 # === GET seluruh data mobilitas ===
 @app.get("/mobility")
-def get_all_mobility(limit: Optional[int] = 100):
-    conn = get_connection()
-    if not conn:
-        return {"error": "Database connection failed."}
-    
-    try:
-        cursor = conn.cursor(dictionary=True)
-        # sanitize and clamp limit
-        try:
-            safe_limit = int(limit) if limit is not None else 100
-        except Exception:
-            safe_limit = 100
-        if safe_limit < 1:
-            safe_limit = 1
-        if safe_limit > 1000:
-            safe_limit = 1000
-
-        cursor.execute(f"SELECT * FROM mobility ORDER BY timestamp DESC LIMIT {safe_limit}")
-        result = cursor.fetchall()
-        return {"status": "success", "data": result, "count": len(result)}
-    except Error as e:
-        return {"error": str(e)}
-    finally:
-        cursor.close()
-        conn.close()
+def get_all_mobility(limit: Optional[int] = 100, cursor: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None):
+    return query_mobility_page(None, limit, cursor, start, end)
 
 # === GET data mobilitas berdasarkan user_id ===
 @app.get("/mobility/{user_id}")
-def get_mobility_by_user(user_id: str):
-    conn = get_connection()
-    if not conn:
-        return {"error": "Database connection failed."}
-    
+def get_mobility_by_user(user_id: str, limit: Optional[int] = 100, cursor: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None):
+    """Riwayat mobilitas user, per halaman (default 100, maks 1000)."""
+    return query_mobility_page(user_id, limit, cursor, start, end)
+
+# === Kepadatan user aktif (posisi terakhir dalam ACTIVE_TTL_S) ===
+@app.get("/density/tiles/{z}/{x}/{y}")
+def get_density_tile(z: int, x: int, y: int, bins: int = density_index.TILE_BINS):
+    """Heatmap satu tile XYZ: jumlah user per sel (sel < MIN_BIN_COUNT disembunyikan)."""
+    if not 0 <= z <= 22 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return JSONResponse(status_code=400, content={"error": "Tile tidak valid"})
+    bins = min(max(bins, 1), 256)
+    return user_density.tile(x, y, z, bins)
+
+@app.get("/density/count")
+def get_density_count(lat: float, lon: float, radius_m: float = 500):
+    """Jumlah user aktif dalam radius dari satu titik (mis. lokasi CCTV)."""
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or not 0 < radius_m <= 50000:
+        return JSONResponse(status_code=400, content={"error": "Parameter tidak valid"})
+    return {"lat": lat, "lon": lon, "radius_m": radius_m, "count": user_density.count_in_radius(lat, lon, radius_m)}
+
+@app.post("/density/count-in-polygon")
+def post_density_count_in_polygon(query: PolygonQuery):
+    """Jumlah user aktif di dalam poligon [[lat, lon], ...]."""
+    if len(query.polygon) < 3 or any(len(p) != 2 for p in query.polygon):
+        return JSONResponse(status_code=400, content={"error": "Poligon minimal 3 titik [lat, lon]"})
+    return {"count": user_density.count_in_polygon(query.polygon)}
+
+@app.get("/density/stats")
+def get_density_stats():
+    return user_density.stats()
+
+# === Bahaya aktif & user terdampak ===
+@app.get("/hazards")
+def get_active_hazards():
+    """Bahaya aktif dari siklus terakhir beserta jumlah user terdampak."""
+    hazards = hazard_watcher.active()
+    return {"status": "success", "data": hazards, "count": len(hazards)}
+
+@app.post("/hazards/check")
+def post_hazards_check():
+    """Jalankan satu siklus pencocokan sekarang (tanpa menunggu interval)."""
+    return hazard_watcher.check()
+
+# === Paparan rute (asal -> tujuan) terhadap keramaian & banjir ===
+@app.get("/route-exposure")
+def get_route_exposure(latitude: float, longitude: float, dest_latitude: float, dest_longitude: float):
+    """Lokasi pantauan di sekitar rute; `warnings` berisi yang sedang berbahaya."""
+    return route_exposures.exposure(route_exposure.od_pair(latitude, longitude, dest_latitude, dest_longitude))
+
+@app.get("/route-exposure/stats")
+def get_route_exposure_stats():
+    return route_exposures.stats()
+
+@app.get("/route-exposure/user/{user_id}")
+def get_user_route_exposure(user_id: str):
+    """Paparan rute dari perjalanan terakhir user (titik dengan tujuan)."""
+    result = route_exposures.for_user(user_id)
+    if result is None:
+        return JSONResponse(status_code=404, content={"error": "Belum ada perjalanan dengan tujuan untuk user ini"})
+    return result
+
+# === Ekspor massal (Arrow IPC / Parquet) untuk analisis ===
+MOBILITY_EXPORT_COLUMNS = [
+    ("id", "int"), ("user_id", "str"),
+    ("latitude", "float"), ("longitude", "float"),
+    ("dest_latitude", "float"), ("dest_longitude", "float"),
+    ("timestamp", "timestamp"),
+]
+
+@app.get("/export/mobility")
+def export_mobility(format: str = "arrow", start: Optional[str] = None, end: Optional[str] = None, user_id: Optional[str] = None):
+    """Seluruh titik mobilitas yang cocok dengan filter, di-stream per chunk.
+
+    `user_id` boleh daftar dipisah koma. Filter `start`/`end` membatasi partisi
+    bulan yang dibaca.
+    """
+    if not columnar_export.available():
+        return JSONResponse(status_code=501, content={"error": "Ekspor butuh pyarrow (pip install pyarrow)"})
+    if format not in columnar_export.FORMATS:
+        return JSONResponse(status_code=400, content={"error": "format harus 'arrow' atau 'parquet'"})
+    conditions, params = [], []
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM mobility WHERE user_id = %s ORDER BY timestamp DESC", (user_id,))
-        result = cursor.fetchall()
-        return {"status": "success", "data": result, "count": len(result)}
+        if start:
+            conditions.append("timestamp >= %s")
+            params.append(datetime.fromisoformat(start))
+        if end:
+            conditions.append("timestamp < %s")
+            params.append(datetime.fromisoformat(end))
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "start/end harus format ISO 8601"})
+    if user_id:
+        users = [u.strip() for u in user_id.split(",") if u.strip()]
+        if not users:
+            return JSONResponse(status_code=400, content={"error": "user_id tidak boleh kosong"})
+        conditions.append(f"user_id IN ({', '.join(['%s'] * len(users))})")
+        params.extend(users)
+    query = f"SELECT {', '.join(name for name, _ in MOBILITY_EXPORT_COLUMNS)} FROM mobility"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    try:
+        body = columnar_export.open_export(get_connection, query, params, MOBILITY_EXPORT_COLUMNS, format)
     except Error as e:
         return {"error": str(e)}
-    finally:
-        cursor.close()
-        conn.close()
+    if body is None:
+        return {"error": "Database connection failed."}
+    media_type, ext = columnar_export.FORMATS[format]
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="mobility.{ext}"'})
 
 # === POST user baru ===
 @app.post("/users")
@@ -209,14 +456,15 @@ def add_favorite_location(location: FavoriteLocation):
     try:
         cursor = conn.cursor()
         query = """
-            INSERT INTO favorite_locations (user_id, name, latitude, longitude, address, is_home, is_work)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO favorite_locations (user_id, name, latitude, longitude, geohash, address, is_home, is_work)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
         cursor.execute(query, (
             location.user_id,
             location.name,
             location.latitude,
             location.longitude,
+            favorites_index.encode(location.latitude, location.longitude),
             location.address,
             location.is_home,
             location.is_work
@@ -229,6 +477,63 @@ def add_favorite_location(location: FavoriteLocation):
         cursor.close()
         conn.close()
 
+# === Cari lokasi favorit dalam area (indeks geohash) ===
+@app.get("/favorites/near")
+def get_favorites_near(latitude: float, longitude: float, radius_m: float = 1000.0, home_work_only: bool = False):
+    """Lokasi favorit dalam radius, terdekat dulu."""
+    if radius_m <= 0 or radius_m > 50_000:
+        return JSONResponse(status_code=400, content={"error": "radius_m harus 0 - 50000"})
+    conn = get_connection()
+    if not conn:
+        return {"error": "Database connection failed."}
+    try:
+        result = favorites_index.in_radius(conn, latitude, longitude, radius_m, home_work_only)
+        return {"status": "success", "data": result, "count": len(result), "users": len({r["user_id"] for r in result})}
+    except Error as e:
+        return {"error": str(e)}
+    finally:
+        conn.close()
+
+@app.post("/favorites/in-polygon")
+def post_favorites_in_polygon(query: FavoritePolygonQuery):
+    """Lokasi favorit di dalam poligon [[lat, lon], ...]."""
+    if len(query.polygon) < 3 or any(len(p) != 2 for p in query.polygon):
+        return JSONResponse(status_code=400, content={"error": "Poligon minimal 3 titik [lat, lon]"})
+    conn = get_connection()
+    if not conn:
+        return {"error": "Database connection failed."}
+    try:
+        result = favorites_index.in_polygon(conn, query.polygon, query.home_work_only)
+        return {"status": "success", "data": result, "count": len(result), "users": len({r["user_id"] for r in result})}
+    except Error as e:
+        return {"error": str(e)}
+    finally:
+        conn.close()
+
+@app.post("/favorites/match-rt-terdampak")
+def post_match_rt_terdampak(batch: RtTerdampakBatch):
+    """User dengan rumah/kantor di kelurahan terdampak, per kelurahan, dalam satu query."""
+    banjir_conn = get_connection(database="banjir_monitoring")
+    if not banjir_conn:
+        return {"error": "Database connection failed."}
+    try:
+        kelurahan = favorites_index.load_kelurahan(banjir_conn)
+    except Error as e:
+        return {"error": str(e)}
+    finally:
+        banjir_conn.close()
+    conn = get_connection()
+    if not conn:
+        return {"error": "Database connection failed."}
+    try:
+        result = favorites_index.match_rt_terdampak(conn, batch.rows, kelurahan)
+        result["total_users"] = len({u for users in result["affected"].values() for u in users})
+        return {"status": "success", **result}
+    except Error as e:
+        return {"error": str(e)}
+    finally:
+        conn.close()
+
 # === GET favorite locations berdasarkan user_id ===
 @app.get("/favorites/{user_id}")
 def get_favorite_locations(user_id: str):
@@ -250,6 +555,10 @@ def get_favorite_locations(user_id: str):
 # === GET statistik mobilitas ===
 @app.get("/stats/{user_id}")
 def get_mobility_stats(user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """Statistik per hari dari tabel mobility_stats (diisi otomatis saat titik masuk).
+
+    total_distance dalam km, total_duration dalam detik, avg_trip_duration dalam menit.
+    """
     conn = get_connection()
     if not conn:
         return {"error": "Database connection failed."}
@@ -259,21 +568,17 @@ def get_mobility_stats(user_id: str, start_date: Optional[str] = None, end_date:
         
         if start_date and end_date:
             query = """
-                SELECT COUNT(*) as total_trips, 
-                       DATE(timestamp) as date
-                FROM mobility 
-                WHERE user_id = %s AND DATE(timestamp) BETWEEN %s AND %s
-                GROUP BY DATE(timestamp)
+                SELECT date, total_trips, total_distance, total_duration, avg_trip_duration
+                FROM mobility_stats
+                WHERE user_id = %s AND date BETWEEN %s AND %s
                 ORDER BY date DESC
             """
             cursor.execute(query, (user_id, start_date, end_date))
         else:
             query = """
-                SELECT COUNT(*) as total_trips, 
-                       DATE(timestamp) as date
-                FROM mobility 
+                SELECT date, total_trips, total_distance, total_duration, avg_trip_duration
+                FROM mobility_stats
                 WHERE user_id = %s
-                GROUP BY DATE(timestamp)
                 ORDER BY date DESC
                 LIMIT 30
             """
@@ -333,12 +638,25 @@ async def test_endpoint():
             "GET /health - Cek koneksi database",
             "GET /db-info - Info database",
             "POST /mobility - Tambah data mobilitas",
-            "GET /mobility - Ambil semua data mobilitas",
-            "GET /mobility/{user_id} - Ambil data mobilitas user",
+            "POST /mobility/batch - Tambah banyak titik mobilitas (JSON array/NDJSON, gzip)",
+            "GET /mobility/batch/{batch_id} - Status batch",
+            "GET /density/tiles/{z}/{x}/{y} - Heatmap kepadatan user aktif",
+            "GET /density/count - Jumlah user aktif dalam radius",
+            "POST /density/count-in-polygon - Jumlah user aktif dalam poligon",
+            "GET /mobility - Ambil data mobilitas (cursor, start, end)",
+            "GET /export/mobility - Ekspor Arrow/Parquet (format, start, end, user_id)",
+            "GET /hazards - Bahaya aktif & jumlah user terdampak",
+            "POST /hazards/check - Cocokkan bahaya ke user sekarang",
+            "GET /route-exposure - Keramaian/banjir di sepanjang rute asal -> tujuan",
+            "GET /route-exposure/user/{user_id} - Paparan rute perjalanan terakhir user",
+            "GET /mobility/{user_id} - Ambil data mobilitas user (cursor, start, end)",
             "POST /users - Tambah user baru",
             "GET /users - Ambil semua users",
             "POST /favorites - Tambah lokasi favorit",
             "GET /favorites/{user_id} - Ambil lokasi favorit user",
+            "GET /favorites/near - Lokasi favorit dalam radius",
+            "POST /favorites/in-polygon - Lokasi favorit dalam poligon",
+            "POST /favorites/match-rt-terdampak - User terdampak per kelurahan",
             "GET /stats/{user_id} - Statistik mobilitas user"
         ],
         "status": "ready"
@@ -0,0 +1,152 @@
+"""Stream a SQL result set as Arrow IPC or Parquet, chunk by chunk.
+
+The query runs on an unbuffered cursor and rows are pulled with
+``fetchmany(chunk_rows)``; each chunk becomes one Arrow record batch (or one
+Parquet row group) and its encoded bytes are handed to the HTTP response
+before the next chunk is fetched. Memory stays at one chunk no matter how
+many rows the export has.
+
+Columns are declared as ``(name, kind)`` with kind one of ``int``, ``float``,
+``str`` or ``timestamp`` so callers do not need pyarrow imported. pyarrow is
+optional: ``available()`` says whether exports can be served at all.
+
+The module is kept identical in user_mobility_service and
+crowd_monitoring_service.
+"""
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.ipc as pa_ipc  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover
+    pa = None
+    pa_ipc = None
+    pq = None
+
+EXPORT_CHUNK_ROWS: int = 65_536
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+Column = Tuple[str, str]
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _arrow_type(kind: str):
+    return {
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "str": pa.string(),
+        "timestamp": pa.timestamp("us"),
+    }[kind]
+
+
+def _to_array(values: Sequence[Any], kind: str):
+    if kind == "float":
+        # DECIMAL columns arrive as Decimal; Arrow wants floats
+        values = [None if v is None else float(v) for v in values]
+    return pa.array(values, _arrow_type(kind))
+
+
+class _Sink:
+    """Write-only file object whose contents are drained after every chunk."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _encode(cursor, columns: Sequence[Column], fmt: str, chunk_rows: int) -> Iterator[bytes]:
+    schema = pa.schema([(name, _arrow_type(kind)) for name, kind in columns])
+    sink = _Sink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        write = writer.write_table
+        wrap = pa.Table.from_arrays
+    else:
+        writer = pa_ipc.new_stream(sink, schema)
+        write = writer.write_batch
+        wrap = pa.RecordBatch.from_arrays
+    with writer:
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk:
+                break
+            cols = list(zip(*chunk))
+            arrays = [_to_array(cols[i], kind) for i, (_, kind) in enumerate(columns)]
+            write(wrap(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    tail = sink.drain()  # Arrow end-of-stream marker / Parquet footer
+    if tail:
+        yield tail
+
+
+def open_export(
+    get_connection: Callable[[], Any],
+    query: str,
+    params: Sequence[Any],
+    columns: Sequence[Column],
+    fmt: str = "arrow",
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> Optional[Iterator[bytes]]:
+    """Run ``query`` now and return an iterator over the encoded file.
+
+    The query executes before this returns, so SQL errors surface to the
+    caller instead of in the middle of a response. Returns None when the
+    database is unreachable. The connection is closed once the iterator is
+    exhausted or closed.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    conn = get_connection()
+    if not conn:
+        return None
+    cursor = conn.cursor()  # unbuffered: rows stream from the server
+    try:
+        cursor.execute(query, tuple(params))
+    except Exception:
+        cursor.close()
+        conn.close()
+        raise
+
+    def stream() -> Iterator[bytes]:
+        try:
+            yield from _encode(cursor, columns, fmt, chunk_rows)
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass  # unread rows left when the client disconnected early
+            conn.close()
+
+    return stream()
@@ -0,0 +1,209 @@
+"""Live density of app users: latest position per active user on a grid.
+
+Each user's newest position sits in one cell of a fixed lat/lon grid
+(``CELL_DEG``, ~110 m). A position older than ``ACTIVE_TTL_S`` is dropped
+lazily through a min-heap of report times, so the index only ever holds
+users seen recently. Area queries touch just the cells under the area's
+bounding box and then test the candidate points with NumPy.
+
+Fed by a ``MobilityWriter`` listener and warmed from ``mobility`` at
+startup. Heatmap tiles suppress bins with fewer than ``MIN_BIN_COUNT``
+users so single people cannot be picked out.
+"""
+import heapq
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+CELL_DEG: float = 0.001
+ACTIVE_TTL_S: float = 10 * 60
+MIN_BIN_COUNT: int = 3
+TILE_BINS: int = 32  # heatmap resolution per tile side
+MAX_QUERY_CELLS: int = 250_000  # beyond this, scan users instead of cells
+EARTH_RADIUS_M: float = 6_371_000.0
+
+Cell = Tuple[int, int]
+
+
+def cell_of(lat: float, lon: float) -> Cell:
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lon / CELL_DEG))
+
+
+def tile_bounds(x: int, y: int, zoom: int) -> Dict[str, float]:
+    """Slippy-map (XYZ) tile bounds."""
+    n = 2 ** zoom
+
+    def lat_of(yy: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * yy / n))))
+
+    return {"min_lat": lat_of(y + 1), "max_lat": lat_of(y), "min_lon": x / n * 360.0 - 180.0, "max_lon": (x + 1) / n * 360.0 - 180.0}
+
+
+def points_in_polygon(lat: np.ndarray, lon: np.ndarray, polygon: Sequence[Sequence[float]]) -> np.ndarray:
+    """Even-odd ray casting for many points against one ``[[lat, lon], ...]`` ring."""
+    inside = np.zeros(len(lat), dtype=bool)
+    ring = list(polygon)
+    for k in range(len(ring)):
+        (a_lat, a_lon), (b_lat, b_lon) = ring[k - 1], ring[k]
+        crosses = (a_lat > lat) != (b_lat > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = (b_lon - a_lon) * (lat - a_lat) / (b_lat - a_lat) + a_lon
+        inside ^= crosses & (lon < x_at)
+    return inside
+
+
+def haversine_m(lat0: float, lon0: float, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Distance in metres from one point to many."""
+    p1, p2 = np.radians(lat0), np.radians(lat)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def radius_box(lat0: float, lon0: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = dlat / max(math.cos(math.radians(lat0)), 1e-6)
+    return lat0 - dlat, lon0 - dlon, lat0 + dlat, lon0 + dlon
+
+
+class DensityIndex:
+    def __init__(self, ttl_s: float = ACTIVE_TTL_S):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._users: Dict[str, Tuple[float, float, float, Cell]] = {}  # user -> (lat, lon, ts, cell)
+        self._cells: Dict[Cell, Set[str]] = {}
+        self._expiry: List[Tuple[float, str]] = []  # (ts, user); stale entries skipped
+
+    def update(self, user_id: str, lat: float, lon: float, ts: float) -> None:
+        with self._lock:
+            self._update(user_id, lat, lon, ts)
+
+    def _update(self, user_id: str, lat: float, lon: float, ts: float) -> None:
+        old = self._users.get(user_id)
+        if old is not None:
+            if old[2] >= ts:
+                return
+            self._drop_from_cell(user_id, old[3])
+        cell = cell_of(lat, lon)
+        self._users[user_id] = (lat, lon, ts, cell)
+        self._cells.setdefault(cell, set()).add(user_id)
+        heapq.heappush(self._expiry, (ts, user_id))
+
+    def _drop_from_cell(self, user_id: str, cell: Cell) -> None:
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(user_id)
+            if not members:
+                del self._cells[cell]
+
+    def expire(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        cutoff = now - self.ttl_s
+        dropped = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] < cutoff:
+                ts, user_id = heapq.heappop(self._expiry)
+                cur = self._users.get(user_id)
+                if cur is not None and cur[2] == ts:
+                    del self._users[user_id]
+                    self._drop_from_cell(user_id, cur[3])
+                    dropped += 1
+            if len(self._expiry) > 4 * len(self._users) + 1024:
+                # many superseded entries: rebuild the heap from live users
+                self._expiry = [(u[2], uid) for uid, u in self._users.items()]
+                heapq.heapify(self._expiry)
+        return dropped
+
+    def on_rows(self, rows: List[Tuple]) -> None:
+        """``MobilityWriter`` listener: rows are (user, lat, lon, dest_lat, dest_lon, timestamp)."""
+        cutoff = time.time() - self.ttl_s
+        with self._lock:
+            for user_id, lat, lon, _, _, ts in rows:
+                t = ts.timestamp()
+                if t >= cutoff:
+                    self._update(user_id, float(lat), float(lon), t)
+        self.expire()
+
+    def warm(self, conn) -> int:
+        """Load positions reported within the TTL (newest per user wins)."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT user_id, latitude, longitude, timestamp FROM mobility WHERE timestamp >= %s",
+                (datetime.now() - timedelta(seconds=self.ttl_s),),
+            )
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        with self._lock:
+            for user_id, lat, lon, ts in rows:
+                self._update(user_id, float(lat), float(lon), ts.timestamp())
+        return len(rows)
+
+    def _candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Users (and positions) whose cell overlaps the box (caller holds the lock)."""
+        c0, c1 = cell_of(min_lat, min_lon), cell_of(max_lat, max_lon)
+        n_cells = (c1[0] - c0[0] + 1) * (c1[1] - c0[1] + 1)
+        if n_cells > MAX_QUERY_CELLS or n_cells > 4 * len(self._cells):
+            ids = list(self._users)
+        else:
+            ids = []
+            for i in range(c0[0], c1[0] + 1):
+                for j in range(c0[1], c1[1] + 1):
+                    ids.extend(self._cells.get((i, j), ()))
+        arr = np.array([(self._users[u][0], self._users[u][1]) for u in ids], dtype=np.float64).reshape(-1, 2)
+        lat, lon = arr[:, 0], arr[:, 1]
+        keep = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return [u for u, k in zip(ids, keep) if k], lat[keep], lon[keep]
+
+    def count_in_polygon(self, polygon: Sequence[Sequence[float]]) -> int:
+        lats = [p[0] for p in polygon]
+        lons = [p[1] for p in polygon]
+        self.expire()
+        with self._lock:
+            _, lat, lon = self._candidates(min(lats), min(lons), max(lats), max(lons))
+        return int(points_in_polygon(lat, lon, polygon).sum()) if len(lat) else 0
+
+    def count_in_radius(self, lat0: float, lon0: float, radius_m: float) -> int:
+        return len(self.users_in_radius(lat0, lon0, radius_m))
+
+    def users_in_radius(self, lat0: float, lon0: float, radius_m: float) -> List[str]:
+        self.expire()
+        with self._lock:
+            ids, lat, lon = self._candidates(*radius_box(lat0, lon0, radius_m))
+        if not ids:
+            return []
+        inside = haversine_m(lat0, lon0, lat, lon) <= radius_m
+        return [u for u, k in zip(ids, inside) if k]
+
+    def tile(self, x: int, y: int, zoom: int, bins: int = TILE_BINS) -> Dict[str, Any]:
+        """Counts on a ``bins`` x ``bins`` grid over one XYZ tile (Web Mercator rows)."""
+        b = tile_bounds(x, y, zoom)
+        self.expire()
+        with self._lock:
+            _, lat, lon = self._candidates(b["min_lat"], b["min_lon"], b["max_lat"], b["max_lon"])
+        n = 2 ** zoom
+        cells: List[Dict[str, int]] = []
+        total = int(len(lat))
+        if total:
+            # position inside the tile in [0, 1), same projection as the map
+            fx = (lon + 180.0) / 360.0 * n - x
+            fy = (1 - np.log(np.tan(np.radians(lat)) + 1 / np.cos(np.radians(lat))) / np.pi) / 2 * n - y
+            col = np.clip((fx * bins).astype(np.int64), 0, bins - 1)
+            row = np.clip((fy * bins).astype(np.int64), 0, bins - 1)
+            counts = np.bincount(row * bins + col, minlength=bins * bins)
+            for k in np.flatnonzero(counts >= max(MIN_BIN_COUNT, 1)):
+                cells.append({"row": int(k // bins), "col": int(k % bins), "count": int(counts[k])})
+        return {
+            "z": zoom, "x": x, "y": y, "bins": bins, "bounds": b,
+            "total": total if total >= MIN_BIN_COUNT else 0,
+            "cells": cells,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"active_users": len(self._users), "cells": len(self._cells), "ttl_s": self.ttl_s}
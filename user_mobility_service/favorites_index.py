@@ -0,0 +1,210 @@
+"""Spatial lookups on ``favorite_locations`` through a geohash prefix column.
+
+Every favorite stores ``geohash`` (9 characters, ~5 m, same value as MySQL's
+``ST_GeoHash(longitude, latitude, 9)``) under an index. An area query covers
+its bounding box with at most ``MAX_COVER_CELLS`` geohash cells of one
+precision and asks for ``geohash LIKE 'prefix%'`` on each, which is a set of
+index range scans instead of a table scan; the few candidates are then
+tested exactly (haversine for circles, ray casting for polygons).
+
+``match_circles`` answers many areas with one query: the prefixes of all
+areas are merged, candidates fetched once and assigned to every area they
+fall in. ``match_rt_terdampak`` uses it to turn a batch of ``rt_terdampak``
+rows into the affected user_ids per kelurahan in one pass.
+"""
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+try:
+    from .density_index import haversine_m, points_in_polygon, radius_box
+except Exception:
+    from density_index import haversine_m, points_in_polygon, radius_box
+
+GEOHASH_PRECISION: int = 9
+MAX_COVER_CELLS: int = 24
+BACKFILL_BATCH_ROWS: int = 5000
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+Circle = Dict[str, Any]  # key, latitude, longitude, radius_m
+
+
+def encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    out, bits, ch, even = [], 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch, lon_lo = (ch << 1) | 1, mid
+            else:
+                ch, lon_hi = ch << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch, lat_lo = (ch << 1) | 1, mid
+            else:
+                ch, lat_hi = ch << 1, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def _cell_size(precision: int) -> Tuple[float, float]:
+    """(lat, lon) size in degrees of a geohash cell."""
+    n = 5 * precision
+    return 180.0 / 2 ** (n // 2), 360.0 / 2 ** ((n + 1) // 2)
+
+
+def cover(min_lat: float, min_lon: float, max_lat: float, max_lon: float, max_cells: int = MAX_COVER_CELLS) -> List[str]:
+    """Geohash prefixes (one precision) whose cells together contain the box."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        h, w = _cell_size(precision)
+        i0, i1 = math.floor((min_lat + 90) / h), math.floor((max_lat + 90) / h)
+        j0, j1 = math.floor((min_lon + 180) / w), math.floor((max_lon + 180) / w)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) <= max_cells:
+            return sorted({
+                encode((i + 0.5) * h - 90, (j + 0.5) * w - 180, precision)
+                for i in range(i0, i1 + 1)
+                for j in range(j0, j1 + 1)
+            })
+    return [""]
+
+
+def _fetch(conn, prefixes: Iterable[str], home_work_only: bool) -> List[Tuple]:
+    prefixes = sorted(set(prefixes))
+    # a prefix already covered by a shorter one adds nothing
+    prefixes = [p for p in prefixes if not any(p != q and p.startswith(q) for q in prefixes)]
+    if not prefixes:
+        return []
+    where = " OR ".join(["geohash LIKE %s"] * len(prefixes))
+    if home_work_only:
+        where = f"({where}) AND (is_home OR is_work)"
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT id, user_id, name, latitude, longitude, is_home, is_work FROM favorite_locations WHERE {where}",
+            [p + "%" for p in prefixes],
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def _as_dicts(rows: Sequence[Tuple], idx: Iterable[int], dist: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+    out = []
+    for k in idx:
+        fid, user_id, name, lat, lon, is_home, is_work = rows[k]
+        item = {
+            "id": fid, "user_id": user_id, "name": name,
+            "latitude": float(lat), "longitude": float(lon),
+            "is_home": bool(is_home), "is_work": bool(is_work),
+        }
+        if dist is not None:
+            item["distance_m"] = round(float(dist[k]), 1)
+        out.append(item)
+    return out
+
+
+def _coords(rows: Sequence[Tuple]) -> Tuple[np.ndarray, np.ndarray]:
+    return np.array([float(r[3]) for r in rows]), np.array([float(r[4]) for r in rows])
+
+
+def in_radius(conn, lat: float, lon: float, radius_m: float, home_work_only: bool = False) -> List[Dict[str, Any]]:
+    rows = _fetch(conn, cover(*radius_box(lat, lon, radius_m)), home_work_only)
+    if not rows:
+        return []
+    f_lat, f_lon = _coords(rows)
+    dist = haversine_m(lat, lon, f_lat, f_lon)
+    order = np.argsort(dist)
+    return _as_dicts(rows, [k for k in order if dist[k] <= radius_m], dist)
+
+
+def in_polygon(conn, polygon: Sequence[Sequence[float]], home_work_only: bool = False) -> List[Dict[str, Any]]:
+    lats = [p[0] for p in polygon]
+    lons = [p[1] for p in polygon]
+    rows = _fetch(conn, cover(min(lats), min(lons), max(lats), max(lons)), home_work_only)
+    if not rows:
+        return []
+    f_lat, f_lon = _coords(rows)
+    return _as_dicts(rows, np.flatnonzero(points_in_polygon(f_lat, f_lon, polygon)))
+
+
+def match_circles(conn, circles: List[Circle], home_work_only: bool = True) -> Dict[str, Set[str]]:
+    """user_ids with a favorite inside each circle, from a single query."""
+    if not circles:
+        return {}
+    prefixes: Set[str] = set()
+    for c in circles:
+        prefixes.update(cover(*radius_box(c["latitude"], c["longitude"], c["radius_m"])))
+    rows = _fetch(conn, prefixes, home_work_only)
+    if not rows:
+        return {}
+    users = [r[1] for r in rows]
+    f_lat, f_lon = _coords(rows)
+    out: Dict[str, Set[str]] = {}
+    for c in circles:
+        inside = haversine_m(c["latitude"], c["longitude"], f_lat, f_lon) <= c["radius_m"]
+        if inside.any():
+            out[c["key"]] = {users[k] for k in np.flatnonzero(inside)}
+    return out
+
+
+def match_rt_terdampak(conn, rows: Iterable[Dict[str, Any]], kelurahan: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Affected user_ids per kelurahan for a batch of ``rt_terdampak`` rows.
+
+    ``rows`` may use the table's column names or the scraper's keys
+    ("Kelurahan", ...); ``kelurahan`` maps name -> {latitude, longitude, radius_m}.
+    """
+    names: Set[str] = set()
+    for r in rows:
+        name = r.get("kelurahan") or r.get("Kelurahan")
+        if name:
+            names.add(name)
+    circles = [
+        {"key": n, "latitude": kelurahan[n]["latitude"], "longitude": kelurahan[n]["longitude"], "radius_m": kelurahan[n]["radius_m"]}
+        for n in sorted(names)
+        if n in kelurahan
+    ]
+    affected = match_circles(conn, circles)
+    return {
+        "affected": {k: sorted(v) for k, v in affected.items()},
+        "unknown_kelurahan": sorted(names - set(kelurahan)),
+    }
+
+
+def load_kelurahan(conn) -> Dict[str, Dict[str, Any]]:
+    """``banjir_monitoring.kelurahan`` as name -> {latitude, longitude, radius_m}."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT nama, latitude, longitude, radius_m FROM kelurahan")
+        return {
+            name: {"latitude": float(lat), "longitude": float(lon), "radius_m": float(radius or 1000)}
+            for name, lat, lon, radius in cursor.fetchall()
+        }
+    finally:
+        cursor.close()
+
+
+def backfill(conn) -> int:
+    """Fill ``geohash`` for favorites saved before the column existed."""
+    total = 0
+    while True:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id, latitude, longitude FROM favorite_locations WHERE geohash IS NULL LIMIT %s", (BACKFILL_BATCH_ROWS,))
+            rows = cursor.fetchall()
+            if not rows:
+                return total
+            cursor.executemany(
+                "UPDATE favorite_locations SET geohash = %s WHERE id = %s",
+                [(encode(float(lat), float(lon)), fid) for fid, lat, lon in rows],
+            )
+            conn.commit()
+            total += len(rows)
+        finally:
+            cursor.close()
@@ -0,0 +1,298 @@
+"""Match active hazards to the users near them and notify only those users.
+
+Hazards are read from the other services' databases every
+``POLL_INTERVAL_S``:
+
+* ``banjir``: kelurahan with ``rt_terdampak`` rows in the last
+  ``FLOOD_WINDOW_H`` hours, placed by the ``kelurahan`` table;
+* ``pintu_air``: floodgates whose latest status is above Normal, placed by
+  ``lokasi_pintu_air``;
+* ``keramaian``: camera locations whose latest count is at least
+  ``CROWD_MIN_COUNT``, placed by ``locations``.
+
+Each hazard is a circle. Live users come from the ``DensityIndex`` (only the
+grid cells under the circle are scanned), home/work favorites from one
+geohash-prefix query for all hazards (``favorites_index``); both are then
+tested with vectorised haversine. A user is alerted once per hazard unless it
+escalates or ``ALERT_COOLDOWN_S`` passes, and each hazard becomes one push
+to the notification service carrying just its affected ``user_ids``.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.request import Request, urlopen
+
+try:
+    from . import favorites_index
+    from .density_index import DensityIndex
+except Exception:
+    import favorites_index
+    from density_index import DensityIndex
+
+POLL_INTERVAL_S: float = 60.0
+FLOOD_WINDOW_H: int = 6
+CROWD_WINDOW_MIN: int = 30
+CROWD_MIN_COUNT: int = 200  # "ramai" dan di atasnya
+KELURAHAN_RADIUS_M: float = 1000.0
+PINTU_AIR_RADIUS_M: float = 1500.0
+CROWD_RADIUS_M: float = 300.0
+ALERT_COOLDOWN_S: float = 6 * 3600
+NOTIFY_URL: str = os.environ.get("NOTIFICATION_URL", "http://localhost:8006/api/notification/admin/push-users")
+NOTIFY_API_KEY: str = os.environ.get("NOTIFICATION_API_KEY", "admin123")
+NOTIFY_CHUNK_USERS: int = 1000
+
+Hazard = Dict[str, Any]  # key, kind, name, latitude, longitude, radius_m, severity, detail
+
+
+def _flood_severity(tinggi_cm: float) -> int:
+    # sama dengan status_banjir di banjir_service
+    if tinggi_cm >= 60:
+        return 3
+    if tinggi_cm >= 30:
+        return 2
+    return 1
+
+
+def _pintu_air_severity(status: Optional[str]) -> int:
+    s = (status or "").lower()
+    if "bahaya" in s or "siaga 1" in s or "siaga1" in s:
+        return 3
+    if "siaga" in s:
+        return 2
+    if "waspada" in s:
+        return 1
+    return 0
+
+
+def load_flood_hazards(conn) -> List[Hazard]:
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT r.kelurahan, MAX(r.tinggi_genangan) AS tinggi, COUNT(*) AS n_rt,
+                   k.latitude, k.longitude, k.radius_m
+            FROM rt_terdampak r
+            JOIN kelurahan k ON k.nama = r.kelurahan
+            WHERE r.timestamp >= NOW() - INTERVAL %s HOUR
+            GROUP BY r.kelurahan, k.latitude, k.longitude, k.radius_m
+            """,
+            (FLOOD_WINDOW_H,),
+        )
+        return [
+            {
+                "key": f"banjir:{r['kelurahan']}",
+                "kind": "banjir",
+                "name": r["kelurahan"],
+                "latitude": float(r["latitude"]),
+                "longitude": float(r["longitude"]),
+                "radius_m": float(r["radius_m"] or KELURAHAN_RADIUS_M),
+                "severity": _flood_severity(float(r["tinggi"])),
+                "detail": {"tinggi_genangan": float(r["tinggi"]), "rt_terdampak": int(r["n_rt"])},
+            }
+            for r in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+
+
+def load_pintu_air_hazards(conn) -> List[Hazard]:
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT p.nama_pintu_air, p.status, p.ketinggian_air, l.koordinat_lat, l.koordinat_lng
+            FROM pintu_air p
+            JOIN lokasi_pintu_air l ON l.nama = p.nama_pintu_air
+            WHERE l.is_active AND l.koordinat_lat IS NOT NULL
+              AND p.id IN (SELECT MAX(id) FROM pintu_air GROUP BY nama_pintu_air)
+            """
+        )
+        out = []
+        for r in cursor.fetchall():
+            severity = _pintu_air_severity(r["status"])
+            if severity:
+                out.append({
+                    "key": f"pintu_air:{r['nama_pintu_air']}",
+                    "kind": "pintu_air",
+                    "name": r["nama_pintu_air"],
+                    "latitude": float(r["koordinat_lat"]),
+                    "longitude": float(r["koordinat_lng"]),
+                    "radius_m": PINTU_AIR_RADIUS_M,
+                    "severity": severity,
+                    "detail": {"status": r["status"], "ketinggian_air": float(r["ketinggian_air"] or 0)},
+                })
+        return out
+    finally:
+        cursor.close()
+
+
+def load_crowd_hazards(conn) -> List[Hazard]:
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT h.location, h.count, l.latitude, l.longitude
+            FROM crowd_history h
+            JOIN locations l ON l.name = h.location
+            WHERE l.is_active AND l.latitude IS NOT NULL
+              AND h.id IN (
+                  SELECT MAX(id) FROM crowd_history
+                  WHERE timestamp >= NOW() - INTERVAL %s MINUTE
+                  GROUP BY location
+              )
+              AND h.count >= %s
+            """,
+            (CROWD_WINDOW_MIN, CROWD_MIN_COUNT),
+        )
+        return [
+            {
+                "key": f"keramaian:{r['location']}",
+                "kind": "keramaian",
+                "name": r["location"],
+                "latitude": float(r["latitude"]),
+                "longitude": float(r["longitude"]),
+                "radius_m": CROWD_RADIUS_M,
+                "severity": 2 if r["count"] > 400 else 1,  # padat / ramai
+                "detail": {"count": int(r["count"])},
+            }
+            for r in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+
+
+HAZARD_SOURCES: List[Tuple[str, Callable[[Any], List[Hazard]]]] = [
+    ("banjir_monitoring", load_flood_hazards),
+    ("banjir_monitoring", load_pintu_air_hazards),
+    ("crowd_monitoring", load_crowd_hazards),
+]
+
+
+def notify_users(hazard: Hazard, user_ids: List[str]) -> List[str]:
+    """One push per chunk of users; returns the users of the chunks the notification service accepted."""
+    titles = {
+        "banjir": f"🌊 Banjir di sekitar {hazard['name']}",
+        "pintu_air": f"⚠️ {hazard['name']}: {hazard['detail'].get('status')}",
+        "keramaian": f"🚨 Keramaian di {hazard['name']}",
+    }
+    body = "Lokasi Anda atau rumah/kantor Anda berada di area terdampak. Hindari area ini bila memungkinkan."
+    data = {"hazard": hazard["key"], "kind": hazard["kind"], "severity": str(hazard["severity"]), "service": "user_mobility"}
+    sent: List[str] = []
+    for i in range(0, len(user_ids), NOTIFY_CHUNK_USERS):
+        chunk = user_ids[i:i + NOTIFY_CHUNK_USERS]
+        payload = json.dumps({"title": titles[hazard["kind"]], "body": body, "data": data, "user_ids": chunk}).encode("utf-8")
+        req = Request(NOTIFY_URL, data=payload, method="POST", headers={"Content-Type": "application/json", "X-API-Key": NOTIFY_API_KEY})
+        try:
+            with urlopen(req, timeout=10) as resp:
+                resp.read()
+            sent.extend(chunk)
+        except Exception as e:
+            print(f"[HAZARD NOTIFY ERROR] {hazard['key']}: {e}")
+    return sent
+
+
+class HazardWatcher:
+    def __init__(
+        self,
+        get_connection: Callable[..., Any],
+        density: DensityIndex,
+        notify: Callable[[Hazard, List[str]], List[str]] = notify_users,
+        interval: float = POLL_INTERVAL_S,
+    ):
+        self._get_connection = get_connection  # get_connection(database=...)
+        self._density = density
+        self._notify = notify
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._hazards: Dict[str, Hazard] = {}
+        self._affected: Dict[str, int] = {}
+        self._alerted: Dict[Tuple[str, str], Tuple[int, float]] = {}  # (user, hazard) -> (severity, ts)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load_hazards(self) -> List[Hazard]:
+        hazards: List[Hazard] = []
+        for database, loader in HAZARD_SOURCES:
+            conn = self._get_connection(database=database)
+            if not conn:
+                continue
+            try:
+                hazards.extend(loader(conn))
+            except Exception as e:
+                print(f"[HAZARD ERROR] {loader.__name__}: {e}")
+            finally:
+                conn.close()
+        return hazards
+
+    def match(self, hazards: List[Hazard]) -> Dict[str, Set[str]]:
+        """Affected user_ids per hazard key: live positions plus home/work favorites."""
+        affected = {h["key"]: set(self._density.users_in_radius(h["latitude"], h["longitude"], h["radius_m"])) for h in hazards}
+        conn = self._get_connection()
+        if conn:
+            try:
+                for key, users in favorites_index.match_circles(conn, hazards).items():
+                    affected[key] |= users
+            except Exception as e:
+                print(f"[HAZARD ERROR] favorites: {e}")
+            finally:
+                conn.close()
+        return affected
+
+    def check(self, hazards: Optional[List[Hazard]] = None) -> Dict[str, Any]:
+        """One cycle: load hazards, match users in bulk, notify the new ones."""
+        hazards = self.load_hazards() if hazards is None else hazards
+        affected = self.match(hazards)
+        now = time.time()
+        to_notify: List[Tuple[Hazard, List[str]]] = []
+        with self._lock:
+            for h in hazards:
+                fresh = []
+                for user in affected[h["key"]]:
+                    prev = self._alerted.get((user, h["key"]))
+                    if prev is None or h["severity"] > prev[0] or now - prev[1] >= ALERT_COOLDOWN_S:
+                        fresh.append(user)
+                if fresh:
+                    to_notify.append((h, sorted(fresh)))
+            self._hazards = {h["key"]: h for h in hazards}
+            self._affected = {k: len(v) for k, v in affected.items()}
+            self._alerted = {k: v for k, v in self._alerted.items() if now - v[1] < ALERT_COOLDOWN_S}
+        notified = 0
+        for h, users in to_notify:
+            # only users the notification service accepted start a cooldown;
+            # the rest are tried again next cycle
+            accepted = self._notify(h, users)
+            with self._lock:
+                for user in accepted:
+                    self._alerted[(user, h["key"])] = (h["severity"], now)
+            notified += len(accepted)
+        if to_notify:
+            print(f"[HAZARD] {notified} user diberi peringatan untuk {len(to_notify)} bahaya")
+        return {"hazards": len(hazards), "notified_users": notified, "notified_hazards": [h["key"] for h, _ in to_notify]}
+
+    def get(self, key: str) -> Optional[Hazard]:
+        """The hazard with this key if it was active in the last cycle."""
+        return self._hazards.get(key)
+
+    def active(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(h, affected_users=self._affected.get(k, 0)) for k, h in self._hazards.items()]
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="hazard-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                print(f"[HAZARD ERROR] {e}")
+            self._stop.wait(self._interval)
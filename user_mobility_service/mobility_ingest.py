@@ -0,0 +1,417 @@
+"""Batched ingestion of mobility points.
+
+``POST /mobility/batch`` takes a JSON array (or ``{"points": [...]}``) or
+NDJSON, optionally gzip-compressed. Points are validated column-wise with
+NumPy; invalid ones are reported by index and the rest are handed to one
+``MobilityWriter``. The writer thread groups whatever batches are waiting
+into multi-row INSERTs on a single long-lived connection and commits them
+together (group commit), then acknowledges each batch: the request can wait
+for that ack or get a ``batch_id`` to poll.
+
+Code that needs to see every stored point (statistics, spatial index)
+registers a listener with ``MobilityWriter.add_listener``. Committed rows are
+handed to a separate listener thread, which calls the listeners in commit
+order (coalescing whatever has piled up), so slow upkeep never delays the
+next group commit.
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from . import mobility_partitions
+except Exception:
+    import mobility_partitions
+
+MAX_BATCH_POINTS: int = 10_000
+MAX_BODY_BYTES: int = 16 * 1024 * 1024  # after decompression
+FLUSH_ROWS: int = 5_000  # write as soon as this many rows are waiting
+FLUSH_INTERVAL_S: float = 0.25  # ...or when the oldest waiting batch is this old
+INSERT_CHUNK_ROWS: int = 1_000  # rows per multi-row INSERT statement
+MAX_PENDING_ROWS: int = 200_000  # beyond this, submit() refuses (HTTP 503)
+MAX_ACKS: int = 10_000  # acknowledgements kept for GET /mobility/batch/{id}
+MAX_LISTENER_ROWS: int = 1_000_000  # committed rows waiting for listeners; beyond this they are dropped
+LISTENER_COALESCE_ROWS: int = 50_000  # rows handed to the listeners per call, at most
+MAX_FUTURE_SKEW = timedelta(minutes=5)
+TIMESTAMP_FLOOR = datetime.fromtimestamp(1)  # MySQL TIMESTAMP starts at 1970-01-01 00:00:01 UTC
+
+INSERT_SQL = """
+    INSERT INTO mobility (user_id, latitude, longitude, dest_latitude, dest_longitude, timestamp)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+# (user_id, latitude, longitude, dest_latitude, dest_longitude, timestamp)
+MobilityRow = Tuple[str, float, float, float, float, datetime]
+
+
+class BufferFull(Exception):
+    pass
+
+
+class CommitUncertain(Exception):
+    """COMMIT failed or the connection dropped during it: the rows may be stored."""
+
+
+def decode_body(body: bytes, content_encoding: Optional[str] = None) -> bytes:
+    """Undo gzip (by header or magic bytes), refusing bodies that inflate past the cap."""
+    if (content_encoding or "").lower() == "gzip" or body[:2] == b"\x1f\x8b":
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            out = d.decompress(body, MAX_BODY_BYTES + 1)
+        except zlib.error as e:
+            raise ValueError(f"invalid gzip body: {e}")
+        if len(out) > MAX_BODY_BYTES or d.unconsumed_tail:
+            raise ValueError(f"body larger than {MAX_BODY_BYTES} bytes after decompression")
+        return out
+    if len(body) > MAX_BODY_BYTES:
+        raise ValueError(f"body larger than {MAX_BODY_BYTES} bytes")
+    return body
+
+
+def parse_points(body: bytes, content_type: Optional[str] = None, content_encoding: Optional[str] = None) -> List[Any]:
+    """Points from a JSON array, ``{"points": [...]}`` or NDJSON (one object per line)."""
+    raw = decode_body(body, content_encoding)
+    text = raw.decode("utf-8-sig", errors="strict").strip()
+    if not text:
+        return []
+    ndjson = "ndjson" in (content_type or "").lower() or "jsonl" in (content_type or "").lower()
+    if not ndjson and text[0] in "[{":
+        try:
+            doc = json.loads(text)
+        except json.JSONDecodeError:
+            if text[0] != "{":
+                raise ValueError("invalid JSON body")
+            doc = None  # several objects: NDJSON sent as application/json
+        if isinstance(doc, list):
+            return doc
+        if isinstance(doc, dict):
+            points = doc.get("points")
+            return points if isinstance(points, list) else [doc]
+    points = []
+    for n, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            points.append(json.loads(line))
+        except json.JSONDecodeError:
+            raise ValueError(f"invalid JSON on line {n}")
+    return points
+
+
+def _num(v: Any) -> float:
+    if isinstance(v, bool):
+        return np.nan
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, str):
+        try:
+            return float(v)
+        except ValueError:
+            return np.nan
+    return np.nan
+
+
+def _timestamp(v: Any, now: datetime) -> Optional[datetime]:
+    """Client time as naive local time (like the column default); None if unusable."""
+    if v is None:
+        return now
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        secs = v / 1000.0 if v > 1e11 else float(v)  # epoch ms or s
+        try:
+            return datetime.fromtimestamp(secs)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(v, str):
+        try:
+            ts = datetime.fromisoformat(v.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return ts.astimezone().replace(tzinfo=None) if ts.tzinfo else ts
+    return None
+
+
+def validate_points(points: List[Any]) -> Tuple[List[MobilityRow], List[Dict[str, Any]]]:
+    """Split points into insertable rows and ``{"index", "error"}`` rejections.
+
+    Fields as in ``MobilityData``, plus an optional ``timestamp`` (ISO 8601 or
+    epoch seconds/milliseconds; default: now). Timestamps before the retained
+    window (``mobility_partitions.retention_cutoff``) are rejected: their
+    partition is gone or about to be archived.
+    """
+    now = datetime.now()
+    n = len(points)
+    objs = [p if isinstance(p, dict) else {} for p in points]
+    users = [p.get("user_id") for p in objs]
+    coords = np.array(
+        [[_num(p.get("latitude")), _num(p.get("longitude")), _num(p.get("dest_latitude")), _num(p.get("dest_longitude"))] for p in objs],
+        dtype=np.float64,
+    ).reshape(n, 4)
+    stamps = [_timestamp(p.get("timestamp"), now) for p in objs]
+
+    lat_ok = np.all(np.abs(coords[:, [0, 2]]) <= 90, axis=1)  # NaN compares False
+    lon_ok = np.all(np.abs(coords[:, [1, 3]]) <= 180, axis=1)
+    user_ok = np.fromiter((isinstance(u, str) and 0 < len(u) <= 100 for u in users), dtype=bool, count=n)
+    latest = now + MAX_FUTURE_SKEW
+    oldest = max(TIMESTAMP_FLOOR, mobility_partitions.retention_cutoff(now.date()))
+    ts_ok = np.fromiter((t is not None and oldest <= t <= latest for t in stamps), dtype=bool, count=n)
+    ok = lat_ok & lon_ok & user_ok & ts_ok
+
+    rows: List[MobilityRow] = []
+    for i in np.flatnonzero(ok):
+        c = coords[i]
+        rows.append((users[i], float(c[0]), float(c[1]), float(c[2]), float(c[3]), stamps[i]))
+    rejected: List[Dict[str, Any]] = []
+    for i in np.flatnonzero(~ok):
+        if not isinstance(points[i], dict):
+            err = "not an object"
+        elif not user_ok[i]:
+            err = "user_id must be a non-empty string of at most 100 characters"
+        elif not lat_ok[i]:
+            err = "latitude/dest_latitude missing or outside [-90, 90]"
+        elif not lon_ok[i]:
+            err = "longitude/dest_longitude missing or outside [-180, 180]"
+        else:
+            err = "timestamp unreadable, in the future or older than the retained window"
+        rejected.append({"index": int(i), "error": err})
+    return rows, rejected
+
+
+class _Batch:
+    __slots__ = ("batch_id", "rows", "future", "queued_at")
+
+    def __init__(self, rows: List[MobilityRow]):
+        self.batch_id = uuid.uuid4().hex
+        self.rows = rows
+        self.future: Future = Future()
+        self.queued_at = time.monotonic()
+
+
+class MobilityWriter:
+    """Single writer thread doing group-committed multi-row INSERTs."""
+
+    def __init__(self, get_connection: Callable[[], Any], flush_rows: int = FLUSH_ROWS, flush_interval: float = FLUSH_INTERVAL_S):
+        self.get_connection = get_connection
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[_Batch]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending_rows = 0
+        self._acks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._listeners: List[Callable[[List[MobilityRow]], None]] = []
+        self._listener_queue: "queue.Queue[Optional[List[MobilityRow]]]" = queue.Queue()
+        self._listener_rows = 0
+        self._listener_dropped = 0
+        self._conn = None
+        self._thread: Optional[threading.Thread] = None
+        self._listener_thread: Optional[threading.Thread] = None
+
+    def add_listener(self, fn: Callable[[List[MobilityRow]], None]) -> None:
+        self._listeners.append(fn)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="mobility-writer", daemon=True)
+                self._thread.start()
+            if self._listener_thread is None or not self._listener_thread.is_alive():
+                self._listener_thread = threading.Thread(target=self._listener_loop, name="mobility-listeners", daemon=True)
+                self._listener_thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush what is queued, let the listeners catch up, then stop the threads."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+        if self._listener_thread is not None:
+            self._listener_queue.put(None)
+            self._listener_thread.join(timeout)
+            self._listener_thread = None
+
+    def submit(self, rows: List[MobilityRow]) -> Tuple[str, Future]:
+        """Queue rows as one batch; the future resolves to its ack once committed."""
+        self.start()
+        batch = _Batch(rows)
+        with self._lock:
+            if self._pending_rows + len(rows) > MAX_PENDING_ROWS:
+                raise BufferFull(f"{self._pending_rows} rows waiting to be written")
+            self._pending_rows += len(rows)
+            self._remember(batch.batch_id, {"batch_id": batch.batch_id, "status": "queued", "rows": len(rows)})
+        self._queue.put(batch)
+        return batch.batch_id, batch.future
+
+    def ack(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            ack = self._acks.get(batch_id)
+            return dict(ack) if ack else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending_rows": self._pending_rows,
+                "queued_batches": self._queue.qsize(),
+                "listener_pending_rows": self._listener_rows,
+                "listener_dropped_rows": self._listener_dropped,
+            }
+
+    def _remember(self, batch_id: str, ack: Dict[str, Any]) -> None:
+        self._acks[batch_id] = ack
+        self._acks.move_to_end(batch_id)
+        while len(self._acks) > MAX_ACKS:
+            self._acks.popitem(last=False)
+
+    def _loop(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batches = [first]
+            rows = len(first.rows)
+            deadline = first.queued_at + self.flush_interval
+            while rows < self.flush_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stopping = True
+                    break
+                batches.append(nxt)
+                rows += len(nxt.rows)
+            self._flush(batches)
+
+    def _connection(self):
+        if self._conn is not None:
+            try:
+                if self._conn.is_connected():
+                    return self._conn
+            except Exception:
+                pass
+            self._close()
+        self._conn = self.get_connection()
+        return self._conn
+
+    def _close(self) -> None:
+        try:
+            if self._conn is not None:
+                self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def _write(self, rows: List[MobilityRow]) -> None:
+        conn = self._connection()
+        if not conn:
+            raise RuntimeError("Database connection failed.")
+        cursor = conn.cursor()
+        try:
+            # mysql-connector turns an INSERT executemany into one multi-row statement
+            for i in range(0, len(rows), INSERT_CHUNK_ROWS):
+                cursor.executemany(INSERT_SQL, rows[i:i + INSERT_CHUNK_ROWS])
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self._close()
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        try:
+            conn.commit()
+        except Exception as e:
+            self._close()
+            raise CommitUncertain(f"commit outcome unknown: {e}") from e
+
+    def _write_retrying(self, rows: List[MobilityRow]) -> Tuple[Optional[str], Optional[str]]:
+        """Write rows; returns ``(status, error)``, ``(None, None)`` once committed.
+
+        Only failures before COMMIT (nothing stored) are retried; a failed
+        COMMIT may have stored the rows, so retrying could insert them twice.
+        """
+        error = None
+        for attempt in range(2):  # one retry on a fresh connection
+            try:
+                self._write(rows)
+                return None, None
+            except CommitUncertain as e:
+                return "unknown", str(e)
+            except Exception as e:
+                error = str(e)
+        return "failed", error
+
+    def _flush(self, batches: List[_Batch]) -> None:
+        rows = [r for b in batches for r in b.rows]
+        started = time.perf_counter()
+        outcome = self._write_retrying(rows)
+        outcomes: Dict[str, Tuple[Optional[str], Optional[str]]] = {b.batch_id: outcome for b in batches}
+        if outcome[0] == "failed" and len(batches) > 1:
+            # nothing was stored; one bad batch must not fail the others it was grouped with
+            for b in batches:
+                outcomes[b.batch_id] = self._write_retrying(b.rows)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        committed: List[MobilityRow] = []
+        with self._lock:
+            self._pending_rows -= len(rows)
+            for b in batches:
+                status, err = outcomes[b.batch_id]
+                ack = {"batch_id": b.batch_id, "rows": len(b.rows), "flushed_with": len(batches), "write_ms": elapsed_ms}
+                ack.update({"status": status, "error": err} if status else {"status": "committed"})
+                self._remember(b.batch_id, ack)
+                b.future.set_result(dict(ack))
+                if not err:
+                    committed.extend(b.rows)
+        failed = [b for b in batches if outcomes[b.batch_id][0]]
+        if failed:
+            print(f"[MOBILITY INGEST ERROR] {sum(len(b.rows) for b in failed)} rows in {len(failed)} of {len(batches)} batches: {outcomes[failed[0].batch_id][1]}")
+        if committed and self._listeners:
+            self._notify(committed)
+
+    def _notify(self, rows: List[MobilityRow]) -> None:
+        with self._lock:
+            if self._listener_rows + len(rows) > MAX_LISTENER_ROWS:
+                # never block the writer; stats can be repaired with `python mobility_stats.py rebuild`
+                self._listener_dropped += len(rows)
+                print(f"[MOBILITY INGEST ERROR] listeners behind; {len(rows)} committed rows not passed on")
+                return
+            self._listener_rows += len(rows)
+        self._listener_queue.put(rows)
+
+    def _listener_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._listener_queue.get()
+            if first is None:
+                break
+            rows = list(first)
+            while len(rows) < LISTENER_COALESCE_ROWS:
+                try:
+                    nxt = self._listener_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stopping = True
+                    break
+                rows.extend(nxt)
+            for fn in self._listeners:
+                try:
+                    fn(rows)
+                except Exception as e:
+                    print(f"[MOBILITY INGEST ERROR] listener {getattr(fn, '__name__', fn)}: {e}")
+            with self._lock:
+                self._listener_rows -= len(rows)
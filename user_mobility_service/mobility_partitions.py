@@ -0,0 +1,295 @@
+"""Monthly partitions of ``mobility``, plus archival of the old ones.
+
+``mobility`` is RANGE-partitioned on ``UNIX_TIMESTAMP(timestamp)`` with one
+partition per month (``pYYYYMM``) and a catch-all ``pmax``. Queries with a
+time window only open the partitions the window touches, and removing a
+month is a metadata-only ``DROP PARTITION`` instead of a huge DELETE.
+
+``maintain()`` runs daily from the service (and by hand via
+``python mobility_partitions.py maintain``):
+
+1. splits ``pmax`` so partitions exist ``MONTHS_AHEAD`` months ahead;
+2. for every partition entirely older than ``RETENTION_MONTHS``, streams its
+   rows into ``ARCHIVE_DIR/mobility_<partition>.parquet`` (zstd; gzip CSV when
+   pyarrow is not installed), checks the row count, writes a JSON manifest
+   next to it, and only then drops the partition.
+
+Nothing may be written into a partition while it is archived: batch
+ingestion rejects points older than ``retention_cutoff()``, and a partition
+is only archived ``ARCHIVE_GRACE_DAYS`` after it fell out of that window, so
+writes validated just before the month turned have long been committed. The
+row count is checked once more right before the drop.
+
+``mobility_stats`` is aggregated per day and is kept, so history charts
+survive the raw points being archived; ``retained_since`` tells
+``mobility_stats.rebuild`` where the raw points now start, so a rebuild
+leaves the archived days alone.
+"""
+import csv
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover
+    pa = None
+    pq = None
+
+RETENTION_MONTHS: int = int(os.environ.get("MOBILITY_RETENTION_MONTHS", "12"))
+MONTHS_AHEAD: int = 3
+ARCHIVE_DIR: Path = Path(os.environ.get("MOBILITY_ARCHIVE_DIR", "archive"))
+ARCHIVE_FORMAT: str = os.environ.get("MOBILITY_ARCHIVE_FORMAT", "parquet" if pa is not None else "csv")
+ARCHIVE_CHUNK_ROWS: int = 50_000
+MAINTENANCE_INTERVAL_S: float = 24 * 3600
+ARCHIVE_GRACE_DAYS: int = 1  # a partition is archived this long after ingestion stopped accepting it
+
+COLUMNS = ["id", "user_id", "latitude", "longitude", "dest_latitude", "dest_longitude", "timestamp", "created_at"]
+
+
+def _add_months(d: date, months: int) -> date:
+    m = d.year * 12 + (d.month - 1) + months
+    return date(m // 12, m % 12 + 1, 1)
+
+
+def retention_cutoff(today: Optional[date] = None, keep_months: int = RETENTION_MONTHS) -> datetime:
+    """Start of the oldest month kept in ``mobility``; partitions ending by then expire."""
+    today = today or date.today()
+    return datetime.combine(_add_months(today.replace(day=1), -keep_months), datetime.min.time())
+
+
+def list_partitions(conn) -> List[Dict[str, Any]]:
+    """``[{"name", "upper"}]`` in order; ``upper`` is the exclusive bound (None for MAXVALUE)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+            FROM INFORMATION_SCHEMA.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'mobility' AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            """
+        )
+        out = []
+        for name, desc, rows in cursor.fetchall():
+            upper = None if str(desc).upper() == "MAXVALUE" else datetime.fromtimestamp(int(desc))
+            out.append({"name": name, "upper": upper, "approx_rows": rows})
+        return out
+    finally:
+        cursor.close()
+
+
+def retained_since(conn) -> Optional[datetime]:
+    """Start of the oldest raw point still in ``mobility``, or None if nothing was dropped.
+
+    The first partition is ``p_old`` (everything before the first month) until
+    archival drops it; from then on the first ``pYYYYMM`` partition marks
+    where the remaining points begin.
+    """
+    parts = list_partitions(conn)
+    if not parts:
+        return None
+    name = parts[0]["name"]
+    if len(name) == 7 and name[0] == "p" and name[1:].isdigit():
+        return datetime(int(name[1:5]), int(name[5:7]), 1)
+    return None
+
+
+def ensure_partitions(conn, months_ahead: int = MONTHS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """Split ``pmax`` into monthly partitions up to ``months_ahead`` months out."""
+    parts = list_partitions(conn)
+    if not parts:
+        print("[PARTITIONS] mobility is not partitioned; see setup_mobility_db.sql")
+        return []
+    if parts[-1]["upper"] is not None:
+        print("[PARTITIONS] mobility has no MAXVALUE partition; not adding months")
+        return []
+    bounded = [p["upper"].date() for p in parts if p["upper"] is not None]
+    month = max(bounded) if bounded else (today or date.today()).replace(day=1)
+    target = _add_months((today or date.today()).replace(day=1), months_ahead + 1)
+    new_parts = []
+    while month < target:
+        nxt = _add_months(month, 1)
+        new_parts.append((f"p{month:%Y%m}", nxt))
+        month = nxt
+    if not new_parts:
+        return []
+    defs = ", ".join(f"PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP('{upper:%Y-%m-%d} 00:00:00'))" for name, upper in new_parts)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"ALTER TABLE mobility REORGANIZE PARTITION {parts[-1]['name']} INTO ({defs}, PARTITION {parts[-1]['name']} VALUES LESS THAN MAXVALUE)")
+    finally:
+        cursor.close()
+    names = [n for n, _ in new_parts]
+    print(f"[PARTITIONS] added {', '.join(names)}")
+    return names
+
+
+def _write_parquet(rows_iter, path: Path) -> int:
+    schema = pa.schema([
+        ("id", pa.int64()), ("user_id", pa.string()),
+        ("latitude", pa.float64()), ("longitude", pa.float64()),
+        ("dest_latitude", pa.float64()), ("dest_longitude", pa.float64()),
+        ("timestamp", pa.timestamp("s")), ("created_at", pa.timestamp("s")),
+    ])
+    n = 0
+    with pq.ParquetWriter(str(path), schema, compression="zstd") as writer:
+        for chunk in rows_iter:
+            cols = list(zip(*chunk))
+            arrays = [
+                pa.array(cols[0], pa.int64()), pa.array(cols[1], pa.string()),
+                *(pa.array([float(v) for v in cols[k]], pa.float64()) for k in (2, 3, 4, 5)),
+                pa.array(cols[6], pa.timestamp("s")), pa.array(cols[7], pa.timestamp("s")),
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            n += len(chunk)
+    return n
+
+
+def _write_csv(rows_iter, path: Path) -> int:
+    n = 0
+    with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(COLUMNS)
+        for chunk in rows_iter:
+            w.writerows(chunk)
+            n += len(chunk)
+    return n
+
+
+def archive_partition(conn, name: str, archive_dir: Path = ARCHIVE_DIR, fmt: str = ARCHIVE_FORMAT) -> Dict[str, Any]:
+    """Stream one partition to a compressed file; returns the manifest written next to it."""
+    if fmt == "parquet" and pa is None:
+        fmt = "csv"
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    final = archive_dir / (f"mobility_{name}.parquet" if fmt == "parquet" else f"mobility_{name}.csv.gz")
+    tmp = final.with_name(final.name + ".part")
+
+    count_cur = conn.cursor()
+    try:
+        count_cur.execute(f"SELECT COUNT(*) FROM mobility PARTITION ({name})")
+        expected = int(count_cur.fetchone()[0])
+    finally:
+        count_cur.close()
+
+    cursor = conn.cursor()  # unbuffered: rows stream in chunks
+    try:
+        cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM mobility PARTITION ({name}) ORDER BY id")
+
+        def chunks():
+            while True:
+                chunk = cursor.fetchmany(ARCHIVE_CHUNK_ROWS)
+                if not chunk:
+                    return
+                yield chunk
+
+        written = _write_parquet(chunks(), tmp) if fmt == "parquet" else _write_csv(chunks(), tmp)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        cursor.close()
+    if written != expected:
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"partition {name}: archived {written} rows, expected {expected}")
+
+    digest = hashlib.sha256()
+    with open(tmp, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    os.replace(tmp, final)
+    manifest = {
+        "table": "mobility",
+        "partition": name,
+        "file": final.name,
+        "format": fmt,
+        "rows": written,
+        "sha256": digest.hexdigest(),
+        "archived_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    final.with_name(final.name + ".json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def maintain(conn, keep_months: int = RETENTION_MONTHS, dry_run: bool = False, today: Optional[date] = None) -> Dict[str, Any]:
+    """Add future partitions, archive and drop expired ones."""
+    if keep_months < RETENTION_MONTHS:
+        # ingestion still accepts points for those months
+        raise ValueError(f"keep_months {keep_months} < MOBILITY_RETENTION_MONTHS {RETENTION_MONTHS}; lower the setting for the service instead")
+    today = today or date.today()
+    report: Dict[str, Any] = {"added": [], "archived": [], "expired": []}
+    if not dry_run:
+        report["added"] = ensure_partitions(conn, today=today)
+    cutoff = retention_cutoff(today - timedelta(days=ARCHIVE_GRACE_DAYS), keep_months)
+    expired = [p["name"] for p in list_partitions(conn) if p["upper"] is not None and p["upper"] <= cutoff]
+    report["expired"] = expired
+    if dry_run:
+        return report
+    for name in expired:
+        manifest = archive_partition(conn, name)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT COUNT(*) FROM mobility PARTITION ({name})")
+            now_rows = int(cursor.fetchone()[0])
+            if now_rows != manifest["rows"]:
+                raise RuntimeError(f"partition {name} changed while archiving ({manifest['rows']} -> {now_rows} rows); not dropped")
+            cursor.execute(f"ALTER TABLE mobility DROP PARTITION {name}")
+        finally:
+            cursor.close()
+        print(f"[PARTITIONS] archived {manifest['rows']} rows of {name} to {manifest['file']} and dropped it")
+        report["archived"].append(manifest)
+    return report
+
+
+def start_maintenance(get_connection: Callable[[], Any]) -> threading.Thread:
+    """Run ``maintain`` now and then every ``MAINTENANCE_INTERVAL_S`` in a daemon thread."""
+    def loop():
+        while True:
+            conn = get_connection()
+            if conn:
+                try:
+                    maintain(conn)
+                except Exception as e:
+                    print(f"[PARTITIONS ERROR] {e}")
+                finally:
+                    conn.close()
+            time.sleep(MAINTENANCE_INTERVAL_S)
+
+    t = threading.Thread(target=loop, name="mobility-partitions", daemon=True)
+    t.start()
+    return t
+
+
+def _main() -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description="Maintain monthly partitions of the mobility table")
+    parser.add_argument("command", choices=["maintain", "list"])
+    parser.add_argument("--keep-months", type=int, default=RETENTION_MONTHS)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be archived")
+    args = parser.parse_args()
+    try:
+        from .app import get_connection
+    except Exception:
+        from app import get_connection
+    conn = get_connection()
+    if not conn:
+        raise SystemExit("Database connection failed.")
+    try:
+        if args.command == "list":
+            for p in list_partitions(conn):
+                print(f"{p['name']:>10}  < {p['upper'] or 'MAXVALUE'}  ~{p['approx_rows']} rows")
+        else:
+            print(json.dumps(maintain(conn, args.keep_months, args.dry_run), indent=2, default=str))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,316 @@
+"""Trip segmentation and incrementally maintained ``mobility_stats``.
+
+Each user's points, in time order, are cut into trips. A new trip starts on
+the first point seen, after a gap longer than ``TRIP_GAP_S``, at midnight
+(a trip never spans two ``date`` rows), or when the reported destination
+moves by more than ``DEST_CHANGE_M``. A trip's distance is the haversine
+path length over its points and its duration the time from its first to its
+last point. Steps implying more than ``MAX_SPEED_MPS`` are GPS jumps and add
+no distance.
+
+``TripStats.on_rows`` is a ``MobilityWriter`` listener: for every committed
+flush it continues each user's open trip from the last point it saw, turns
+the new points into per-(user, day) deltas in a few NumPy passes, and adds
+them to ``mobility_stats`` with one upsert. Points older than the last one
+seen for that user are handled by recomputing that user-day from
+``mobility``. ``python mobility_stats.py rebuild`` recomputes everything
+(or one ``--user``) from the raw table, leaving days whose raw points have
+been archived (see ``mobility_partitions``) as they are.
+
+Units: ``total_distance`` in km (derived from the metre-precision
+``total_distance_m`` that increments accumulate in, so short steps are not
+rounded away), ``total_duration`` in seconds, ``avg_trip_duration`` in
+minutes.
+"""
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from . import mobility_partitions
+except Exception:
+    import mobility_partitions
+
+TRIP_GAP_S: float = 15 * 60
+DEST_CHANGE_M: float = 300.0
+MAX_SPEED_MPS: float = 70.0  # ~250 km/h
+EARTH_RADIUS_M: float = 6_371_000.0
+STATE_MAX_USERS: int = 200_000
+
+UPSERT_ADD_SQL = """
+    INSERT INTO mobility_stats (user_id, date, total_trips, total_distance_m, total_distance, total_duration, avg_trip_duration)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        total_trips = total_trips + VALUES(total_trips),
+        total_distance_m = total_distance_m + VALUES(total_distance_m),
+        total_distance = total_distance_m / 1000,
+        total_duration = total_duration + VALUES(total_duration),
+        avg_trip_duration = total_duration / NULLIF(total_trips, 0) / 60
+"""
+UPSERT_SET_SQL = """
+    INSERT INTO mobility_stats (user_id, date, total_trips, total_distance_m, total_distance, total_duration, avg_trip_duration)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        total_trips = VALUES(total_trips),
+        total_distance_m = VALUES(total_distance_m),
+        total_distance = VALUES(total_distance),
+        total_duration = VALUES(total_duration),
+        avg_trip_duration = VALUES(avg_trip_duration)
+"""
+
+# last point per user: (epoch seconds, lat, lon, dest_lat, dest_lon)
+LastPoint = Tuple[float, float, float, float, float]
+# per (user_id, date): [trips, distance_m, duration_s]
+Deltas = Dict[Tuple[str, date], List[float]]
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; works elementwise on arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def segment(
+    rows: Sequence[Tuple[str, float, float, float, float, datetime]],
+    state: Optional[Dict[str, LastPoint]] = None,
+) -> Tuple[Deltas, Dict[str, LastPoint], List[Tuple[str, date]]]:
+    """Trip deltas for ``rows`` continuing from ``state``.
+
+    Returns ``(deltas, last_points, late)``: per-(user, day) trip/distance/
+    duration increments, each user's newest point, and the user-days that
+    received points older than ``state`` (those points are not counted here).
+    """
+    state = state or {}
+    n = len(rows)
+    if not n:
+        return {}, {}, []
+    users = np.array([r[0] for r in rows], dtype=object)
+    data = np.array([(r[1], r[2], r[3], r[4], r[5].timestamp()) for r in rows], dtype=np.float64)
+    days = np.array([r[5].date().toordinal() for r in rows], dtype=np.int64)
+    codes_of, codes = np.unique(users, return_inverse=True)
+    order = np.lexsort((data[:, 4], codes))
+    codes, data, days = codes[order], data[order], days[order]
+    lat, lon, dlat, dlon, ts = data.T
+
+    # previous point of each row: the row before it, or the user's state
+    first = np.ones(n, dtype=bool)
+    first[1:] = codes[1:] != codes[:-1]
+    prev = np.full((n, 5), np.nan)
+    prev[1:] = data[:-1][:, [4, 0, 1, 2, 3]]
+    prev[first] = np.nan
+    prev_day = np.r_[-1, days[:-1]]
+    late = np.zeros(n, dtype=bool)
+    for i in np.flatnonzero(first):
+        last = state.get(codes_of[codes[i]])
+        if last is None:
+            continue
+        # this user's rows older than the known last point are late; the
+        # first on-time row continues from the known point
+        j = i
+        while j < n and codes[j] == codes[i] and ts[j] < last[0]:
+            late[j] = True
+            j += 1
+        if j < n and codes[j] == codes[i]:
+            prev[j] = last
+            prev_day[j] = date.fromtimestamp(last[0]).toordinal()
+    p_ts, p_lat, p_lon, p_dlat, p_dlon = prev.T
+    prev_day[first & ~np.isfinite(p_ts)] = -1
+
+    with np.errstate(invalid="ignore"):
+        dt = ts - p_ts
+        step = haversine_m(p_lat, p_lon, lat, lon)
+        dest_moved = haversine_m(p_dlat, p_dlon, dlat, dlon) > DEST_CHANGE_M
+        new_trip = ~np.isfinite(p_ts) | (dt > TRIP_GAP_S) | (prev_day != days) | dest_moved
+        jump = step > MAX_SPEED_MPS * np.maximum(dt, 1.0)
+    step = np.where(new_trip | jump | ~np.isfinite(step), 0.0, step)
+    dt = np.where(new_trip | ~np.isfinite(dt), 0.0, dt)
+
+    # sum per (user, day)
+    keep = np.flatnonzero(~late)
+    deltas: Deltas = {}
+    if len(keep):
+        day0 = int(days.min())
+        group_keys, group = np.unique(codes[keep].astype(np.int64) * 1_000_000 + (days[keep] - day0), return_inverse=True)
+        trips = np.bincount(group, weights=new_trip[keep].astype(np.float64))
+        dist = np.bincount(group, weights=step[keep])
+        dur = np.bincount(group, weights=dt[keep])
+        for g, k in enumerate(group_keys):
+            user = codes_of[int(k // 1_000_000)]
+            deltas[(user, date.fromordinal(int(k % 1_000_000) + day0))] = [int(trips[g]), float(dist[g]), float(dur[g])]
+
+    last_points: Dict[str, LastPoint] = {}
+    last_idx = np.flatnonzero(np.r_[codes[1:] != codes[:-1], True])
+    for i in last_idx:
+        user = codes_of[codes[i]]
+        if late[i]:
+            continue  # every row of this user was late; state stays
+        last_points[user] = (float(ts[i]), float(lat[i]), float(lon[i]), float(dlat[i]), float(dlon[i]))
+    late_days = sorted({(codes_of[codes[i]], date.fromordinal(int(days[i]))) for i in np.flatnonzero(late)})
+    return deltas, last_points, late_days
+
+
+def _stats_params(deltas: Deltas) -> List[Tuple]:
+    return [
+        (user, day, int(trips), round(dist_m, 1), round(dist_m / 1000.0, 2), round(dur_s, 1), round(dur_s / trips / 60.0, 2) if trips else 0)
+        for (user, day), (trips, dist_m, dur_s) in sorted(deltas.items())
+    ]
+
+
+def _known_users(cursor, users: Iterable[str]) -> set:
+    """mobility_stats.user_id references users; points of unknown users are not counted."""
+    users = list(set(users))
+    found = set()
+    for i in range(0, len(users), 500):
+        chunk = users[i:i + 500]
+        cursor.execute(f"SELECT user_id FROM users WHERE user_id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        found.update(r[0] for r in cursor.fetchall())
+    return found
+
+
+def _fetch_points(cursor, user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Tuple]:
+    sql = "SELECT user_id, latitude, longitude, dest_latitude, dest_longitude, timestamp FROM mobility WHERE user_id = %s"
+    params: List[Any] = [user_id]
+    if start is not None:
+        sql += " AND timestamp >= %s"
+        params.append(start)
+    if end is not None:
+        sql += " AND timestamp < %s"
+        params.append(end)
+    cursor.execute(sql + " ORDER BY timestamp", params)
+    return [(r[0], float(r[1]), float(r[2]), float(r[3]), float(r[4]), r[5]) for r in cursor.fetchall()]
+
+
+def rebuild(conn, user_id: Optional[str] = None, day: Optional[date] = None) -> int:
+    """Recompute ``mobility_stats`` from ``mobility`` (all users, one user, or one user-day).
+
+    Days before ``mobility_partitions.retained_since`` have no raw points
+    left; their rows are kept. Returns the number of user-day rows written.
+    """
+    since = mobility_partitions.retained_since(conn)
+    if day is not None and since is not None and day < since.date():
+        return 0
+    cursor = conn.cursor()
+    try:
+        if user_id is None:
+            cursor.execute("SELECT user_id FROM users")
+        else:
+            cursor.execute("SELECT user_id FROM users WHERE user_id = %s", (user_id,))
+        users = [r[0] for r in cursor.fetchall()]
+        written = 0
+        for uid in users:
+            if day is not None:
+                start = datetime.combine(day, datetime.min.time())
+                points = _fetch_points(cursor, uid, start, start + timedelta(days=1))
+                sql_scope = ("DELETE FROM mobility_stats WHERE user_id = %s AND date = %s", (uid, day))
+            elif since is not None:
+                points = _fetch_points(cursor, uid, since)
+                sql_scope = ("DELETE FROM mobility_stats WHERE user_id = %s AND date >= %s", (uid, since.date()))
+            else:
+                points = _fetch_points(cursor, uid)
+                sql_scope = ("DELETE FROM mobility_stats WHERE user_id = %s", (uid,))
+            deltas, _, _ = segment(points)
+            cursor.execute(*sql_scope)
+            params = _stats_params(deltas)
+            if params:
+                cursor.executemany(UPSERT_SET_SQL, params)
+            conn.commit()
+            written += len(params)
+        return written
+    finally:
+        cursor.close()
+
+
+class TripStats:
+    """``MobilityWriter`` listener keeping ``mobility_stats`` current."""
+
+    def __init__(self, get_connection: Callable[[], Any]):
+        self.get_connection = get_connection
+        self._lock = threading.Lock()
+        self._last: Dict[str, LastPoint] = {}
+
+    def _load_state(self, cursor, users: List[str], before: datetime) -> None:
+        """After a restart: each user's newest stored point before this flush."""
+        for i in range(0, len(users), 500):
+            chunk = users[i:i + 500]
+            cursor.execute(
+                f"""
+                SELECT m.user_id, m.latitude, m.longitude, m.dest_latitude, m.dest_longitude, m.timestamp
+                FROM mobility m
+                JOIN (
+                    SELECT user_id, MAX(timestamp) AS ts FROM mobility
+                    WHERE user_id IN ({', '.join(['%s'] * len(chunk))}) AND timestamp < %s
+                    GROUP BY user_id
+                ) x ON x.user_id = m.user_id AND x.ts = m.timestamp
+                """,
+                [*chunk, before],
+            )
+            for uid, la, lo, dla, dlo, ts in cursor.fetchall():
+                self._last[uid] = (ts.timestamp(), float(la), float(lo), float(dla), float(dlo))
+
+    def on_rows(self, rows: List[Tuple]) -> None:
+        conn = self.get_connection()
+        if not conn:
+            print("[MOBILITY STATS ERROR] Database connection failed; run `python mobility_stats.py rebuild` later")
+            return
+        cursor = conn.cursor()
+        try:
+            with self._lock:
+                known = _known_users(cursor, (r[0] for r in rows))
+                rows = [r for r in rows if r[0] in known]
+                if not rows:
+                    return
+                missing = sorted({r[0] for r in rows} - self._last.keys())
+                if missing:
+                    self._load_state(cursor, missing, min(r[5] for r in rows))
+                deltas, last_points, late_days = segment(rows, self._last)
+                params = _stats_params(deltas)
+                if params:
+                    cursor.executemany(UPSERT_ADD_SQL, params)
+                conn.commit()
+                self._last.update(last_points)
+                if len(self._last) > STATE_MAX_USERS:
+                    # forget the users idle longest; they reload from the DB
+                    for uid, _ in sorted(self._last.items(), key=lambda kv: kv[1][0])[: len(self._last) - STATE_MAX_USERS]:
+                        del self._last[uid]
+            for uid, day in late_days:
+                rebuild(conn, uid, day)
+        except Exception as e:
+            print(f"[MOBILITY STATS ERROR] {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        finally:
+            cursor.close()
+            conn.close()
+
+
+def _main() -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description="Recompute mobility_stats from the mobility table")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user")
+    parser.add_argument("--date", type=date.fromisoformat, help="only this day (requires --user)")
+    args = parser.parse_args()
+    try:
+        from .app import get_connection
+    except Exception:
+        from app import get_connection
+    conn = get_connection()
+    if not conn:
+        raise SystemExit("Database connection failed.")
+    try:
+        since = mobility_partitions.retained_since(conn)
+        n = rebuild(conn, args.user, args.date if args.user else None)
+    finally:
+        conn.close()
+    print(f"[MOBILITY STATS] rebuilt {n} user-day rows")
+    if since is not None:
+        print(f"[MOBILITY STATS] days before {since:%Y-%m-%d} kept as they were (raw points archived)")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,374 @@
+"""Which monitored crowd locations and flood areas lie along a user's trip.
+
+A trip (``latitude/longitude`` -> ``dest_latitude/dest_longitude``) is
+snapped to an origin/destination pair of ``ROUTE_CELL_DEG`` grid cells
+(~550 m). For each pair the corridor between the two cell centres is
+computed once -- the shortest path on a local road graph when
+``ROAD_GRAPH_PATH`` exists (GeoJSON LineStrings, e.g. an OSM export),
+otherwise the straight line -- and every target within ``CORRIDOR_M`` (plus
+the target's own radius and half a cell of slack) is cached for that pair.
+
+Targets are camera locations (``crowd_monitoring.locations``) and kelurahan
+(``banjir_monitoring.kelurahan``); they change rarely, so the cache is only
+dropped when the target set does. Whether a cached target is dangerous
+*now* is a dict lookup in the ``HazardWatcher``, so a route check is O(1)
+after the first trip between two cells. New pairs seen in ingested trips are
+precomputed by a background worker.
+"""
+import heapq
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .density_index import haversine_m
+except Exception:
+    from density_index import haversine_m
+
+ROUTE_CELL_DEG: float = 0.005
+CORRIDOR_M: float = 300.0
+CACHE_MAX_PAIRS: int = 100_000
+USER_TRIPS_MAX: int = 200_000  # latest trip kept per user, least recently moving dropped first
+TARGET_REFRESH_S: float = 600.0
+ROAD_GRAPH_PATH: str = os.environ.get("ROAD_GRAPH_PATH", "road_graph.geojson")
+MAX_SNAP_M: float = 2000.0  # origin/destination farther than this from any road: straight line
+GRAPH_CELL_DEG: float = 0.005
+M_PER_DEG_LAT: float = 110_540.0
+M_PER_DEG_LON: float = 111_320.0
+CELL_SLACK_M: float = ROUTE_CELL_DEG * M_PER_DEG_LON * math.sqrt(2) / 2
+
+Cell = Tuple[int, int]
+Pair = Tuple[Cell, Cell]
+Point = Tuple[float, float]
+
+
+def cell_of(lat: float, lon: float) -> Cell:
+    return int(math.floor(lat / ROUTE_CELL_DEG)), int(math.floor(lon / ROUTE_CELL_DEG))
+
+
+def cell_center(cell: Cell) -> Point:
+    return (cell[0] + 0.5) * ROUTE_CELL_DEG, (cell[1] + 0.5) * ROUTE_CELL_DEG
+
+
+def od_pair(lat: float, lon: float, dest_lat: float, dest_lon: float) -> Pair:
+    return cell_of(lat, lon), cell_of(dest_lat, dest_lon)
+
+
+def distance_to_path_m(lat: np.ndarray, lon: np.ndarray, path: List[Point]) -> np.ndarray:
+    """Distance from each point to the polyline ``path`` (local equirectangular metres)."""
+    ref = math.cos(math.radians(path[0][0]))
+    px = np.array([p[1] for p in path]) * M_PER_DEG_LON * ref
+    py = np.array([p[0] for p in path]) * M_PER_DEG_LAT
+    x = (lon * M_PER_DEG_LON * ref)[:, None]
+    y = (lat * M_PER_DEG_LAT)[:, None]
+    if len(path) == 1:
+        return np.hypot(x[:, 0] - px[0], y[:, 0] - py[0])
+    ax, ay, bx, by = px[:-1], py[:-1], px[1:], py[1:]
+    dx, dy = bx - ax, by - ay
+    seg_len2 = np.where(dx * dx + dy * dy > 0, dx * dx + dy * dy, 1.0)
+    t = np.clip(((x - ax) * dx + (y - ay) * dy) / seg_len2, 0.0, 1.0)
+    return np.hypot(x - (ax + t * dx), y - (ay + t * dy)).min(axis=1)
+
+
+class RoadGraph:
+    """Undirected road graph with A* shortest paths (edge weight = metres)."""
+
+    def __init__(self):
+        self.coords: List[Point] = []
+        self.adj: List[List[Tuple[int, float]]] = []
+        self._ids: Dict[Point, int] = {}
+        self._buckets: Dict[Cell, List[int]] = {}
+
+    def _node(self, lat: float, lon: float) -> int:
+        key = (round(lat, 6), round(lon, 6))
+        node = self._ids.get(key)
+        if node is None:
+            node = self._ids[key] = len(self.coords)
+            self.coords.append(key)
+            self.adj.append([])
+            bucket = (int(math.floor(key[0] / GRAPH_CELL_DEG)), int(math.floor(key[1] / GRAPH_CELL_DEG)))
+            self._buckets.setdefault(bucket, []).append(node)
+        return node
+
+    def add_line(self, coordinates: List[List[float]]) -> None:
+        """GeoJSON ``[lon, lat]`` positions; consecutive ones become edges."""
+        prev = None
+        for lon, lat, *_ in coordinates:
+            node = self._node(lat, lon)
+            if prev is not None and prev != node:
+                (la, lo), (lb, lob) = self.coords[prev], self.coords[node]
+                w = float(haversine_m(la, lo, np.array([lb]), np.array([lob]))[0])
+                self.adj[prev].append((node, w))
+                self.adj[node].append((prev, w))
+            prev = node
+
+    @classmethod
+    def from_geojson(cls, path: str) -> "RoadGraph":
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        graph = cls()
+        features = doc.get("features", [doc]) if isinstance(doc, dict) else []
+        for feat in features:
+            geom = feat.get("geometry") or {}
+            if geom.get("type") == "LineString":
+                graph.add_line(geom["coordinates"])
+            elif geom.get("type") == "MultiLineString":
+                for line in geom["coordinates"]:
+                    graph.add_line(line)
+        return graph
+
+    def nearest(self, lat: float, lon: float, max_m: float = MAX_SNAP_M) -> Optional[int]:
+        ci, cj = int(math.floor(lat / GRAPH_CELL_DEG)), int(math.floor(lon / GRAPH_CELL_DEG))
+        rings = int(max_m / (GRAPH_CELL_DEG * M_PER_DEG_LAT)) + 1
+        best, best_d = None, max_m
+        for r in range(rings + 1):
+            cand = [
+                n
+                for i in range(ci - r, ci + r + 1)
+                for j in range(cj - r, cj + r + 1)
+                if max(abs(i - ci), abs(j - cj)) == r
+                for n in self._buckets.get((i, j), ())
+            ]
+            if cand:
+                arr = np.array([self.coords[n] for n in cand])
+                d = haversine_m(lat, lon, arr[:, 0], arr[:, 1])
+                k = int(d.argmin())
+                if d[k] <= best_d:
+                    best, best_d = cand[k], float(d[k])
+            if best is not None and best_d <= r * GRAPH_CELL_DEG * M_PER_DEG_LAT:
+                break  # nothing in farther rings can be closer
+        return best
+
+    def route(self, origin: Point, dest: Point) -> Optional[List[Point]]:
+        src, dst = self.nearest(*origin), self.nearest(*dest)
+        if src is None or dst is None:
+            return None
+        goal_lat, goal_lon = self.coords[dst]
+        cos_goal = math.cos(math.radians(goal_lat))
+
+        def h(n: int) -> float:
+            la, lo = self.coords[n]
+            return math.hypot((la - goal_lat) * M_PER_DEG_LAT, (lo - goal_lon) * M_PER_DEG_LON * cos_goal) * 0.99
+
+        dist = {src: 0.0}
+        came: Dict[int, int] = {}
+        done = set()
+        heap = [(h(src), src)]
+        while heap:
+            _, n = heapq.heappop(heap)
+            if n in done:
+                continue  # stale heap entry
+            done.add(n)
+            if n == dst:
+                path = [n]
+                while n in came:
+                    n = came[n]
+                    path.append(n)
+                return [origin] + [self.coords[k] for k in reversed(path)] + [dest]
+            dn = dist[n]
+            for m, w in self.adj[n]:
+                nd = dn + w
+                if nd < dist.get(m, math.inf):
+                    dist[m] = nd
+                    came[m] = n
+                    heapq.heappush(heap, (nd + h(m), m))
+        return None  # not connected
+
+
+def load_targets(get_connection: Callable[..., Any]) -> List[Dict[str, Any]]:
+    """Camera locations and kelurahan with coordinates, keyed like HazardWatcher hazards."""
+    targets: List[Dict[str, Any]] = []
+    sources = [
+        ("crowd_monitoring", "keramaian", "SELECT name, latitude, longitude, 0 FROM locations WHERE is_active AND latitude IS NOT NULL"),
+        ("banjir_monitoring", "banjir", "SELECT nama, latitude, longitude, radius_m FROM kelurahan"),
+    ]
+    for database, kind, query in sources:
+        conn = get_connection(database=database)
+        if not conn:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query)
+            for name, lat, lon, radius in cursor.fetchall():
+                targets.append({
+                    "key": f"{kind}:{name}", "kind": kind, "name": name,
+                    "latitude": float(lat), "longitude": float(lon), "radius_m": float(radius or 0),
+                })
+        except Exception as e:
+            print(f"[ROUTE ERROR] {database}: {e}")
+        finally:
+            cursor.close()
+            conn.close()
+    return sorted(targets, key=lambda t: t["key"])
+
+
+class RouteExposure:
+    def __init__(self, get_connection: Callable[..., Any], hazards, graph: Optional[RoadGraph] = None):
+        self._get_connection = get_connection
+        self._hazards = hazards  # HazardWatcher: .get(key) -> active hazard or None
+        self.graph = graph
+        self._lock = threading.Lock()
+        self._targets: List[Dict[str, Any]] = []
+        self._t_lat = np.zeros(0)
+        self._t_lon = np.zeros(0)
+        self._t_reach = np.zeros(0)
+        self._cache: "OrderedDict[Pair, Tuple[int, Dict[str, Any]]]" = OrderedDict()  # pair -> (generation, entry)
+        self._generation = 0  # bumped whenever the targets change
+        self._user_trips: "OrderedDict[str, Tuple[Pair, Any]]" = OrderedDict()
+        self._queue: "queue.Queue[Pair]" = queue.Queue(maxsize=10_000)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._targets_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def load_graph(self, path: str = ROAD_GRAPH_PATH) -> None:
+        if os.path.exists(path):
+            t0 = time.perf_counter()
+            self.graph = RoadGraph.from_geojson(path)
+            print(f"[ROUTE] road graph {path}: {len(self.graph.coords)} nodes in {time.perf_counter() - t0:.1f}s")
+
+    def refresh_targets(self) -> bool:
+        """Reload targets; the pair cache is dropped only if they changed."""
+        self._targets_at = time.monotonic()
+        targets = load_targets(self._get_connection)
+        if not targets:
+            return False  # keep the last set while the databases are unreachable
+        with self._lock:
+            if targets == self._targets:
+                return False
+            self._targets = targets
+            self._t_lat = np.array([t["latitude"] for t in targets])
+            self._t_lon = np.array([t["longitude"] for t in targets])
+            self._t_reach = np.array([t["radius_m"] for t in targets]) + CORRIDOR_M + CELL_SLACK_M
+            self._generation += 1
+            self._cache.clear()
+        print(f"[ROUTE] {len(targets)} target lokasi dimuat")
+        return True
+
+    def _compute(self, pair: Pair) -> Tuple[int, Dict[str, Any]]:
+        """The pair's entry and the target generation it was computed against."""
+        origin, dest = cell_center(pair[0]), cell_center(pair[1])
+        path = self.graph.route(origin, dest) if self.graph is not None else None
+        mode = "graph" if path else "straight"
+        path = path or [origin, dest]
+        with self._lock:
+            generation = self._generation
+            targets, t_lat, t_lon, reach = self._targets, self._t_lat, self._t_lon, self._t_reach
+        near = []
+        if targets:
+            dist = distance_to_path_m(t_lat, t_lon, path)
+            for k in np.flatnonzero(dist <= reach):
+                near.append({**targets[k], "distance_m": round(float(dist[k]))})
+        return generation, {"route": mode, "path_points": len(path), "targets": near}
+
+    def for_pair(self, pair: Pair) -> Dict[str, Any]:
+        with self._lock:
+            cached = self._cache.get(pair)
+            if cached is not None and cached[0] == self._generation:
+                self._cache.move_to_end(pair)
+                self.hits += 1
+                return cached[1]
+            if cached is not None:
+                del self._cache[pair]
+            self.misses += 1
+        generation, entry = self._compute(pair)
+        with self._lock:
+            # targets changed while computing: answer, but do not cache a stale entry
+            if generation == self._generation:
+                self._cache[pair] = (generation, entry)
+                while len(self._cache) > CACHE_MAX_PAIRS:
+                    self._cache.popitem(last=False)
+        return entry
+
+    def exposure(self, pair: Pair) -> Dict[str, Any]:
+        """Targets along the pair's corridor, with the hazards active on them now."""
+        entry = self.for_pair(pair)
+        nearby, warnings = [], []
+        for t in entry["targets"]:
+            hazard = self._hazards.get(t["key"])
+            item = {"key": t["key"], "kind": t["kind"], "name": t["name"], "distance_m": t["distance_m"]}
+            if hazard is not None:
+                item["severity"] = hazard["severity"]
+                item["detail"] = hazard["detail"]
+                warnings.append(item)
+            nearby.append(item)
+        return {
+            "origin_cell": list(pair[0]), "dest_cell": list(pair[1]),
+            "route": entry["route"], "nearby": nearby, "warnings": warnings,
+        }
+
+    def for_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            trip = self._user_trips.get(user_id)
+        if trip is None:
+            return None
+        result = self.exposure(trip[0])
+        result["trip_timestamp"] = trip[1]
+        return result
+
+    def on_rows(self, rows: List[Tuple]) -> None:
+        """``MobilityWriter`` listener: remember each user's trip, queue unseen pairs."""
+        for user_id, lat, lon, dest_lat, dest_lon, ts in rows:
+            if dest_lat is None or dest_lon is None:
+                continue
+            pair = od_pair(float(lat), float(lon), float(dest_lat), float(dest_lon))
+            with self._lock:
+                prev = self._user_trips.get(user_id)
+                if prev is None or prev[1] <= ts:
+                    self._user_trips[user_id] = (pair, ts)
+                    self._user_trips.move_to_end(user_id)
+                    while len(self._user_trips) > USER_TRIPS_MAX:
+                        self._user_trips.popitem(last=False)
+                cached = pair in self._cache
+            if not cached:
+                try:
+                    self._queue.put_nowait(pair)
+                except queue.Full:
+                    pass  # computed on first request instead
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cached_pairs": len(self._cache), "targets": len(self._targets),
+                "users_with_trip": len(self._user_trips), "pending": self._queue.qsize(),
+                "road_graph_nodes": len(self.graph.coords) if self.graph is not None else 0,
+                "hits": self.hits, "misses": self.misses,
+            }
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="route-exposure", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        try:
+            self.load_graph()
+        except Exception as e:
+            print(f"[ROUTE ERROR] road graph: {e}")
+        while not self._stop.is_set():
+            if time.monotonic() - self._targets_at >= TARGET_REFRESH_S:
+                try:
+                    self.refresh_targets()
+                except Exception as e:
+                    print(f"[ROUTE ERROR] {e}")
+            try:
+                pair = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                self.for_pair(pair)
+            except Exception as e:
+                print(f"[ROUTE ERROR] {e}")
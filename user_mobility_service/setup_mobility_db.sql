@@ -6,17 +6,47 @@ CREATE DATABASE IF NOT EXISTS user_mobility;
 USE user_mobility;
 
 -- Buat tabel untuk data mobilitas user
+-- Dipartisi per bulan (pYYYYMM) pada timestamp; service menambah partisi bulan
+-- berikutnya dan mengarsip + men-drop partisi lama (mobility_partitions.py).
+-- Kolom partisi wajib ada di setiap unique key, jadi PRIMARY KEY (id, timestamp).
 CREATE TABLE IF NOT EXISTS mobility (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id BIGINT AUTO_INCREMENT,
     user_id VARCHAR(100) NOT NULL,
     latitude DECIMAL(10, 8) NOT NULL,
     longitude DECIMAL(11, 8) NOT NULL,
     dest_latitude DECIMAL(10, 8) NOT NULL,
     dest_longitude DECIMAL(11, 8) NOT NULL,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION p_old VALUES LESS THAN (UNIX_TIMESTAMP('2026-01-01 00:00:00')),
+    PARTITION p202601 VALUES LESS THAN (UNIX_TIMESTAMP('2026-02-01 00:00:00')),
+    PARTITION p202602 VALUES LESS THAN (UNIX_TIMESTAMP('2026-03-01 00:00:00')),
+    PARTITION p202603 VALUES LESS THAN (UNIX_TIMESTAMP('2026-04-01 00:00:00')),
+    PARTITION p202604 VALUES LESS THAN (UNIX_TIMESTAMP('2026-05-01 00:00:00')),
+    PARTITION p202605 VALUES LESS THAN (UNIX_TIMESTAMP('2026-06-01 00:00:00')),
+    PARTITION p202606 VALUES LESS THAN (UNIX_TIMESTAMP('2026-07-01 00:00:00')),
+    PARTITION p202607 VALUES LESS THAN (UNIX_TIMESTAMP('2026-08-01 00:00:00')),
+    PARTITION p202608 VALUES LESS THAN (UNIX_TIMESTAMP('2026-09-01 00:00:00')),
+    PARTITION p202609 VALUES LESS THAN (UNIX_TIMESTAMP('2026-10-01 00:00:00')),
+    PARTITION p202610 VALUES LESS THAN (UNIX_TIMESTAMP('2026-11-01 00:00:00')),
+    PARTITION p202611 VALUES LESS THAN (UNIX_TIMESTAMP('2026-12-01 00:00:00')),
+    PARTITION p202612 VALUES LESS THAN (UNIX_TIMESTAMP('2027-01-01 00:00:00')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
 );
 
+-- Upgrade database lama (tabel mobility belum dipartisi; menyalin ulang tabel):
+-- ALTER TABLE mobility MODIFY id BIGINT NOT NULL AUTO_INCREMENT,
+--   MODIFY timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+--   DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp);
+-- ALTER TABLE mobility PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+--     PARTITION p_old VALUES LESS THAN (UNIX_TIMESTAMP('2026-01-01 00:00:00')),
+--     PARTITION pmax VALUES LESS THAN MAXVALUE
+-- );
+-- lalu: python mobility_partitions.py maintain
+
 -- Buat tabel untuk user profiles
 CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -36,27 +66,40 @@ CREATE TABLE IF NOT EXISTS favorite_locations (
     name VARCHAR(255) NOT NULL,
     latitude DECIMAL(10, 8) NOT NULL,
     longitude DECIMAL(11, 8) NOT NULL,
+    geohash CHAR(9) NULL,  -- ST_GeoHash(longitude, latitude, 9), untuk pencarian area
     address TEXT,
     is_home BOOLEAN DEFAULT FALSE,
     is_work BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    INDEX idx_favorite_geohash (geohash)
 );
 
+-- Upgrade database lama (sebelum kolom geohash):
+-- ALTER TABLE favorite_locations ADD COLUMN geohash CHAR(9) NULL AFTER longitude, ADD INDEX idx_favorite_geohash (geohash);
+-- UPDATE favorite_locations SET geohash = ST_GeoHash(longitude, latitude, 9) WHERE geohash IS NULL;
+
 -- Buat tabel untuk statistik mobilitas
 CREATE TABLE IF NOT EXISTS mobility_stats (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id VARCHAR(100) NOT NULL,
     date DATE NOT NULL,
     total_trips INT DEFAULT 0,
-    total_distance DECIMAL(10, 2) DEFAULT 0.00,
-    avg_trip_duration DECIMAL(10, 2) DEFAULT 0.00,
+    total_distance DECIMAL(10, 2) DEFAULT 0.00,       -- km
+    total_distance_m DECIMAL(14, 1) DEFAULT 0.0,      -- meter (akumulator presisi)
+    total_duration DECIMAL(12, 1) DEFAULT 0.0,        -- detik
+    avg_trip_duration DECIMAL(10, 2) DEFAULT 0.00,    -- menit
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     UNIQUE KEY unique_user_date (user_id, date)
 );
 
+-- Upgrade database lama (sebelum mobility_stats diisi otomatis oleh service):
+-- ALTER TABLE mobility_stats ADD COLUMN total_distance_m DECIMAL(14, 1) DEFAULT 0.0 AFTER total_distance,
+--   ADD COLUMN total_duration DECIMAL(12, 1) DEFAULT 0.0 AFTER total_distance_m;
+-- lalu isi dari data mentah: python mobility_stats.py rebuild
+
 -- Insert sample data untuk testing
 INSERT INTO users (user_id, name, email, phone) VALUES
 ('user001', 'John Doe', 'john@example.com', '+6281234567890'),
@@ -87,6 +130,7 @@ INSERT INTO favorite_locations (user_id, name, latitude, longitude, address, is_
 ON DUPLICATE KEY UPDATE
     name = VALUES(name),
     address = VALUES(address);
+UPDATE favorite_locations SET geohash = ST_GeoHash(longitude, latitude, 9) WHERE geohash IS NULL;
 
 -- Buat index untuk performa
 CREATE INDEX idx_mobility_user_id ON mobility(user_id);